@@ -0,0 +1 @@
+"""Benchmarks for the image classification service"""
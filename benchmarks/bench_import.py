@@ -0,0 +1,125 @@
+"""Import time and memory of the API module, the cold start of a worker
+
+Imports a module in fresh interpreters and reports the fastest and median
+import time, the resident memory after the import, which of the modules the
+API loads lazily were imported anyway, and the slowest imports from
+`python -X importtime`. Exits with status 1 when a budget is exceeded.
+
+Usage:
+    python -m benchmarks.bench_import [--module src.api.main] [--runs 5]
+        [--max-seconds 1.5] [--max-rss-mib 80]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+# Loaded by the first request or by warm-up, not by importing the API
+DEFERRED_MODULES = ["onnxruntime", "PIL.Image", "scipy"]
+
+_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_bytes": rss,
+    "loaded": [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_import(module: str, runs: int = 5) -> dict:
+    """Import `module` in `runs` fresh interpreters
+
+    Returns:
+        dict: Fastest and median seconds, max RSS after the import in bytes,
+            and the deferred modules that were imported
+    """
+    probe = _PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    samples = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", probe],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(max(1, runs))
+    ]
+    seconds = [sample["seconds"] for sample in samples]
+    return {
+        "min_seconds": min(seconds),
+        "median_seconds": statistics.median(seconds),
+        "rss_bytes": max(sample["rss_bytes"] for sample in samples),
+        "loaded": samples[0]["loaded"],
+    }
+
+
+def slowest_imports(module: str, count: int = 15) -> List[Tuple[str, float]]:
+    """Modules with the highest self time under `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        times.append((name.strip(), int(self_us) / 1e6))
+    return sorted(times, key=lambda item: item[1], reverse=True)[:count]
+
+
+def check_budget(
+    results: dict, max_seconds: Optional[float], max_rss_mib: Optional[float]
+) -> List[str]:
+    """Budget violations of a `measure_import` result, empty if within budget"""
+    violations = []
+    if max_seconds is not None and results["min_seconds"] > max_seconds:
+        violations.append(
+            f"import took {results['min_seconds']:.3f}s, budget {max_seconds:.3f}s"
+        )
+    rss_mib = results["rss_bytes"] / 2**20
+    if max_rss_mib is not None and rss_mib > max_rss_mib:
+        violations.append(f"RSS {rss_mib:.1f} MiB, budget {max_rss_mib:.1f} MiB")
+    if results["loaded"]:
+        violations.append("imported eagerly: " + ", ".join(results["loaded"]))
+    return violations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="src.api.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--max-rss-mib", type=float)
+    args = parser.parse_args()
+
+    results = measure_import(args.module, args.runs)
+    print(f"\nimport {args.module}, {args.runs} runs\n")
+    print(f"fastest  {results['min_seconds'] * 1000:8.1f} ms")
+    print(f"median   {results['median_seconds'] * 1000:8.1f} ms")
+    print(f"RSS      {results['rss_bytes'] / 2**20:8.1f} MiB")
+    print(f"deferred modules imported: {', '.join(results['loaded']) or 'none'}")
+    print("\nslowest imports (self time)")
+    for name, seconds in slowest_imports(args.module):
+        print(f"  {seconds * 1000:7.1f} ms  {name}")
+
+    violations = check_budget(results, args.max_seconds, args.max_rss_mib)
+    for violation in violations:
+        print(f"OVER BUDGET: {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
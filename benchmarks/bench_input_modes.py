@@ -0,0 +1,119 @@
+"""CPU cost of the /predict input modes
+
+Sends the same image to the app in-process as a multipart upload, as a raw
+request body, as a .npy array and as raw HWC pixels with an X-Image-Shape
+header, and reports the wall time and process CPU time per request of each
+mode. Pixels are sent both at the source size and already resized to the
+model input size, which skips every step before normalization. The
+prediction cache is disabled so every request runs the full pipeline.
+
+Usage:
+    python -m benchmarks.bench_input_modes [--requests 100] [--size 1920x1080]
+"""
+
+import argparse
+import asyncio
+import io
+import time
+from typing import Dict, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_service import PREDICT_PATH, synthetic_jpeg
+
+Payload = Tuple[bytes, Dict[str, str]]
+
+
+def npy_bytes(pixels: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, pixels)
+    return buffer.getvalue()
+
+
+def make_payloads(width: int, height: int, input_size: Tuple[int, int]) -> dict:
+    """Request bodies and headers per input mode, all of the same image"""
+    jpeg = synthetic_jpeg(width, height)
+    pixels = np.asarray(Image.open(io.BytesIO(jpeg)).convert("RGB"))
+    resized = np.asarray(Image.fromarray(pixels).resize(input_size))
+    return {
+        "multipart jpeg": (jpeg, {}),
+        "raw jpeg": (jpeg, {"Content-Type": "image/jpeg"}),
+        "npy pixels": (npy_bytes(pixels), {"Content-Type": "application/x-npy"}),
+        "raw pixels": (
+            pixels.tobytes(),
+            {"X-Image-Shape": ",".join(map(str, pixels.shape))},
+        ),
+        "raw pixels, input size": (
+            resized.tobytes(),
+            {"X-Image-Shape": ",".join(map(str, resized.shape))},
+        ),
+    }
+
+
+async def post(client: httpx.AsyncClient, name: str, payload: Payload) -> None:
+    body, headers = payload
+    if name.startswith("multipart"):
+        response = await client.post(PREDICT_PATH, files={"file": ("image", body)})
+    else:
+        response = await client.post(PREDICT_PATH, content=body, headers=headers)
+    response.raise_for_status()
+
+
+async def time_mode(
+    client: httpx.AsyncClient, name: str, payload: Payload, requests: int
+) -> dict:
+    """Mean wall and CPU milliseconds per request"""
+    for _ in range(5):  # Warm up
+        await post(client, name, payload)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(requests):
+        await post(client, name, payload)
+    return {
+        "bytes": len(payload[0]),
+        "wall_ms": (time.perf_counter() - wall) * 1000 / requests,
+        "cpu_ms": (time.process_time() - cpu) * 1000 / requests,
+    }
+
+
+async def run(requests: int, width: int, height: int) -> dict:
+    from src.api.main import create_app
+    from src.core.config import settings
+    from src.services.inference import get_prediction_cache
+
+    settings.CACHE_ENABLED = False
+    get_prediction_cache.cache_clear()
+
+    payloads = make_payloads(width, height, settings.IMAGE_SIZE)
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        return {
+            name: await time_mode(client, name, payload, requests)
+            for name, payload in payloads.items()
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--size", default="1920x1080", help="Image size, WxH")
+    args = parser.parse_args()
+    width, height = (int(value) for value in args.size.split("x"))
+
+    results = asyncio.run(run(args.requests, width, height))
+    baseline = results["multipart jpeg"]["cpu_ms"]
+
+    print(f"\n{args.requests} requests, {width}x{height} image\n")
+    print(f"{'mode':<24} {'bytes':>11} {'wall ms':>9} {'cpu ms':>8} {'saved':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<24} {result['bytes']:>11,} {result['wall_ms']:>9.2f} "
+            f"{result['cpu_ms']:>8.2f} {baseline - result['cpu_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Overhead of the monitoring middleware
+
+Calls a trivial ASGI app directly, without a server or HTTP client, bare and
+wrapped in the original BaseHTTPMiddleware-based monitoring middleware and in
+the pure ASGI MonitoringMiddleware, and reports the time per request each
+adds.
+
+Usage:
+    python -m benchmarks.bench_middleware [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from starlette.types import ASGIApp, Message
+
+from src.core.middleware import MonitoringMiddleware
+
+# The original middleware's metrics, in their own registry to avoid name clashes
+_legacy_registry = CollectorRegistry()
+LEGACY_REQUESTS_TOTAL = Counter(
+    "legacy_predictions_total",
+    "Total number of predictions",
+    ["status"],
+    registry=_legacy_registry,
+)
+LEGACY_PREDICTION_LATENCY = Histogram(
+    "legacy_prediction_seconds",
+    "Time spent processing prediction",
+    buckets=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+    registry=_legacy_registry,
+)
+
+
+class LegacyMonitoringMiddleware(BaseHTTPMiddleware):
+    """The original monitoring middleware, kept as a baseline"""
+
+    async def dispatch(
+        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        if not request.url.path.endswith("/predict"):
+            return await call_next(request)
+
+        start_time = time.time()
+        response = await call_next(request)
+        duration = time.time() - start_time
+
+        LEGACY_REQUESTS_TOTAL.labels(status=str(response.status_code)).inc()
+        LEGACY_PREDICTION_LATENCY.observe(duration)
+
+        return response
+
+
+async def predict(request: Request) -> Response:
+    await request.body()
+    return PlainTextResponse("ok")
+
+
+def make_app() -> Starlette:
+    return Starlette(routes=[Route("/api/v1/predict", predict, methods=["POST"])])
+
+
+async def call(app: ASGIApp, body: bytes) -> None:
+    """Send one POST /api/v1/predict straight to the ASGI app"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/v1/predict",
+        "raw_path": b"/api/v1/predict",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8000),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive() -> Message:
+        if messages:
+            return messages.pop()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        pass
+
+    await app(scope, receive, send)
+
+
+async def time_app(app: ASGIApp, requests: int, body: bytes) -> float:
+    """Mean time per request in microseconds"""
+    for _ in range(min(1000, requests)):  # Warm up
+        await call(app, body)
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        await call(app, body)
+    return (time.perf_counter_ns() - start) / requests / 1000
+
+
+async def run(requests: int, body_bytes: int) -> dict:
+    body = b"x" * body_bytes
+    apps: dict[str, ASGIApp] = {
+        "no middleware": make_app(),
+        "BaseHTTPMiddleware": LegacyMonitoringMiddleware(make_app()),
+        "pure ASGI": MonitoringMiddleware(make_app()),
+    }
+    return {name: await time_app(app, requests, body) for name, app in apps.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--body-bytes", type=int, default=50_000)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.requests, args.body_bytes))
+    baseline = results["no middleware"]
+
+    print(f"\n{args.requests} requests, {args.body_bytes} byte bodies\n")
+    print(f"{'middleware':<22} {'us/request':>11} {'overhead us':>12}")
+    for name, micros in results.items():
+        print(f"{name:<22} {micros:>11.1f} {micros - baseline:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Throughput of the staged decode, preprocess and inference pipeline
+
+Classifies the same set of JPEGs once strictly sequentially (decode,
+preprocess and session.run one image after the other, as a single request
+does) and then through a Pipeline with different numbers of decode and
+preprocess workers, and reports images per second for each configuration.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--images 200] [--size 1280x960]
+        [--decode-workers 1,2,4,8] [--preprocess-workers 1,2] [--batch-size 8]
+"""
+
+import argparse
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.bench_service import synthetic_jpeg
+from src.core.config import model_variant_path, settings
+from src.services.pipeline import Pipeline, Stage
+from src.services.registry import create_preprocessor, load_classifier
+from src.utils.preprocessing import decode_input
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",")]
+
+
+def run_sequential(images: List[bytes], classifier, preprocessor) -> float:
+    """Images per second classifying one image at a time"""
+    start = time.perf_counter()
+    for contents in images:
+        image = decode_input(contents, preprocessor)
+        classifier.predict_batch(preprocessor.preprocess(image), k=settings.TOP_K)
+    return len(images) / (time.perf_counter() - start)
+
+
+def run_pipeline(
+    images: List[bytes],
+    classifier,
+    preprocessor,
+    decode_workers: int,
+    preprocess_workers: int,
+    batch_size: int,
+) -> float:
+    """Images per second through a pipeline with the given pool sizes"""
+    pipeline = Pipeline(
+        "bench",
+        [
+            Stage(
+                "decode",
+                lambda contents: decode_input(contents, preprocessor),
+                workers=decode_workers,
+            ),
+            Stage("preprocess", preprocessor.preprocess, workers=preprocess_workers),
+            Stage(
+                "inference",
+                lambda arrays: classifier.predict_batch(
+                    np.concatenate(arrays), k=settings.TOP_K
+                ),
+                batch_size=batch_size,
+                max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            ),
+        ],
+    )
+    try:
+        start = time.perf_counter()
+        for future in pipeline.map(images):
+            future.result()
+        return len(images) / (time.perf_counter() - start)
+    finally:
+        pipeline.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", default="1280x960", help="Image size, WxH")
+    parser.add_argument(
+        "--decode-workers",
+        type=_int_list,
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument("--preprocess-workers", type=_int_list, default=[1, 2])
+    parser.add_argument("--batch-size", type=int, default=settings.BATCH_MAX_SIZE)
+    args = parser.parse_args()
+    width, height = (int(value) for value in args.size.split("x"))
+
+    config = settings.model_configs()[settings.DEFAULT_MODEL]
+    classifier = load_classifier(
+        model_variant_path(config.model_path, config.precision), config.labels_path
+    )
+    preprocessor = create_preprocessor(config)
+    images = [synthetic_jpeg(width, height, seed=seed) for seed in range(args.images)]
+    run_sequential(images[:10], classifier, preprocessor)  # Warm up
+
+    baseline = run_sequential(images, classifier, preprocessor)
+    print(f"\n{args.images} images, {width}x{height}, {os.cpu_count()} CPUs\n")
+    print(f"{'decode':>7} {'preprocess':>11} {'images/s':>10} {'speedup':>8}")
+    print(f"{'sequential':>19} {baseline:>10.1f} {1:>7.2f}x")
+    for decode_workers in args.decode_workers:
+        for preprocess_workers in args.preprocess_workers:
+            rate = run_pipeline(
+                images,
+                classifier,
+                preprocessor,
+                decode_workers,
+                preprocess_workers,
+                args.batch_size,
+            )
+            print(
+                f"{decode_workers:>7} {preprocess_workers:>11} {rate:>10.1f} "
+                f"{rate / baseline:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Microbenchmark of image preprocessing
+
+Compares the original preprocessing (resize, transpose, float64 divide, cast)
+with ImagePreprocessor writing into a fresh array and into a reused batch
+buffer. Reports per-image time and peak bytes allocated per image, once for the
+full-size sample images and once for images already at the model input size,
+which isolates the array conversion from PIL resampling.
+
+Usage:
+    python -m benchmarks.bench_preprocessing [--repeats 200] [--batch-size 8]
+"""
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image
+
+from src.utils.preprocessing import ImagePreprocessor
+
+IMAGES_DIR = Path(__file__).parent.parent / "images"
+SIZE = (224, 224)
+
+
+def legacy_preprocess(image: Image.Image, size: tuple[int, int]) -> np.ndarray:
+    """The original preprocess_image implementation, kept as a baseline"""
+    image = image.resize(size)
+    image_array = np.array(image)
+    image_array = image_array.transpose(2, 0, 1)
+    image_array = image_array / 255.0
+    image_array = image_array.astype(np.float32)
+    return np.expand_dims(image_array, axis=0)
+
+
+def load_images() -> List[Image.Image]:
+    """Load the sample images, decoded and converted to RGB up front"""
+    return [
+        Image.open(path).convert("RGB")
+        for path in sorted(IMAGES_DIR.iterdir())
+        if path.suffix.lower() in {".jpg", ".jpeg", ".png"}
+    ]
+
+
+def measure(
+    fn: Callable[[List[Image.Image]], object],
+    images: List[Image.Image],
+    repeats: int,
+) -> tuple[float, float]:
+    """Measure a preprocessing function over all images
+
+    Args:
+        fn (Callable): Function preprocessing a list of images
+        images (List[Image.Image]): The images to preprocess
+        repeats (int): Number of timed repetitions
+
+    Returns:
+        Tuple of (microseconds per image, peak bytes allocated per image)
+    """
+    fn(images)  # Warm up caches and reusable buffers
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(images)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(images)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(images)
+    return elapsed / (repeats * count) * 1e6, peak / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    samples = load_images()
+    preprocessor = ImagePreprocessor(SIZE)
+    crop_preprocessor = ImagePreprocessor(
+        SIZE, resize_mode="center_crop", normalization="imagenet"
+    )
+
+    candidates: dict[str, Callable[[List[Image.Image]], object]] = {
+        "legacy preprocess_image": lambda batch: [
+            legacy_preprocess(image, SIZE) for image in batch
+        ],
+        "ImagePreprocessor.preprocess": lambda batch: [
+            preprocessor.preprocess(image) for image in batch
+        ],
+        "ImagePreprocessor.preprocess_batch": preprocessor.preprocess_batch,
+        "preprocess_batch (crop+imagenet)": crop_preprocessor.preprocess_batch,
+    }
+
+    print(f"{args.batch_size} images per batch, {args.repeats} repeats")
+    for title, source in (
+        ("Full-size sample images", samples),
+        ("Images already at input size", [image.resize(SIZE) for image in samples]),
+    ):
+        images = [source[i % len(source)] for i in range(args.batch_size)]
+        print(f"\n{title}")
+        print(f"{'implementation':<36} {'us/image':>10} {'KiB alloc/image':>16}")
+        for name, fn in candidates.items():
+            per_image_us, per_image_bytes = measure(fn, images, args.repeats)
+            print(f"{name:<36} {per_image_us:>10.1f} {per_image_bytes / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Accuracy-vs-speed benchmark of reduced-precision model variants
+
+Runs every variant built by scripts/quantize_model.py on the same images and
+reports latency, throughput and how often its top-1 and top-5 classes agree
+with the FP32 model.
+
+Usage:
+    python -m benchmarks.bench_quantization [--images-dir DIR] [--repeats 20]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from scripts.quantize_model import DEFAULT_CALIBRATION_DIR, PRECISIONS
+from src.classifier.classifier import ImageClassifier
+from src.core.config import model_variant_path, settings
+from src.utils.files import find_images
+from src.utils.preprocessing import ImagePreprocessor
+
+
+def load_inputs(image_paths: List[Path]) -> np.ndarray:
+    """Preprocess the benchmark images into one NCHW batch"""
+    preprocessor = ImagePreprocessor(
+        settings.IMAGE_SIZE,
+        resize_mode=settings.PREPROCESS_RESIZE_MODE,
+        normalization=settings.PREPROCESS_NORMALIZATION,
+        crop_ratio=settings.PREPROCESS_CROP_RATIO,
+    )
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    return preprocessor.preprocess_batch(images).copy()
+
+
+def benchmark(classifier: ImageClassifier, inputs: np.ndarray, repeats: int) -> dict:
+    """Measure single-image latency and batch throughput
+
+    Args:
+        classifier (ImageClassifier): The classifier to benchmark
+        inputs (np.ndarray): Preprocessed images in NCHW format
+        repeats (int): Number of timed passes over the images
+
+    Returns:
+        dict: Latency percentiles in milliseconds and images per second
+    """
+    classifier.predict_batch(inputs[:1])  # Warm up
+
+    latencies = []
+    for _ in range(repeats):
+        for row in range(len(inputs)):
+            start = time.perf_counter()
+            classifier.predict_batch(inputs[row : row + 1])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        classifier.predict_batch(inputs)
+    throughput = repeats * len(inputs) / (time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "latency_p50_ms": statistics.median(latencies),
+        "latency_p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "throughput_ips": throughput,
+    }
+
+
+def agreement(reference: List[List[str]], candidate: List[List[str]]) -> dict:
+    """Top-1 match rate and mean top-5 overlap against the reference model"""
+    top1 = [ref[0] == cand[0] for ref, cand in zip(reference, candidate, strict=True)]
+    top5 = [
+        len(set(ref[:5]) & set(cand[:5])) / 5
+        for ref, cand in zip(reference, candidate, strict=True)
+    ]
+    return {
+        "top1_agreement": sum(top1) / len(top1),
+        "top5_agreement": sum(top5) / len(top5),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images-dir", type=Path, default=DEFAULT_CALIBRATION_DIR)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+
+    inputs = load_inputs(find_images(args.images_dir))
+    results = {}
+    reference: List[List[str]] = []
+
+    for precision in ["fp32", *PRECISIONS]:
+        model_path = model_variant_path(settings.MODEL_PATH, precision)
+        if not model_path.exists():
+            print(f"Skipping {precision}: {model_path} not found")
+            continue
+
+        classifier = ImageClassifier(model_path, settings.LABELS_PATH)
+        top5 = [
+            [name for name, _ in predictions]
+            for predictions in classifier.predict_batch(inputs, k=5)
+        ]
+        if precision == "fp32":
+            reference = top5
+        results[precision] = {
+            "model_bytes": model_path.stat().st_size,
+            **benchmark(classifier, inputs, args.repeats),
+            **agreement(reference, top5),
+        }
+
+    print(f"\n{len(inputs)} images, {args.repeats} repeats\n")
+    print(
+        f"{'precision':<14} {'size MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'img/s':>8} {'top-1':>7} {'top-5':>7}"
+    )
+    for precision, result in results.items():
+        print(
+            f"{precision:<14} {result['model_bytes'] / 1e6:>8.2f} "
+            f"{result['latency_p50_ms']:>8.2f} {result['latency_p95_ms']:>8.2f} "
+            f"{result['throughput_ips']:>8.1f} {result['top1_agreement']:>7.1%} "
+            f"{result['top5_agreement']:>7.1%}"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
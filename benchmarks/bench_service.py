@@ -0,0 +1,440 @@
+"""Load test and per-stage benchmark of the inference service
+
+Measures single-request latency percentiles, sustained throughput at several
+concurrency levels and a per-stage breakdown of where a request spends its
+time, using the sample images in images/ plus synthetic images of common camera
+sizes. Runs offline against the app in-process, or against a running server
+with --url. Results are written as JSON; --baseline compares them with an
+earlier run and exits with status 1 if any metric regressed by more than
+--tolerance.
+
+Usage:
+    python -m benchmarks.bench_service [--url http://localhost:8000]
+        [--requests 200] [--concurrency 1,8,32] [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.1]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from scripts.quantize_model import DEFAULT_CALIBRATION_DIR
+from src.utils.files import find_images
+
+SYNTHETIC_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+PREDICT_PATH = "/api/v1/predict"
+
+# Metrics are compared by suffix: lower is better for times and memory,
+# higher is better for rates
+LOWER_IS_BETTER = ("_ms", "_bytes")
+HIGHER_IS_BETTER = ("_rps",)
+
+
+def synthetic_jpeg(width: int, height: int, seed: int = 0) -> bytes:
+    """A JPEG of upscaled noise, which compresses roughly like a photo
+
+    Built at 1/8 scale and resized so generating it barely moves peak RSS.
+    """
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize((width, height), Image.Resampling.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def load_payloads(
+    images_dir: Path, synthetic_sizes: List[tuple[int, int]]
+) -> Dict[str, bytes]:
+    """Upload bodies by name: the sample images and synthetic JPEGs"""
+    payloads = {path.name: path.read_bytes() for path in find_images(images_dir)}
+    for width, height in synthetic_sizes:
+        payloads[f"synthetic_{width}x{height}.jpg"] = synthetic_jpeg(width, height)
+    return payloads
+
+
+def percentiles(latencies_ms: List[float]) -> dict:
+    """Summary statistics of a list of latencies in milliseconds"""
+    values = np.asarray(latencies_ms)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def make_client(url: Optional[str]) -> httpx.AsyncClient:
+    """HTTP client for a running server, or for the app in this process"""
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+
+    from src.api.main import create_app
+
+    transport = httpx.ASGITransport(app=create_app())
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+
+async def post_image(
+    client: httpx.AsyncClient, name: str, contents: bytes, bust_cache: bool
+) -> httpx.Response:
+    """Upload one image, appending random trailing bytes to miss the cache
+
+    Decoders ignore data after the end of the image, so the trailer changes
+    the content hash without changing the prediction.
+    """
+    if bust_cache:
+        contents += os.urandom(8)
+    return await client.post(PREDICT_PATH, files={"file": (name, contents)})
+
+
+async def measure_latency(
+    client: httpx.AsyncClient,
+    payloads: Dict[str, bytes],
+    repeats: int,
+    bust_cache: bool,
+) -> dict:
+    """Sequential request latency percentiles per image"""
+    results = {}
+    for name, contents in payloads.items():
+        await post_image(client, name, contents, bust_cache)  # Warm up
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            response = await post_image(client, name, contents, bust_cache)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+        results[name] = {"bytes": len(contents), **percentiles(latencies)}
+    return results
+
+
+async def measure_throughput(
+    client: httpx.AsyncClient,
+    payloads: Dict[str, bytes],
+    concurrency: int,
+    total_requests: int,
+    bust_cache: bool,
+) -> dict:
+    """Sustained throughput with a fixed number of requests in flight
+
+    Requests cycle through the payloads. Rejected requests (503) are counted
+    but do not contribute to the latency percentiles.
+    """
+    items = list(payloads.items())
+    next_request = 0
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+
+    async def worker() -> None:
+        nonlocal next_request
+        while next_request < total_requests:
+            name, contents = items[next_request % len(items)]
+            next_request += 1
+            start = time.perf_counter()
+            response = await post_image(client, name, contents, bust_cache)
+            status = str(response.status_code)
+            status_counts[status] = status_counts.get(status, 0) + 1
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+
+    return {
+        "requests": total_requests,
+        "status_counts": status_counts,
+        "throughput_rps": len(latencies) / duration,
+        **(percentiles(latencies) if latencies else {}),
+    }
+
+
+def _time_stage(repeats: int, fn: Callable, *args: Any) -> tuple[float, Any]:
+    """Median time of fn(*args) in milliseconds, and its last result"""
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings)), result
+
+
+def stage_breakdown(payloads: Dict[str, bytes], repeats: int) -> dict:
+    """Median time of each request stage per image, run in this process
+
+    Mirrors what /predict does for one uncached upload: spooling and reading the
+    multipart upload, decoding, preprocessing, the ONNX Runtime session,
+    top-k selection with label lookup, and serializing the response.
+    """
+    from src.api.schemas import PredictionItem, PredictionResponse
+    from src.classifier.postprocessing import top_k
+    from src.core.config import settings
+    from src.services.inference import get_registry
+    from src.utils.preprocessing import decode_image
+
+    model = get_registry().get()
+    classifier = model.classifier
+    min_size = (
+        model.preprocessor.min_source_size(settings.DECODE_DRAFT_SCALE)
+        if settings.DECODE_DRAFT
+        else None
+    )
+
+    def upload_read(contents: bytes) -> bytes:
+        # Starlette spools uploads to a temporary file that the endpoint reads
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as f:
+            f.write(contents)
+            f.seek(0)
+            return f.read()
+
+    def run_session(input_array: np.ndarray) -> np.ndarray:
+        return np.asarray(
+            classifier.session.run(
+                [classifier.output_name], {classifier.input_name: input_array}
+            )[0]
+        )
+
+    def postprocess(logits: np.ndarray) -> List[tuple[str, float]]:
+        indices, probabilities = top_k(logits, settings.TOP_K)
+        return [
+            (classifier.labels[index], probability)
+            for index, probability in zip(
+                indices[0].tolist(), probabilities[0].tolist(), strict=True
+            )
+        ]
+
+    def serialize(predictions: List[tuple[str, float]]) -> str:
+        return PredictionResponse(
+            predictions=[
+                PredictionItem(class_name=name, confidence=confidence)
+                for name, confidence in predictions
+            ]
+        ).model_dump_json()
+
+    results = {}
+    for name, contents in payloads.items():
+        stages = {}
+        stages["upload_read_ms"], _ = _time_stage(repeats, upload_read, contents)
+        stages["decode_ms"], image = _time_stage(
+            repeats, decode_image, contents, min_size
+        )
+        stages["preprocess_ms"], input_array = _time_stage(
+            repeats, model.preprocessor.preprocess, image
+        )
+        stages["session_run_ms"], logits = _time_stage(
+            repeats, run_session, input_array.copy()
+        )
+        stages["postprocess_ms"], predictions = _time_stage(
+            repeats, postprocess, logits
+        )
+        stages["serialization_ms"], _ = _time_stage(repeats, serialize, predictions)
+        stages["total_ms"] = sum(stages.values())
+        results[name] = stages
+    return results
+
+
+async def server_rss_bytes(client: httpx.AsyncClient) -> Optional[int]:
+    """Current resident memory reported by the server's /metrics, if any"""
+    response = await client.get("/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            return int(float(line.split()[1]))
+    return None
+
+
+async def run_benchmark(
+    url: Optional[str],
+    payloads: Dict[str, bytes],
+    latency_repeats: int,
+    concurrency_levels: List[int],
+    total_requests: int,
+    stage_repeats: int,
+    bust_cache: bool = True,
+) -> dict:
+    """Run the whole suite and return the results
+
+    Args:
+        url (str, optional): Base URL of a running server; the app is served
+            in-process when omitted
+        payloads (Dict[str, bytes]): Upload bodies by name
+        latency_repeats (int): Sequential requests per image
+        concurrency_levels (List[int]): Requests in flight per throughput run
+        total_requests (int): Requests per throughput run
+        stage_repeats (int): Repetitions per stage of the breakdown
+        bust_cache (bool): Make every upload miss the prediction cache
+
+    Returns:
+        dict: The benchmark results
+    """
+    results: dict = {
+        "meta": {
+            "target": url or "in-process",
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        }
+    }
+    async with make_client(url) as client:
+        results["latency"] = await measure_latency(
+            client, payloads, latency_repeats, bust_cache
+        )
+        results["throughput"] = {
+            f"concurrency_{concurrency}": await measure_throughput(
+                client, payloads, concurrency, total_requests, bust_cache
+            )
+            for concurrency in concurrency_levels
+        }
+        if url:
+            results["memory"] = {"server_rss_bytes": await server_rss_bytes(client)}
+
+    if not url:
+        results["stages"] = stage_breakdown(payloads, stage_repeats)
+        results["memory"] = {"peak_rss_bytes": peak_rss_bytes()}
+    return results
+
+
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Describe every metric that is worse than the baseline by over tolerance
+
+    Args:
+        results (dict): Results of this run
+        baseline (dict): Results of the stored baseline run
+        tolerance (float): Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        List[str]: One line per regressed metric, empty if there are none
+    """
+    current = _flatten(results)
+    regressions = []
+    for key, before in _flatten(baseline).items():
+        after = current.get(key)
+        if after is None or before <= 0 or key.startswith("meta."):
+            continue
+        change = (after - before) / before
+        if key.endswith(LOWER_IS_BETTER) and change > tolerance:
+            regressions.append(f"{key}: {before:.2f} -> {after:.2f} (+{change:.0%})")
+        elif key.endswith(HIGHER_IS_BETTER) and change < -tolerance:
+            regressions.append(f"{key}: {before:.2f} -> {after:.2f} ({change:.0%})")
+    return regressions
+
+
+def print_summary(results: dict) -> None:
+    print(f"\nLatency ({results['meta']['target']})")
+    print(f"{'image':<28} {'KB':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for name, result in results["latency"].items():
+        print(
+            f"{name:<28} {result['bytes'] / 1024:>8.0f} {result['p50_ms']:>8.2f} "
+            f"{result['p90_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+    print("\nThroughput")
+    print(f"{'concurrency':<14} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  status")
+    for level, result in results["throughput"].items():
+        print(
+            f"{level.split('_')[1]:<14} {result['throughput_rps']:>8.1f} "
+            f"{result.get('p50_ms', float('nan')):>8.2f} "
+            f"{result.get('p99_ms', float('nan')):>8.2f}  {result['status_counts']}"
+        )
+
+    if "stages" in results:
+        stage_names = list(next(iter(results["stages"].values())))
+        print("\nStage breakdown (median ms)")
+        print(
+            f"{'image':<28} "
+            + " ".join(f"{stage[:-3][:10]:>10}" for stage in stage_names)
+        )
+        for name, stages in results["stages"].items():
+            print(
+                f"{name:<28} "
+                + " ".join(f"{stages[stage]:>10.2f}" for stage in stage_names)
+            )
+
+    for key, value in results["memory"].items():
+        if value is not None:
+            print(f"\n{key}: {value / 1e6:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Benchmark a running server instead")
+    parser.add_argument("--images-dir", type=Path, default=DEFAULT_CALIBRATION_DIR)
+    parser.add_argument("--no-synthetic", action="store_true")
+    parser.add_argument("--latency-repeats", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--stage-repeats", type=int, default=20)
+    parser.add_argument(
+        "--with-cache",
+        action="store_true",
+        help="Let repeated uploads hit the prediction cache",
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare with stored results")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    payloads = load_payloads(
+        args.images_dir, [] if args.no_synthetic else SYNTHETIC_SIZES
+    )
+    results = asyncio.run(
+        run_benchmark(
+            args.url,
+            payloads,
+            latency_repeats=args.latency_repeats,
+            concurrency_levels=[int(c) for c in args.concurrency.split(",")],
+            total_requests=args.requests,
+            stage_repeats=args.stage_repeats,
+            bust_cache=not args.with_cache,
+        )
+    )
+    print_summary(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare_to_baseline(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Gunicorn settings for running the API with several worker processes
+
+Usage:
+    PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc gunicorn src.api.main:app
+
+The app is imported once in the master and the workers are forked from it,
+so they share its memory copy-on-write. Inference sessions are still created
+in each worker, after the fork; with MODEL_SHARED_WEIGHTS their weights are
+mapped from one file, which the master maps and reads ahead before forking.
+"""
+
+import gc
+import os
+
+from loguru import logger
+
+from src.core.metrics import mark_worker_dead, prepare_multiprocess_dir
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("API_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Here rather than in on_starting, since the master imports the app, which
+# creates metric files, before that hook runs. For the same reason nothing
+# that defines metrics is imported at the top of this file.
+prepare_multiprocess_dir()
+
+
+def on_starting(server):
+    from src.core.config import settings
+    from src.services.registry import warmup_models
+    from src.services.warmup import preload_shared_weights
+
+    if settings.MODEL_SHARED_WEIGHTS:
+        size = preload_shared_weights(warmup_models())
+        logger.info(f"Mapped {size / 2**20:.1f} MiB of shared weights")
+    # Keep the garbage collector of the workers from writing to, and so
+    # copying, every object inherited from the master
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    mark_worker_dead(worker.pid)
@@ -0,0 +1,639 @@
+"""Offline bulk classification of stored images
+
+Classifies every image in a directory tree, a zip or tar archive, or a
+manifest file listing one image path per line, and streams the results to a
+JSONL, CSV or Parquet file. Images are decoded and resized in a process pool
+while the main process normalizes them, runs the model on large batches and
+writes the results, each step in its own pipeline stage.
+
+Progress is checkpointed next to the output every --checkpoint-every images
+and when the run stops, including on Ctrl-C. Running the same command again
+continues where the previous run stopped, skipping the images it recorded as
+done, while --overwrite starts over.
+
+    python -m scripts.classify_bulk /data/photos labels.jsonl
+    python -m scripts.classify_bulk photos.tar.gz labels.csv --k 1 --workers 16
+    python -m scripts.classify_bulk manifest.txt labels.parquet --model resnet50
+
+Parquet output requires pyarrow, and is written as a directory of part files.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
+import orjson
+
+from src.core.config import model_variant_path, settings
+from src.services.pipeline import Pipeline, Stage
+from src.services.registry import create_preprocessor, load_classifier
+from src.utils.archives import is_hidden
+from src.utils.files import IMAGE_SUFFIXES, find_images
+from src.utils.preprocessing import ImagePreprocessor, decode_image
+
+FORMATS = ["jsonl", "csv", "parquet"]
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+# An image to classify: its key in the output, and its path or its bytes
+Item = Tuple[str, Union[Path, bytes]]
+# A decoded item: its key, and its resized pixels or the error decoding it
+Decoded = Tuple[str, Optional[np.ndarray], Optional[str]]
+Row = Dict[str, Any]
+T = TypeVar("T")
+
+
+def _is_image_name(name: str) -> bool:
+    return Path(name).suffix.lower() in IMAGE_SUFFIXES and not is_hidden(name)
+
+
+def count_items(source: Path) -> Optional[int]:
+    """Number of images in a source, or None if counting means reading it all"""
+    if source.is_dir():
+        return len(find_images(source))
+    if source.suffix.lower() == ".zip":
+        with zipfile.ZipFile(source) as archive:
+            return sum(
+                not info.is_dir() and _is_image_name(info.filename)
+                for info in archive.infolist()
+            )
+    if source.name.lower().endswith(TAR_SUFFIXES):
+        return None  # Compressed tars would have to be decompressed to count
+    return len(_manifest_paths(source))
+
+
+def iter_items(source: Path, done: AbstractSet[str] = frozenset()) -> Iterator[Item]:
+    """The images of a source in a stable order, except those whose key is done
+
+    Images that are done are not read, so resuming a run is cheap, and the
+    source may have changed since: only images not classified yet are left.
+    """
+    if source.is_dir():
+        for path in find_images(source):
+            key = path.relative_to(source).as_posix()
+            if key not in done:
+                yield key, path
+    elif source.suffix.lower() == ".zip":
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if (
+                    not info.is_dir()
+                    and _is_image_name(info.filename)
+                    and info.filename not in done
+                ):
+                    yield info.filename, archive.read(info)
+    elif source.name.lower().endswith(TAR_SUFFIXES):
+        # Streaming mode reads the archive once, front to back
+        with tarfile.open(source, mode="r|*") as archive:
+            for member in archive:
+                if (
+                    member.isfile()
+                    and _is_image_name(member.name)
+                    and member.name not in done
+                ):
+                    file = archive.extractfile(member)
+                    if file is not None:
+                        yield member.name, file.read()
+    else:
+        for path in _manifest_paths(source):
+            if str(path) not in done:
+                yield str(path), path
+
+
+def _manifest_paths(manifest: Path) -> List[Path]:
+    """Paths listed in a manifest, relative ones resolved against its directory"""
+    lines = manifest.read_text().splitlines()
+    return [
+        manifest.parent / line.strip()
+        for line in lines
+        if line.strip() and not line.startswith("#")
+    ]
+
+
+_worker_preprocessor: Optional[ImagePreprocessor] = None
+
+
+def _init_worker(preprocessor: ImagePreprocessor) -> None:
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+
+def decode_items(items: List[Item]) -> List[Decoded]:
+    """Read, decode and resize images to the model input size
+
+    Runs in the pool workers, which return uint8 pixels rather than float32
+    model inputs so a quarter of the data goes back to the main process.
+    """
+    assert _worker_preprocessor is not None
+    preprocessor = _worker_preprocessor
+    min_size = (
+        preprocessor.min_source_size(settings.DECODE_DRAFT_SCALE)
+        if settings.DECODE_DRAFT
+        else None
+    )
+    decoded: List[Decoded] = []
+    for key, payload in items:
+        try:
+            contents = payload.read_bytes() if isinstance(payload, Path) else payload
+            image = decode_image(contents, min_size)
+            decoded.append((key, np.asarray(preprocessor.resize(image)), None))
+        except Exception as e:
+            message = getattr(e, "message", None) or str(e) or type(e).__name__
+            decoded.append((key, None, message))
+    return decoded
+
+
+class Writer(Protocol):
+    """Output of a run, written in batches of rows"""
+
+    def write(self, rows: List[Row]) -> None: ...
+
+    def flush(self) -> dict:
+        """Write out buffered rows, returning the state to resume after them"""
+
+    def close(self) -> None: ...
+
+
+class JsonlWriter:
+    def __init__(self, path: Path, k: int, state: Optional[dict] = None):
+        """Writes one JSON object per image and line.
+
+        Args:
+            path (Path): The output file
+            k (int): Number of predictions per image
+            state (dict, optional): State returned by `flush` in an earlier
+                run; rows written after it are discarded
+        """
+        self.path = path
+        self.k = k
+        self._file = open(path, "r+b" if state else "wb")
+        if state:
+            self._file.truncate(state["bytes"])
+            self._file.seek(state["bytes"])
+
+    def write(self, rows: List[Row]) -> None:
+        self._file.write(b"".join(orjson.dumps(row) + b"\n" for row in rows))
+
+    def flush(self) -> dict:
+        self._file.flush()
+        return {"bytes": self._file.tell()}
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter(JsonlWriter):
+    """Writes one row per image with label_1, score_1, ... label_k, score_k"""
+
+    def __init__(self, path: Path, k: int, state: Optional[dict] = None):
+        super().__init__(path, k, state)
+        if not state:
+            columns = ["path"]
+            for rank in range(1, k + 1):
+                columns += [f"label_{rank}", f"score_{rank}"]
+            self._write_csv([columns + ["error"]])
+
+    def write(self, rows: List[Row]) -> None:
+        records = []
+        for row in rows:
+            record = [row["path"]]
+            for rank in range(self.k):
+                if rank < len(row["labels"]):
+                    record += [row["labels"][rank], row["scores"][rank]]
+                else:
+                    record += ["", ""]
+            records.append(record + [row["error"] or ""])
+        self._write_csv(records)
+
+    def _write_csv(self, records: List[List[Any]]) -> None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        self._file.write(buffer.getvalue().encode())
+
+
+class ParquetWriter:
+    def __init__(self, path: Path, k: int, state: Optional[dict] = None):
+        """Writes a directory of Parquet files, one per checkpoint.
+
+        Each file is complete once written, so an interrupted run never leaves
+        a file without its footer behind.
+
+        Args:
+            path (Path): The output directory
+            k (int): Number of predictions per image
+            state (dict, optional): State returned by `flush` in an earlier
+                run; parts written after it are deleted
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise SystemExit("Parquet output requires pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.parts = state["parts"] if state else 0
+        path.mkdir(parents=True, exist_ok=True)
+        for part in path.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+        self._rows: List[Row] = []
+
+    def write(self, rows: List[Row]) -> None:
+        self._rows.extend(rows)
+
+    def flush(self) -> dict:
+        if self._rows:
+            table = self._pa.Table.from_pylist(
+                self._rows,
+                schema=self._pa.schema(
+                    [
+                        ("path", self._pa.string()),
+                        ("labels", self._pa.list_(self._pa.string())),
+                        ("scores", self._pa.list_(self._pa.float32())),
+                        ("error", self._pa.string()),
+                    ]
+                ),
+            )
+            self._pq.write_table(table, self.path / f"part-{self.parts:05d}.parquet")
+            self.parts += 1
+            self._rows = []
+        return {"parts": self.parts}
+
+    def close(self) -> None:
+        pass
+
+
+WRITERS: Dict[str, Callable[[Path, int, Optional[dict]], Writer]] = {
+    "jsonl": JsonlWriter,
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+}
+
+
+class Checkpoint:
+    def __init__(self, output: Path, run: dict):
+        """Progress of a run, stored next to its output.
+
+        The keys of the images done are appended to a second file at each
+        checkpoint, whose size the checkpoint records, so saving does not
+        rewrite every key recorded before.
+
+        Args:
+            output (Path): The output file or directory
+            run (dict): Arguments that must match for a run to be resumed
+        """
+        self.path = output.with_name(output.name + ".checkpoint.json")
+        self.keys_path = output.with_name(output.name + ".checkpoint.keys")
+        self.run = run
+        self._pending: List[str] = []
+
+    def load(self) -> Optional[dict]:
+        """The saved progress, or None if there is nothing to resume"""
+        if not self.path.exists():
+            return None
+        saved = json.loads(self.path.read_text())
+        if saved["run"] != self.run:
+            raise SystemExit(
+                f"{self.path} belongs to a run with other arguments: {saved['run']}"
+            )
+        return dict(saved)
+
+    def load_keys(self, saved: dict) -> Set[str]:
+        """Keys of the images done by the saved checkpoint
+
+        Keys recorded after it, by a run that stopped before saving the
+        next checkpoint, are discarded like the rows written after it.
+        """
+        with open(self.keys_path, "r+b") as f:
+            f.truncate(saved["keys_bytes"])
+            return {orjson.loads(line) for line in f.read().splitlines()}
+
+    def add(self, keys: Iterable[str]) -> None:
+        """Record images as done, from the next save on"""
+        self._pending.extend(keys)
+
+    def save(self, completed: int, writer_state: dict) -> None:
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(orjson.dumps(key) + b"\n" for key in self._pending))
+            keys_bytes = f.tell()
+        self._pending = []
+        # Replaced atomically so a crash never leaves a partial checkpoint
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    "run": self.run,
+                    "completed": completed,
+                    "keys_bytes": keys_bytes,
+                    "writer": writer_state,
+                }
+            )
+        )
+        os.replace(temporary, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+        self.keys_path.unlink(missing_ok=True)
+
+
+class Progress:
+    def __init__(self, total: Optional[int], done: int, interval: float = 2.0):
+        """Reports images/sec and the remaining time on stderr.
+
+        Args:
+            total (int, optional): Number of images, None if unknown
+            done (int): Images completed by earlier runs
+            interval (float): Seconds between reports
+        """
+        self.total = total
+        self.done = done
+        self.interval = interval
+        self._start_done = done
+        self._start = self._last_report = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Images per second in this run"""
+        elapsed = time.monotonic() - self._start
+        return (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count: int) -> None:
+        self.done += count
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        rate = self.rate
+        if self.total is None:
+            position, eta = f"{self.done:,}", "unknown"
+        else:
+            position = f"{self.done:,}/{self.total:,}"
+            remaining = max(0, self.total - self.done)
+            eta = _format_seconds(remaining / rate) if rate > 0 else "unknown"
+        print(
+            f"{position} images, {rate:,.1f} images/s, ETA {eta}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def _chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def decode_in_pool(
+    items: Iterable[Item],
+    preprocessor: ImagePreprocessor,
+    workers: int,
+    chunk_size: int,
+) -> Iterator[Decoded]:
+    """Decode images in a process pool, yielding them in source order
+
+    At most a few chunks per worker are in flight, so memory stays bounded
+    however large the source is. With no workers, decodes in this process.
+    """
+    if workers <= 0:
+        _init_worker(preprocessor)
+        for chunk in _chunks(items, chunk_size):
+            yield from decode_items(chunk)
+        return
+
+    # Spawned, not forked: by now this process runs the model and the pipeline
+    # threads, and forked workers would inherit the locks they hold
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(preprocessor,),
+    ) as pool:
+        pending: Deque[Future[List[Decoded]]] = deque()
+        for chunk in _chunks(items, chunk_size):
+            pending.append(pool.submit(decode_items, chunk))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def classify(
+    source: Path,
+    output: Path,
+    model: str = settings.DEFAULT_MODEL,
+    k: int = 5,
+    output_format: Optional[str] = None,
+    workers: int = os.cpu_count() or 1,
+    batch_size: int = 64,
+    chunk_size: int = 16,
+    preprocess_workers: int = 2,
+    checkpoint_every: int = 10_000,
+    limit: Optional[int] = None,
+    overwrite: bool = False,
+) -> int:
+    """Classify all images of a source, resuming an interrupted run
+
+    Args:
+        source (Path): Directory, zip or tar archive, or manifest file
+        output (Path): Output file, or directory for Parquet
+        model (str): Name of the model to use
+        k (int): Number of predictions per image
+        output_format (str, optional): "jsonl", "csv" or "parquet", by default
+            from the output suffix
+        workers (int): Decoding processes, 0 to decode in this process
+        batch_size (int): Images per inference call
+        chunk_size (int): Images per task sent to a decoding process
+        preprocess_workers (int): Threads normalizing batches for the model
+        checkpoint_every (int): Images between checkpoints
+        limit (int, optional): Stop after this many images in this run
+        overwrite (bool): Replace an existing output, and start over instead
+            of resuming from its checkpoint
+
+    Returns:
+        int: Number of images classified in this run
+    """
+    output_format = output_format or output.suffix.lstrip(".").lower()
+    if output_format not in WRITERS:
+        raise SystemExit(f"Unknown output format {output_format!r}, use --format")
+    config = settings.model_configs()[model]
+
+    checkpoint = Checkpoint(
+        output,
+        {
+            "source": str(source.resolve()),
+            "model": model,
+            "k": k,
+            "format": output_format,
+        },
+    )
+    if overwrite:
+        checkpoint.remove()
+    saved = checkpoint.load()
+    if saved is None and output.exists() and not overwrite:
+        raise SystemExit(f"{output} exists, use --overwrite to replace it")
+    completed = saved["completed"] if saved else 0
+    done = checkpoint.load_keys(saved) if saved else set()
+    writer = WRITERS[output_format](output, k, saved["writer"] if saved else None)
+
+    classifier = load_classifier(
+        model_variant_path(config.model_path, config.precision), config.labels_path
+    )
+    preprocessor = create_preprocessor(config)
+    progress = Progress(count_items(source), completed)
+    if completed:
+        print(f"Resuming after {completed:,} images", file=sys.stderr)
+
+    items = iter_items(source, done)
+    if limit is not None:
+        items = itertools.islice(items, limit)
+
+    def preprocess(batch: List[Decoded]) -> Tuple[List[Decoded], np.ndarray]:
+        decoded = [pixels for _, pixels, _ in batch if pixels is not None]
+        # A new buffer per batch, the previous one may still be in the model
+        width, height = preprocessor.size
+        buffer = np.empty((len(decoded), 3, height, width), dtype=np.float32)
+        for slot, pixels in zip(buffer, decoded, strict=True):
+            preprocessor.preprocess_array(pixels, out=slot)
+        return batch, buffer
+
+    def infer(prepared: Tuple[List[Decoded], np.ndarray]) -> List[Row]:
+        batch, buffer = prepared
+        predictions = iter(classifier.predict_batch(buffer, k) if len(buffer) else [])
+        rows = []
+        for key, pixels, error in batch:
+            top = next(predictions) if pixels is not None else []
+            rows.append(
+                {
+                    "path": key,
+                    "labels": [label for label, _ in top],
+                    "scores": [score for _, score in top],
+                    "error": error,
+                }
+            )
+        return rows
+
+    # Preprocessing and inference of the next batches overlap with writing,
+    # and decoding runs ahead in the process pool
+    pipeline = Pipeline(
+        "bulk",
+        [
+            Stage("preprocess", preprocess, workers=preprocess_workers, queue_size=2),
+            Stage("inference", infer, queue_size=2),
+        ],
+    )
+    finished = False
+    last_checkpoint = completed
+    try:
+        batches = _chunks(
+            decode_in_pool(items, preprocessor, workers, chunk_size), batch_size
+        )
+        for future in pipeline.map(batches):
+            rows = future.result()
+            writer.write(rows)
+            checkpoint.add(row["path"] for row in rows)
+            completed += len(rows)
+            progress.update(len(rows))
+            if completed - last_checkpoint >= checkpoint_every:
+                checkpoint.save(completed, writer.flush())
+                last_checkpoint = completed
+        started = saved["completed"] if saved else 0
+        finished = limit is None or completed - started < limit
+    finally:
+        pipeline.close()
+        state = writer.flush()
+        writer.close()
+        if finished:
+            checkpoint.remove()
+        else:
+            checkpoint.save(completed, state)
+        progress.report()
+    return completed - (saved["completed"] if saved else 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "source",
+        type=Path,
+        help="Directory, zip or tar archive, or manifest with one path per line",
+    )
+    parser.add_argument("output", type=Path, help="Output file, .jsonl/.csv/.parquet")
+    parser.add_argument("--format", choices=FORMATS, dest="output_format")
+    parser.add_argument(
+        "--model",
+        default=settings.DEFAULT_MODEL,
+        choices=list(settings.model_configs()),
+    )
+    parser.add_argument("--k", type=int, default=5, help="Predictions per image")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Decoding processes, 0 to decode in the main process",
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--preprocess-workers",
+        type=int,
+        default=2,
+        help="Threads normalizing batches while the model runs",
+    )
+    parser.add_argument("--checkpoint-every", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, help="Stop after this many images")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    count = classify(
+        args.source,
+        args.output,
+        model=args.model,
+        k=args.k,
+        output_format=args.output_format,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        preprocess_workers=args.preprocess_workers,
+        checkpoint_every=args.checkpoint_every,
+        limit=args.limit,
+        overwrite=args.overwrite,
+    )
+    print(f"Classified {count:,} images in {time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Script to export models with their weights in a separate, mappable file
+
+Optimizes each configured model with ONNX Runtime and writes, next to it:
+
+    <model>.shared.onnx     the optimized graph, weights stored externally
+    <model>.shared.weights  the weights, each aligned to ALIGNMENT bytes
+    <model>.shared.json     name, dtype, shape and offset of each weight
+
+With MODEL_SHARED_WEIGHTS set, the workers then memory-map the weights file
+instead of each loading its own copy of the model:
+
+    python -m scripts.export_shared_weights                # all models
+    python -m scripts.export_shared_weights --model models/resnet50.onnx
+
+Requires the optional quantization dependencies for the onnx package:
+
+    uv pip install -e ".[quantization]"
+"""
+
+import argparse
+import hashlib
+import json
+import tempfile
+from pathlib import Path
+from typing import List
+
+from src.classifier.session import create_session_options
+from src.classifier.weights import shared_index_path, shared_model_path
+from src.core.config import model_variant_path, settings
+
+ALIGNMENT = 64  # Bytes, the widest SIMD loads of the CPU kernels
+MIN_BYTES = 1024  # Smaller weights stay in the graph
+
+
+def optimize_model(model_path: Path, output_path: Path) -> None:
+    """Apply the graph optimizations of ORT_GRAPH_OPTIMIZATION_LEVEL offline"""
+    import onnxruntime as ort
+
+    options = create_session_options(
+        graph_optimization_level=settings.ORT_GRAPH_OPTIMIZATION_LEVEL
+    )
+    options.optimized_model_filepath = str(output_path)
+    ort.InferenceSession(
+        str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def export_shared_weights(model_path: Path, min_bytes: int = MIN_BYTES) -> Path:
+    """Export the optimized graph, the weights file and its index
+
+    Args:
+        model_path (Path): Path to the ONNX model file
+        min_bytes (int): Size from which a weight is moved to the weights file
+
+    Returns:
+        Path: Path of the written index
+    """
+    import numpy as np
+    import onnx
+    from onnx import numpy_helper
+    from onnx.external_data_helper import set_external_data
+
+    model_path = Path(model_path)
+    graph_path = shared_model_path(model_path)
+    index_path = shared_index_path(model_path)
+    weights_path = graph_path.with_suffix(".weights")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        optimized_path = Path(tmp) / "optimized.onnx"
+        optimize_model(model_path, optimized_path)
+        model = onnx.load(str(optimized_path))
+
+    tensors = []
+    with open(weights_path, "wb") as f:
+        for tensor in model.graph.initializer:
+            array = numpy_helper.to_array(tensor)
+            if array.dtype == object or array.nbytes < min_bytes:
+                continue
+            array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+            offset = (f.tell() + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+            f.seek(offset)
+            f.write(array.tobytes())
+            tensors.append(
+                {
+                    "name": tensor.name,
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                    "offset": offset,
+                }
+            )
+            set_external_data(tensor, weights_path.name, offset, array.nbytes)
+            for field in (
+                "raw_data",
+                "float_data",
+                "double_data",
+                "int32_data",
+                "int64_data",
+                "uint64_data",
+            ):
+                tensor.ClearField(field)
+            tensor.data_location = onnx.TensorProto.EXTERNAL
+
+    onnx.save(model, str(graph_path))
+    # Written last, so an index newer than the model means a complete export
+    index_path.write_text(
+        json.dumps(
+            {
+                "version": hashlib.blake2b(
+                    model_path.read_bytes(), digest_size=8
+                ).hexdigest(),
+                "weights": weights_path.name,
+                "tensors": tensors,
+            },
+            indent=2,
+        )
+    )
+    return index_path
+
+
+def configured_model_paths() -> List[Path]:
+    """Paths of the models loaded with the current settings"""
+    return [
+        model_variant_path(config.model_path, config.precision)
+        for config in settings.model_configs().values()
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export models with memory-mappable weights"
+    )
+    parser.add_argument(
+        "--model",
+        type=Path,
+        action="append",
+        help="Model to export, repeatable (default: all configured models)",
+    )
+    parser.add_argument("--min-bytes", type=int, default=MIN_BYTES)
+    args = parser.parse_args()
+
+    for model_path in args.model or configured_model_paths():
+        print(f"Exporting {model_path}...")
+        index_path = export_shared_weights(model_path, args.min_bytes)
+        tensors = json.loads(index_path.read_text())["tensors"]
+        print(f"Exported {len(tensors)} weights, index saved to {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Script to build reduced-precision variants of the ONNX model
+
+Writes the variants next to the FP32 model, named so that setting
+MODEL_PRECISION selects them:
+
+    python -m scripts.quantize_model                      # all variants
+    python -m scripts.quantize_model int8_static --calibration-dir ./photos
+
+Requires the optional quantization dependencies:
+
+    uv pip install -e ".[quantization]"
+"""
+
+import argparse
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from src.core.config import model_variant_path, settings
+from src.utils.files import find_images
+from src.utils.preprocessing import ImagePreprocessor
+
+PRECISIONS = ["int8_dynamic", "int8_static", "fp16"]
+DEFAULT_CALIBRATION_DIR = Path(__file__).parent.parent / "images"
+
+
+class ImageCalibrationReader:
+    def __init__(self, image_paths: List[Path], input_name: str):
+        """Feeds preprocessed images to the static quantization calibrator.
+
+        Args:
+            image_paths (List[Path]): Images to calibrate activation ranges on
+            input_name (str): Name of the model input
+        """
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.preprocessor = ImagePreprocessor(
+            settings.IMAGE_SIZE,
+            resize_mode=settings.PREPROCESS_RESIZE_MODE,
+            normalization=settings.PREPROCESS_NORMALIZATION,
+            crop_ratio=settings.PREPROCESS_CROP_RATIO,
+        )
+        self._inputs: Optional[Iterator[dict[str, np.ndarray]]] = None
+
+    def get_next(self) -> Optional[dict[str, np.ndarray]]:
+        if self._inputs is None:
+            self._inputs = (
+                {
+                    self.input_name: self.preprocessor.preprocess(
+                        Image.open(path).convert("RGB")
+                    )
+                }
+                for path in self.image_paths
+            )
+        return next(self._inputs, None)
+
+    def rewind(self) -> None:
+        self._inputs = None
+
+
+def quantize_dynamic_int8(model_path: Path, output_path: Path) -> None:
+    """Quantize weights to INT8, activations are quantized on the fly"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+
+
+def quantize_static_int8(
+    model_path: Path, output_path: Path, calibration_images: List[Path]
+) -> None:
+    """Quantize weights and activations to INT8 using calibrated ranges"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quant_pre_process,
+        quantize_static,
+    )
+
+    if not calibration_images:
+        raise ValueError("Static quantization needs at least one calibration image")
+
+    input_name = (
+        ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        .get_inputs()[0]
+        .name
+    )
+
+    # Shape inference and graph cleanup make calibration more reliable
+    prepared_path = output_path.with_name(f"{output_path.stem}.prepared.onnx")
+    quant_pre_process(model_path, prepared_path)
+    try:
+        quantize_static(
+            prepared_path,
+            output_path,
+            ImageCalibrationReader(calibration_images, input_name),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+    finally:
+        prepared_path.unlink(missing_ok=True)
+
+
+def convert_fp16(model_path: Path, output_path: Path) -> None:
+    """Convert weights and activations to FP16, keeping FP32 inputs and outputs"""
+    import onnx
+    from onnxconverter_common import float16
+
+    model = float16.convert_float_to_float16(
+        onnx.load(str(model_path)), keep_io_types=True
+    )
+    onnx.save(model, str(output_path))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build quantized model variants")
+    parser.add_argument(
+        "precisions",
+        nargs="*",
+        choices=PRECISIONS,
+        default=PRECISIONS,
+        help="Variants to build (default: all)",
+    )
+    parser.add_argument("--model", type=Path, default=settings.MODEL_PATH)
+    parser.add_argument(
+        "--calibration-dir",
+        type=Path,
+        default=DEFAULT_CALIBRATION_DIR,
+        help="Images used to calibrate static quantization",
+    )
+    args = parser.parse_args()
+
+    for precision in args.precisions:
+        output_path = model_variant_path(args.model, precision)
+        print(f"Building {precision} model...")
+        if precision == "int8_dynamic":
+            quantize_dynamic_int8(args.model, output_path)
+        elif precision == "int8_static":
+            quantize_static_int8(
+                args.model, output_path, find_images(args.calibration_dir)
+            )
+        else:
+            convert_fp16(args.model, output_path)
+        print(f"Model saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
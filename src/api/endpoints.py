@@ -1,55 +1,424 @@
 """API endpoints for the image classification model"""
 
-from fastapi import APIRouter, UploadFile
+import asyncio
+import secrets
+from typing import Any, Dict, List, Optional, Union
 
+import numpy as np
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.exceptions import RequestValidationError
+
+from src.api.responses import (
+    ResponseFormat,
+    batch_item_content,
+    encode_response,
+    negotiate_media_type,
+    openapi_responses,
+    prediction_content,
+)
 from src.api.schemas import (
+    BatchPredictionResponse,
+    CompactBatchPredictionResponse,
+    CompactPredictionResponse,
     HealthCheckResponse,
     ModelInfo,
-    PredictionItem,
+    ModelListResponse,
+    ModelSummary,
     PredictionResponse,
+    ReadinessResponse,
 )
+from src.core import tracing
 from src.core.config import settings
-from src.services.inference import get_classifier
-from src.utils.preprocessing import validate_image
+from src.core.exceptions import ModelError, UploadRejectedError, ValidationError
+from src.services.cache import PredictionCache, Predictions
+from src.services.executor import InferenceExecutor
+from src.services.inference import (
+    get_executor,
+    get_prediction_cache,
+    get_readiness,
+    get_registry,
+)
+from src.services.registry import LoadedModel
+from src.utils.archives import extract_archive, is_archive
+from src.utils.preprocessing import prepare_array_input, prepare_input
+from src.utils.uploads import read_files, read_upload
 
 router = APIRouter()
 
 
-@router.post("/predict", response_model=PredictionResponse)
-async def predict(file: UploadFile) -> PredictionResponse:
-    """Predict endpoint"""
-    contents = await file.read()
-    image = await validate_image(contents)
+TopK = Query(
+    settings.TOP_K,
+    ge=1,
+    le=settings.TOP_K_MAX,
+    description="Number of most likely classes to return",
+)
+
+ModelName = Query(
+    None, description="Name of the model to use, the default model when omitted"
+)
+
+# /predict reads its body itself, so describe the input modes for the OpenAPI schema
+BINARY_SCHEMA = {"type": "string", "format": "binary"}
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "description": (
+            "An encoded image as the `file` form field or as the raw body, or "
+            "decoded uint8 RGB pixels as a .npy array of shape (H, W, 3) or as "
+            "raw HWC bytes with an `X-Image-Shape: H,W,3` header"
+        ),
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": BINARY_SCHEMA},
+                    "required": ["file"],
+                }
+            },
+            "application/octet-stream": {"schema": BINARY_SCHEMA},
+            "image/*": {"schema": BINARY_SCHEMA},
+            "application/x-npy": {"schema": BINARY_SCHEMA},
+        },
+    }
+}
+
+BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": BINARY_SCHEMA}},
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+Format = Query(
+    "objects",
+    description='"objects" for a list of {class_name, confidence} objects, '
+    '"compact" for parallel "labels" and "scores" arrays',
+)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Allow a request to an admin endpoint only with the ADMIN_TOKEN
 
-    classifier = get_classifier()
-    top_predictions = classifier.predict(image, settings.IMAGE_SIZE)
+    Raises:
+        HTTPException: 403 while ADMIN_TOKEN is unset, 401 for a missing or
+            wrong token
+    """
+    if settings.ADMIN_TOKEN is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled, set ADMIN_TOKEN to enable them",
+        )
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token"
+        )
 
-    predictions = [
-        PredictionItem(class_name=class_name, confidence=confidence)
-        for class_name, confidence in top_predictions
-    ]
 
-    return PredictionResponse(predictions=predictions)
+async def _classify(
+    executor: InferenceExecutor,
+    model: LoadedModel,
+    contents: Union[bytes, np.ndarray],
+    cache: Optional[PredictionCache],
+    cache_key: Optional[str],
+) -> Predictions:
+    """Decode and preprocess in the executor, then run through the batcher
+
+    Pixel arrays are already decoded and only preprocessed. With
+    PIPELINE_ENABLED the model's pipeline runs all three steps instead.
+    """
+    top_predictions: Predictions
+    if model.pipeline is not None:
+        top_predictions = await model.pipeline.predict(contents)
+    else:
+        prepare = (
+            prepare_array_input if isinstance(contents, np.ndarray) else prepare_input
+        )
+        input_array = await executor.run(prepare, contents, model.preprocessor)
+        top_predictions = await model.batcher.predict(input_array)
+    if cache is not None and cache_key is not None:
+        await cache.set_async(cache_key, top_predictions)
+    return top_predictions
+
+
+async def _cache_lookup(
+    cache: Optional[PredictionCache],
+    model: LoadedModel,
+    contents: Union[bytes, np.ndarray],
+) -> tuple[Optional[str], Optional[Predictions]]:
+    """Return the cache key and any cached predictions for the uploaded bytes"""
+    if cache is None:
+        return None, None
+    namespace = model.cache_namespace
+    data: Union[bytes, memoryview]
+    if isinstance(contents, np.ndarray):
+        # The same bytes are a different image with another shape
+        namespace += f":pixels{contents.shape}"
+        data = contents.data
+    else:
+        data = contents
+    with tracing.stage("cache_lookup"):
+        cache_key = cache.key(data, namespace)
+        return cache_key, await cache.get_async(cache_key)
+
+
+def _field_required(field: str) -> RequestValidationError:
+    """The validation error FastAPI gives for a missing form field"""
+    return RequestValidationError(
+        [
+            {
+                "type": "missing",
+                "loc": ("body", field),
+                "msg": "Field required",
+                "input": None,
+            }
+        ]
+    )
+
+
+async def _read_upload(request: Request) -> Union[bytes, np.ndarray]:
+    """The uploaded image, streamed in and checked before it is read in full"""
+    try:
+        contents = await read_upload(
+            request,
+            "file",
+            max_bytes=settings.UPLOAD_MAX_BYTES,
+            max_pixels=settings.UPLOAD_MAX_PIXELS,
+        )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message) from e
+    if contents is None:
+        raise _field_required("file")
+    return contents
+
+
+@router.post(
+    "/predict",
+    response_model=Union[PredictionResponse, CompactPredictionResponse],
+    responses=openapi_responses(PredictionResponse, CompactPredictionResponse),
+    openapi_extra=UPLOAD_REQUEST_BODY,
+)
+async def predict(
+    request: Request,
+    k: int = TopK,
+    model: Optional[str] = ModelName,
+    format: ResponseFormat = Format,
+) -> Response:
+    """Predict endpoint
+
+    Takes an encoded image as the `file` field of a multipart/form-data body
+    or as the raw body, or decoded pixels that skip image decoding: a .npy
+    array (application/x-npy) or raw uint8 HWC bytes with an X-Image-Shape
+    header.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    with tracing.stage("upload_read"):
+        contents = await _read_upload(request)
+
+    async with get_registry().acquire_async(model) as loaded_model:
+        # Repeated uploads are answered before decoding or taking a worker slot
+        cache = get_prediction_cache()
+        cache_key, top_predictions = await _cache_lookup(cache, loaded_model, contents)
+        if top_predictions is None:
+            executor = get_executor()
+            async with executor.admit():
+                try:
+                    top_predictions = await _classify(
+                        executor, loaded_model, contents, cache, cache_key
+                    )
+                except ValidationError as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST, detail=e.message
+                    ) from e
+
+    return encode_response(prediction_content(top_predictions, k, format), media_type)
+
+
+@router.post(
+    "/predict/batch",
+    response_model=Union[BatchPredictionResponse, CompactBatchPredictionResponse],
+    responses=openapi_responses(
+        BatchPredictionResponse, CompactBatchPredictionResponse
+    ),
+    openapi_extra=BATCH_REQUEST_BODY,
+)
+async def predict_batch(
+    request: Request,
+    k: int = TopK,
+    model: Optional[str] = ModelName,
+    format: ResponseFormat = Format,
+) -> Response:
+    """Batch predict endpoint
+
+    Accepts many images, and zip or tar archives of images, in one request.
+    Failures are reported per file instead of failing the whole batch. The
+    files are streamed in like /predict uploads, with UPLOAD_MAX_BYTES per
+    file and BATCH_UPLOAD_MAX_BYTES for the whole body, and each image takes
+    its own executor slot.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    try:
+        with tracing.stage("upload_read"):
+            files = await read_files(
+                request,
+                "files",
+                max_file_bytes=settings.UPLOAD_MAX_BYTES,
+                max_bytes=settings.BATCH_UPLOAD_MAX_BYTES,
+                max_files=settings.BATCH_MAX_FILES,
+            )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message) from e
+    if not files:
+        raise _field_required("files")
+
+    # Each image, or each archive that failed to extract with its error, in
+    # upload order
+    uploads: List[tuple[str, bytes, Optional[str]]] = []
+    for index, (name, contents) in enumerate(files):
+        filename = name or f"file_{index}"
+        if not is_archive(contents):
+            uploads.append((filename, contents, None))
+            continue
+        try:
+            # Decompressing up to BATCH_MAX_ARCHIVE_BYTES would block the loop
+            members = await asyncio.to_thread(
+                extract_archive,
+                contents,
+                max_members=settings.BATCH_MAX_FILES,
+                max_total_bytes=settings.BATCH_MAX_ARCHIVE_BYTES,
+            )
+        except ValidationError as e:
+            uploads.append((filename, b"", e.message))
+            continue
+        uploads.extend((f"{filename}/{name}", data, None) for name, data in members)
+
+    images = sum(error is None for _, _, error in uploads)
+    if images > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many images, the limit is {settings.BATCH_MAX_FILES}",
+        )
+
+    async def classify_item(
+        filename: str, contents: bytes, error: Optional[str]
+    ) -> Dict[str, Any]:
+        if error is not None:
+            return batch_item_content(filename, None, k, format, error)
+        cache_key, top_predictions = await _cache_lookup(cache, loaded_model, contents)
+        try:
+            if top_predictions is None:
+                top_predictions = await _classify(
+                    executor, loaded_model, contents, cache, cache_key
+                )
+        except (ValidationError, ModelError) as e:
+            return batch_item_content(filename, None, k, format, e.message)
+        return batch_item_content(filename, top_predictions, k, format)
+
+    cache = get_prediction_cache()
+    executor = get_executor()
+    async with get_registry().acquire_async(model) as loaded_model:
+        async with executor.admit(slots=images):
+            # Decoding runs in parallel in the executor and concurrent items are
+            # grouped into model batches by the micro-batcher
+            results = await asyncio.gather(
+                *(classify_item(*upload) for upload in uploads)
+            )
+
+    return encode_response({"results": list(results)}, media_type)
 
 
 @router.get("/model-info", response_model=ModelInfo)
-async def get_model_info() -> ModelInfo:
+async def get_model_info(model: Optional[str] = ModelName) -> ModelInfo:
     """Get model information including architecture and input/output shapes"""
-    classifier = get_classifier()
-    session = classifier.session
+    loaded_model = await get_registry().get_async(model)
+    session = loaded_model.classifier.session
 
     input_details = session.get_inputs()[0]
     output_details = session.get_outputs()[0]
 
     return ModelInfo(
-        name="SqueezeNet 1.1",
-        description="A lightweight CNN model for image classification, offering a smaller architecture with reduced computational requirements",
+        name=loaded_model.config.display_name,
+        description=loaded_model.config.description,
         input_shape=list(input_details.shape),
         output_shape=list(output_details.shape),
+        version=loaded_model.version,
+    )
+
+
+def _model_summary(name: str) -> ModelSummary:
+    registry = get_registry()
+    loaded_model = next((m for m in registry.loaded() if m.name == name), None)
+    summary = ModelSummary(
+        name=name,
+        display_name=registry.configs[name].display_name,
+        is_default=name == registry.default,
+        loaded=loaded_model is not None,
+    )
+    if loaded_model is not None:
+        summary.version = loaded_model.version
+        summary.loaded_at = loaded_model.loaded_at
+        summary.memory_bytes = loaded_model.memory_bytes
+        summary.inference_count = loaded_model.inference_count
+        summary.mean_inference_ms = loaded_model.mean_inference_ms
+    return summary
+
+
+@router.get("/models", response_model=ModelListResponse)
+async def list_models() -> ModelListResponse:
+    """List configured models with their version, memory use and latency"""
+    return ModelListResponse(
+        models=[_model_summary(name) for name in get_registry().configs]
     )
 
 
+@router.post(
+    "/models/{name}/reload",
+    response_model=ModelSummary,
+    dependencies=[Depends(require_admin)],
+)
+async def reload_model(name: str) -> ModelSummary:
+    """Load a new version of a model and swap it in without dropping requests
+
+    Reloads the model file of a configured model with the server's
+    configuration, and requires the X-Admin-Token header. Only affects the
+    worker process that handles the request; use MODEL_RELOAD_CHECK_SECONDS to
+    roll out a replaced model file to all workers.
+    """
+    await asyncio.to_thread(get_registry().reload, name)
+    return _model_summary(name)
+
+
 @router.get("/health", response_model=HealthCheckResponse)
 def health_check() -> HealthCheckResponse:
     """Health check endpoint"""
     return HealthCheckResponse(status="OK")
+
+
+def readiness_check(response: Response) -> ReadinessResponse:
+    """Readiness endpoint, 503 until the models are loaded and warmed up"""
+    readiness = get_readiness()
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResponse(
+        status=readiness.status,
+        error=readiness.error,
+        startup_seconds=readiness.phases,
+    )
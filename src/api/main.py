@@ -1,26 +1,107 @@
 """Main FastAPI application module"""
 
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
-from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from src.api.endpoints import health_check, router
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from src.api.endpoints import health_check, readiness_check, router
+from src.api.schemas import ReadinessResponse
 from src.core.config import settings
-from src.core.middleware import MonitoringMiddleware
+from src.core.exceptions import ModelError, ModelNotFoundError, ServiceOverloadedError
+from src.core.metrics import mark_worker_dead, multiprocess_dir, render_metrics
+from src.core.middleware import MonitoringMiddleware, RequestDecompressionMiddleware
+from src.services.inference import get_readiness, get_registry
+from src.services.registry import warmup_batch_sizes, warmup_models
+from src.services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    readiness = get_readiness()
+    warmup = None
+    if settings.WARMUP_ENABLED:
+        # In a thread, so /health and /metrics answer while models load
+        warmup = asyncio.create_task(
+            asyncio.to_thread(
+                warm_up,
+                get_registry(),
+                readiness,
+                warmup_models(),
+                warmup_batch_sizes(),
+                settings.WARMUP_RUNS,
+            )
+        )
+    else:
+        readiness.mark_ready()
+    yield
+    if warmup is not None:
+        await warmup
+    # Live gauges of this worker must not outlive it in multiprocess mode
+    mark_worker_dead(os.getpid())
 
 
 def create_app() -> FastAPI:
     app = FastAPI(
-        title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
+        title=settings.PROJECT_NAME,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        lifespan=lifespan,
     )
 
+    app.add_middleware(
+        RequestDecompressionMiddleware,
+        max_size=settings.REQUEST_MAX_DECOMPRESSED_BYTES,
+        # Per route limits apply to the decompressed body, so allow the largest
+        max_compressed_size=max(
+            settings.UPLOAD_MAX_BYTES, settings.BATCH_UPLOAD_MAX_BYTES
+        ),
+    )
     app.add_middleware(MonitoringMiddleware)
 
+    @app.exception_handler(ServiceOverloadedError)
+    async def overloaded_handler(
+        request: Request, exc: ServiceOverloadedError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": exc.message},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+    @app.exception_handler(ModelNotFoundError)
+    async def model_not_found_handler(
+        request: Request, exc: ModelNotFoundError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND, content={"detail": exc.message}
+        )
+
+    @app.exception_handler(ModelError)
+    async def model_error_handler(request: Request, exc: ModelError) -> JSONResponse:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": exc.message},
+        )
+
     app.get("/health")(health_check)
+    app.get(
+        "/ready",
+        response_model=ReadinessResponse,
+        responses={503: {"model": ReadinessResponse}},
+    )(readiness_check)
 
     @app.get("/metrics", include_in_schema=False)
     async def metrics() -> PlainTextResponse:
-        return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+        if multiprocess_dir() is None:
+            content = render_metrics()
+        else:
+            # Merging the files of every worker is file IO, keep it off the loop
+            content = await asyncio.to_thread(render_metrics)
+        return PlainTextResponse(content, media_type=CONTENT_TYPE_LATEST)
 
     app.include_router(router, prefix=settings.API_V1_STR)
 
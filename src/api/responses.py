@@ -0,0 +1,144 @@
+"""Fast encoding of prediction responses
+
+Prediction results are encoded straight from the (label, confidence) tuples
+the classifier returns, without building and validating Pydantic models per
+prediction. The schemas in src.api.schemas still describe the output for the
+OpenAPI documentation.
+"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+import orjson
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+
+from src.core import tracing
+from src.services.cache import Predictions
+
+try:
+    import msgpack
+except ImportError:  # Optional, install the msgpack extra to enable it
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+ResponseFormat = Literal["objects", "compact"]
+
+
+def prediction_content(
+    top_predictions: Predictions, k: int, format: ResponseFormat
+) -> Dict[str, Any]:
+    """Response body of one prediction as plain Python objects
+
+    Args:
+        top_predictions (Predictions): (label, confidence) tuples, best first
+        k (int): Number of predictions to include
+        format (str): "objects" for PredictionResponse, "compact" for
+            CompactPredictionResponse
+
+    Returns:
+        dict: The response body
+    """
+    predictions = top_predictions[:k]
+    if format == "compact":
+        return {
+            "labels": [label for label, _ in predictions],
+            "scores": [confidence for _, confidence in predictions],
+        }
+    return {
+        "predictions": [
+            {"class_name": label, "confidence": confidence}
+            for label, confidence in predictions
+        ]
+    }
+
+
+def batch_item_content(
+    filename: str,
+    top_predictions: Optional[Predictions],
+    k: int,
+    format: ResponseFormat,
+    error: Optional[str] = None,
+) -> Dict[str, Any]:
+    """One entry of a batch response, see `prediction_content`"""
+    content = prediction_content(top_predictions or [], k, format)
+    return {"filename": filename, **content, "error": error}
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """Pick the response media type from an Accept header
+
+    MessagePack is used when the client lists it and the msgpack package is
+    installed, JSON otherwise.
+
+    Raises:
+        HTTPException: 406 if the client accepts neither
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    accepted = set()
+    for entry in accept.split(","):
+        media_type, *params = entry.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+    if msgpack is not None:
+        for media_type in MSGPACK_MEDIA_TYPES:
+            if media_type in accepted:
+                return media_type
+    if accepted & {JSON_MEDIA_TYPE, "application/*", "*/*"}:
+        return JSON_MEDIA_TYPE
+    raise HTTPException(
+        status_code=status.HTTP_406_NOT_ACCEPTABLE,
+        detail="Supported media types: " + ", ".join(supported_media_types()),
+    )
+
+
+def supported_media_types() -> List[str]:
+    """Media types prediction responses can be encoded in"""
+    return [JSON_MEDIA_TYPE, *(MSGPACK_MEDIA_TYPES if msgpack is not None else ())]
+
+
+def encode_response(content: Dict[str, Any], media_type: str) -> Response:
+    """Encode a response body, timing it as its own stage
+
+    Args:
+        content (dict): The response body as plain Python objects
+        media_type (str): A media type returned by `negotiate_media_type`
+
+    Returns:
+        Response: The encoded response
+    """
+    with tracing.stage("serialize"):
+        if media_type == JSON_MEDIA_TYPE:
+            body = orjson.dumps(content)
+        else:
+            body = msgpack.packb(content)
+        return Response(body, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def openapi_responses(*models: type[BaseModel]) -> Dict[int | str, Dict[str, Any]]:
+    """OpenAPI description of the MessagePack variant of a response
+
+    The JSON variant is documented by the route's response_model.
+    """
+    schema = {
+        "anyOf": [
+            {"$ref": f"#/components/schemas/{model.__name__}"} for model in models
+        ]
+    }
+    return {
+        200: {
+            "description": "JSON, or MessagePack when requested with "
+            "`Accept: application/msgpack` and the msgpack package is installed",
+            "content": {MSGPACK_MEDIA_TYPES[0]: {"schema": schema}},
+        }
+    }
@@ -1,6 +1,6 @@
 """API schemas for the image classification model"""
 
-from typing import List
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -14,12 +14,60 @@ class PredictionResponse(BaseModel):
     predictions: List[PredictionItem]
 
 
+class BatchPredictionItem(PredictionResponse):
+    filename: str
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+
+
+class CompactPredictionResponse(BaseModel):
+    """Predictions as parallel arrays, returned with `?format=compact`"""
+
+    labels: List[str]
+    scores: List[float]
+
+
+class CompactBatchPredictionItem(CompactPredictionResponse):
+    filename: str
+    error: Optional[str] = None
+
+
+class CompactBatchPredictionResponse(BaseModel):
+    results: List[CompactBatchPredictionItem]
+
+
 class ModelInfo(BaseModel):
     name: str
     description: str
     input_shape: List[int]
     output_shape: List[int]
+    version: Optional[str] = None
+
+
+class ModelSummary(BaseModel):
+    name: str
+    display_name: str
+    is_default: bool
+    loaded: bool
+    version: Optional[str] = None
+    loaded_at: Optional[float] = None
+    memory_bytes: Optional[int] = None
+    inference_count: Optional[int] = None
+    mean_inference_ms: Optional[float] = None
+
+
+class ModelListResponse(BaseModel):
+    models: List[ModelSummary]
 
 
 class HealthCheckResponse(BaseModel):
     status: str
+
+
+class ReadinessResponse(BaseModel):
+    status: Literal["starting", "ready", "failed"]
+    error: Optional[str] = None
+    startup_seconds: Dict[str, float] = {}
@@ -1,35 +1,79 @@
 """Image Classifier module for image classification"""
 
+import hashlib
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 
 import numpy as np
-import onnxruntime as ort
 from loguru import logger
-from PIL import Image
-from scipy.special import softmax
 
+from src.classifier.postprocessing import top_k
+from src.classifier.session import add_shared_initializers, create_session
+from src.classifier.weights import map_weights, weights_version
+from src.core import tracing
 from src.core.exceptions import ModelError
 from src.utils.preprocessing import preprocess_image
 
+if TYPE_CHECKING:
+    import onnxruntime as ort
+    from PIL import Image
+
 
 class ImageClassifier:
-    def __init__(self, model_path: Path, labels_path: Path):
+    def __init__(
+        self,
+        model_path: Path,
+        labels_path: Path,
+        session_options: Optional["ort.SessionOptions"] = None,
+        optimized_model_path: Optional[Path] = None,
+        shared_weights: Optional[Path] = None,
+    ):
         """Image Classifier module for image classification.
 
         Args:
             model_path (Path): Path to the ONNX model file
             labels_path (Path): Path to the labels file
+            session_options (ort.SessionOptions, optional): ONNX Runtime options
+            optimized_model_path (Path, optional): Where to persist and reload the
+                optimized graph to speed up later starts
+            shared_weights (Path, optional): Index of weights exported by
+                `scripts/export_shared_weights.py` for `model_path`, to run on
+                the memory-mapped weights file shared by all workers
 
         Attributes:
             session: ONNX Runtime session for inference
             labels: List of class labels
+            version: Short content hash of the model file
+            max_batch_size: Fixed batch dimension of the model input, or None
+                when the model accepts any batch size
         """
         try:
-            self.session = ort.InferenceSession(
-                str(model_path), providers=["CPUExecutionProvider"]
+            self._initializers: List["ort.OrtValue"] = []
+            if shared_weights is not None:
+                import onnxruntime as ort
+
+                session_options = session_options or ort.SessionOptions()
+                self._initializers = add_shared_initializers(
+                    session_options, map_weights(shared_weights)
+                )
+            self.session = create_session(
+                model_path, session_options, optimized_model_path
             )
             self.labels = self._load_labels(labels_path)
+            # The shared graph holds no weights, so use the exported model's hash
+            self.version = (
+                weights_version(shared_weights)
+                if shared_weights is not None
+                else hashlib.blake2b(
+                    Path(model_path).read_bytes(), digest_size=8
+                ).hexdigest()
+            )
+            self.input_name = self.session.get_inputs()[0].name
+            self.output_name = self.session.get_outputs()[0].name
+            batch_dim = self.session.get_inputs()[0].shape[0]
+            self.max_batch_size = (
+                batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+            )
             logger.info(f"Model loaded from {model_path}")
         except Exception as e:
             raise ModelError(f"Failed to initialize model: {str(e)}") from e
@@ -52,34 +96,79 @@ class ImageClassifier:
             raise ModelError(f"Failed to load labels: {str(e)}") from e
 
     def predict(
-        self, image: Image.Image, size: tuple[int, int]
+        self, image: "Image.Image", size: tuple[int, int], k: int = 10
     ) -> List[tuple[str, float]]:
         """Predict the class of the given image.
 
         Args:
             image (PIL.Image.Image): PIL Image object
             size (tuple[int, int]): Tuple of image width and height
+            k (int): Number of top predictions to return
 
         Returns:
             List of tuples containing class name and confidence
         """
         try:
             input_array = preprocess_image(image, size)
-            input_name = self.session.get_inputs()[0].name
-            output_name = self.session.get_outputs()[0].name
+        except Exception as e:
+            raise ModelError(f"Prediction failed: {str(e)}") from e
+        return self.predict_batch(input_array, k)[0]
 
-            predictions = self.session.run([output_name], {input_name: input_array})[0]
+    def predict_batch(
+        self, batch: np.ndarray, k: int = 10
+    ) -> List[List[tuple[str, float]]]:
+        """Predict the classes of a batch of preprocessed images.
 
-            # Apply softmax to convert logits to probabilities
-            probabilities = softmax(predictions[0])
-            top_indices = np.argsort(probabilities)[-10:][::-1]
+        Args:
+            batch (np.ndarray): Preprocessed images stacked in NCHW format
+            k (int): Number of top predictions to return per image
 
-            return [
-                (
-                    self.labels[idx],
-                    float(probabilities[idx]),
-                )
-                for idx in top_indices
-            ]
+        Returns:
+            One list of (class name, confidence) tuples per image in the batch
+        """
+        try:
+            with tracing.stage("session_run", batch_size=len(batch)):
+                logits = self._run(batch)
+            with tracing.stage("postprocess"):
+                indices, probabilities = top_k(logits, k)
+                return [
+                    [
+                        (self.labels[idx], confidence)
+                        for idx, confidence in zip(
+                            row_indices, row_probabilities, strict=True
+                        )
+                    ]
+                    for row_indices, row_probabilities in zip(
+                        indices.tolist(), probabilities.tolist(), strict=True
+                    )
+                ]
         except Exception as e:
             raise ModelError(f"Prediction failed: {str(e)}") from e
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Run the model on a batch, splitting it if the model has a fixed batch size.
+
+        Args:
+            batch (np.ndarray): Preprocessed images stacked in NCHW format
+
+        Returns:
+            np.ndarray: Raw model outputs with one row per image
+        """
+        if self.max_batch_size is None or len(batch) == self.max_batch_size:
+            return np.asarray(
+                self.session.run([self.output_name], {self.input_name: batch})[0]
+            )
+
+        outputs = []
+        for start in range(0, len(batch), self.max_batch_size):
+            chunk = batch[start : start + self.max_batch_size]
+            count = len(chunk)
+            if count < self.max_batch_size:
+                # Pad the last chunk up to the fixed batch size the model expects
+                padding = np.zeros(
+                    (self.max_batch_size - count, *chunk.shape[1:]), dtype=chunk.dtype
+                )
+                chunk = np.concatenate([chunk, padding])
+            output = self.session.run([self.output_name], {self.input_name: chunk})[0]
+            outputs.append(output[:count])
+        return np.concatenate(outputs)
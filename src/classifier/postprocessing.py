@@ -0,0 +1,48 @@
+"""Post-processing of model outputs into top-k class probabilities"""
+
+import numpy as np
+
+
+def softmax(logits: np.ndarray, axis: int = -1) -> np.ndarray:
+    """Numerically stable softmax
+
+    Args:
+        logits (np.ndarray): Raw model outputs
+        axis (int): Axis to normalize over
+
+    Returns:
+        np.ndarray: Probabilities with the same shape as `logits`
+    """
+    exp = np.exp(logits - np.max(logits, axis=axis, keepdims=True))
+    probabilities: np.ndarray = exp / np.sum(exp, axis=axis, keepdims=True)
+    return probabilities
+
+
+def top_k(logits: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Select the k most likely classes for each row of a batch of logits
+
+    Uses a partial selection instead of sorting all classes, and computes
+    softmax probabilities only for the selected classes.
+
+    Args:
+        logits (np.ndarray): Raw model outputs of shape (N, C)
+        k (int): Number of classes to return per row, capped at C
+
+    Returns:
+        Tuple of class indices and probabilities, both of shape (N, k) and
+        sorted by descending probability
+    """
+    logits = np.asarray(logits, dtype=np.float32)
+    k = max(1, min(k, logits.shape[1]))
+
+    indices = np.argpartition(logits, -k, axis=1)[:, -k:]
+    values = np.take_along_axis(logits, indices, axis=1)
+    order = np.argsort(-values, axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+
+    # The row max is the first selected value; only the normalizer needs all C
+    row_max = values[:, :1]
+    normalizer = np.sum(np.exp(logits - row_max), axis=1, keepdims=True)
+    probabilities = np.exp(values - row_max) / normalizer
+    return indices, probabilities
@@ -0,0 +1,184 @@
+"""ONNX Runtime session configuration"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    import numpy as np
+    import onnxruntime as ort
+
+# onnxruntime is imported when the first session is created, not with the
+# API, so these name the enum members instead of holding them
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+def create_session_options(
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    execution_mode: Literal["sequential", "parallel"] = "sequential",
+    graph_optimization_level: Literal["disable", "basic", "extended", "all"] = "all",
+    enable_cpu_mem_arena: bool = True,
+    enable_mem_pattern: bool = True,
+    allow_spinning: bool = True,
+) -> "ort.SessionOptions":
+    """Build ONNX Runtime session options
+
+    Args:
+        intra_op_threads (int): Threads used inside an operator, 0 for the default
+        inter_op_threads (int): Threads used across operators in parallel mode,
+            0 for the default
+        execution_mode (str): "sequential" or "parallel" operator execution
+        graph_optimization_level (str): "disable", "basic", "extended" or "all"
+        enable_cpu_mem_arena (bool): Use the CPU memory arena allocator
+        enable_mem_pattern (bool): Preallocate memory based on the first run
+        allow_spinning (bool): Let idle worker threads spin instead of sleeping;
+            disable when several processes share the same cores
+
+    Returns:
+        ort.SessionOptions: The session options
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[execution_mode])
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+    )
+    options.enable_cpu_mem_arena = enable_cpu_mem_arena
+    options.enable_mem_pattern = enable_mem_pattern
+    spinning = "1" if allow_spinning else "0"
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return options
+
+
+def add_shared_initializers(
+    options: "ort.SessionOptions", initializers: Dict[str, "np.ndarray"]
+) -> List["ort.OrtValue"]:
+    """Make a session use the given arrays as weights instead of copying them
+
+    ONNX Runtime runs the session directly on the arrays, so arrays mapped from
+    a file stay shared with every other process mapping it. Prepacking is
+    disabled because it would copy the weights into a private buffer, and graph
+    optimizations because they may rewrite the weights; run them offline
+    before exporting the weights instead.
+
+    Args:
+        options (ort.SessionOptions): Options of the session to create
+        initializers (Dict[str, np.ndarray]): Weights by initializer name
+
+    Returns:
+        List[ort.OrtValue]: The values wrapping the arrays, which must be kept
+            alive as long as the session
+    """
+    import onnxruntime as ort
+
+    values = []
+    for name, array in initializers.items():
+        value = ort.OrtValue.ortvalue_from_numpy(array)
+        options.add_initializer(name, value)
+        values.append(value)
+    options.add_session_config_entry("session.disable_prepacking", "1")
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    return values
+
+
+def optimized_model_path(
+    directory: Path, model_path: Path, graph_optimization_level: str
+) -> Path:
+    """Where to persist the optimized graph of a model in `directory`
+
+    The graph depends on the optimization level and on the ONNX Runtime
+    version that built it, so both are part of the name: changing either
+    builds a new graph instead of reusing one built for the other.
+
+    Args:
+        directory (Path): Directory of the optimized graphs
+        model_path (Path): Path to the ONNX model file
+        graph_optimization_level (str): "disable", "basic", "extended" or "all"
+
+    Returns:
+        Path: Path of the optimized graph
+    """
+    import onnxruntime as ort
+
+    name = f"{Path(model_path).stem}.{graph_optimization_level}.ort{ort.__version__}"
+    return Path(directory) / f"{name}.optimized.onnx"
+
+
+def create_session(
+    model_path: Path,
+    options: Optional["ort.SessionOptions"] = None,
+    optimized_model_path: Optional[Path] = None,
+) -> "ort.InferenceSession":
+    """Create an inference session, reusing a persisted optimized graph if present
+
+    When `optimized_model_path` is set and the file is newer than the model, it
+    is loaded with graph optimizations disabled since they were already
+    applied. Otherwise the model is optimized as usual and the result written to
+    `optimized_model_path` for the next start. It is written to a temporary
+    file first and renamed into place, so other processes starting at the same
+    time never load a partly written graph.
+
+    Args:
+        model_path (Path): Path to the ONNX model file
+        options (ort.SessionOptions, optional): Session options to use
+        optimized_model_path (Path, optional): Where to persist the optimized graph
+
+    Returns:
+        ort.InferenceSession: The inference session
+    """
+    import onnxruntime as ort
+
+    options = options or ort.SessionOptions()
+    path = Path(model_path)
+
+    if optimized_model_path is not None:
+        optimized_model_path = Path(optimized_model_path)
+        if (
+            optimized_model_path.exists()
+            and optimized_model_path.stat().st_mtime >= path.stat().st_mtime
+        ):
+            logger.info(f"Loading optimized model from {optimized_model_path}")
+            options.graph_optimization_level = (
+                ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            )
+            path = optimized_model_path
+        else:
+            optimized_model_path.parent.mkdir(parents=True, exist_ok=True)
+            # The suffix tells ONNX Runtime to write the ONNX format
+            fd, temporary = tempfile.mkstemp(
+                suffix=".onnx",
+                prefix=f".{optimized_model_path.stem}.",
+                dir=optimized_model_path.parent,
+            )
+            os.close(fd)
+            options.optimized_model_filepath = temporary
+            try:
+                session = ort.InferenceSession(
+                    str(path), sess_options=options, providers=["CPUExecutionProvider"]
+                )
+                os.replace(temporary, optimized_model_path)
+            finally:
+                Path(temporary).unlink(missing_ok=True)
+            return session
+
+    return ort.InferenceSession(
+        str(path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
@@ -0,0 +1,83 @@
+"""Model weights memory-mapped from one file shared by all worker processes
+
+`scripts/export_shared_weights.py` writes an optimized copy of a model whose
+initializers live in a separate weights file, plus a JSON index of the
+tensors in it. Sessions created with `map_weights` run on read-only views of
+that file instead of private copies, so N workers keep one copy of the
+weights in the page cache instead of N copies on their heaps.
+"""
+
+import json
+import mmap
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def shared_model_path(model_path: Path) -> Path:
+    """Path of the shared-weights export of a model, next to the model"""
+    return model_path.with_name(f"{model_path.stem}.shared{model_path.suffix}")
+
+
+def shared_index_path(model_path: Path) -> Path:
+    """Path of the tensor index of the shared-weights export of a model"""
+    return model_path.with_name(f"{model_path.stem}.shared.json")
+
+
+@lru_cache(maxsize=None)
+def _map_file(path: Path, mtime: float) -> mmap.mmap:
+    # Keyed on the mtime so a re-exported file is mapped again
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _load(index_path: Path) -> Tuple[dict, mmap.mmap]:
+    index = json.loads(Path(index_path).read_text())
+    weights_path = Path(index_path).parent / index["weights"]
+    return index, _map_file(weights_path, weights_path.stat().st_mtime)
+
+
+def map_weights(index_path: Path) -> Dict[str, np.ndarray]:
+    """Read-only arrays of the exported tensors, backed by the weights file
+
+    The file is mapped once per process, so sessions of the same model share
+    the mapping, and processes share the pages through the page cache.
+
+    Args:
+        index_path (Path): The JSON index written by the export
+
+    Returns:
+        Dict[str, np.ndarray]: Initializer arrays by name
+    """
+    index, buffer = _load(index_path)
+    return {
+        tensor["name"]: np.ndarray(
+            tuple(tensor["shape"]),
+            dtype=np.dtype(tensor["dtype"]),
+            buffer=buffer,
+            offset=tensor["offset"],
+        )
+        for tensor in index["tensors"]
+    }
+
+
+def weights_version(index_path: Path) -> str:
+    """Content hash of the model the weights were exported from"""
+    return str(json.loads(Path(index_path).read_text())["version"])
+
+
+def preload_weights(index_path: Path) -> int:
+    """Map the weights file and start reading it into the page cache
+
+    Called in a pre-forking parent, so the workers forked afterwards inherit
+    the mapping and none of them waits for the disk on its first request.
+
+    Returns:
+        int: Size of the weights file in bytes
+    """
+    _, buffer = _load(index_path)
+    if hasattr(mmap, "MADV_WILLNEED") and len(buffer):
+        buffer.madvise(mmap.MADV_WILLNEED)
+    return len(buffer)
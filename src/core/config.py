@@ -1,10 +1,27 @@
 """Configuration settings for the image classification service"""
 
+import os
 from pathlib import Path
+from typing import Literal, Optional
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class ModelConfig(BaseModel):
+    """Configuration of one model served by the model registry"""
+
+    display_name: str
+    description: str = ""
+    model_path: Path
+    labels_path: Path
+    precision: Literal["fp32", "fp16", "int8_dynamic", "int8_static"] = "fp32"
+    image_size: tuple[int, int] = (224, 224)
+    resize_mode: Literal["resize", "center_crop"] = "resize"
+    normalization: Literal["unit", "imagenet"] = "unit"
+    crop_ratio: float = 0.875
+
+
 class Settings(BaseSettings):
     """Application settings"""
 
@@ -13,18 +30,156 @@ class Settings(BaseSettings):
     MODEL_PATH: Path = (
         Path(__file__).parent.parent.parent / "models/squeezenet1.1-7.onnx"
     )
+    # Which variant of MODEL_PATH to load, see scripts/quantize_model.py
+    MODEL_PRECISION: Literal["fp32", "fp16", "int8_dynamic", "int8_static"] = "fp32"
     LABELS_PATH: Path = (
         Path(__file__).parent.parent.parent / "models/imagenet_labels.txt"
     )
 
     IMAGE_SIZE: tuple[int, int] = (224, 224)
 
+    # Additional models served next to the default SqueezeNet model, as JSON:
+    # MODELS='{"resnet50": {"display_name": "ResNet-50", "model_path": ...}}'
+    MODELS: dict[str, ModelConfig] = {}
+    DEFAULT_MODEL: str = "squeezenet"  # Model used when a request names none
+    MODEL_RELOAD_CHECK_SECONDS: float = 0  # >0 hot-swaps models whose file changed
+    # Token required in the X-Admin-Token header of admin endpoints such as
+    # model reloads; they answer 403 while unset
+    ADMIN_TOKEN: Optional[str] = None
+
+    # Model warm-up at startup, /ready answers 503 until it finished
+    WARMUP_ENABLED: bool = True
+    WARMUP_MODELS: Optional[list[str]] = (
+        None  # Loaded at startup, DEFAULT_MODEL if unset
+    )
+    WARMUP_BATCH_SIZES: Optional[list[int]] = None  # 1 and BATCH_MAX_SIZE if unset
+    WARMUP_RUNS: int = 3  # Dummy inferences per batch size
+
+    TOP_K: int = 10  # Default number of predictions returned
+    TOP_K_MAX: int = 100  # Largest k a request may ask for
+
+    # ONNX Runtime session tuning
+    ORT_INTRA_OP_THREADS: int = 0  # 0 lets ONNX Runtime use all physical cores
+    ORT_INTER_OP_THREADS: int = 0
+    ORT_EXECUTION_MODE: Literal["sequential", "parallel"] = "sequential"
+    ORT_GRAPH_OPTIMIZATION_LEVEL: Literal["disable", "basic", "extended", "all"] = "all"
+    ORT_ENABLE_CPU_MEM_ARENA: bool = True
+    ORT_ENABLE_MEM_PATTERN: bool = True
+    ORT_ALLOW_SPINNING: bool = True  # Disable when several workers share cores
+    ORT_OPTIMIZED_MODEL_DIR: Optional[Path] = None  # Persisted optimized graphs
+    # Run on weights memory-mapped from the export of
+    # scripts/export_shared_weights.py, one copy shared by all workers
+    MODEL_SHARED_WEIGHTS: bool = False
+
+    # Image preprocessing
+    PREPROCESS_RESIZE_MODE: Literal["resize", "center_crop"] = "resize"
+    PREPROCESS_NORMALIZATION: Literal["unit", "imagenet"] = "unit"
+    PREPROCESS_CROP_RATIO: float = 0.875  # Fraction of the short side kept by crop
+
+    # Reduced-resolution decoding (JPEG DCT scaling, integer reduce for others)
+    DECODE_DRAFT: bool = True
+    DECODE_DRAFT_SCALE: float = 1.0  # Min source pixels per input pixel, >1 = sharper
+
+    # Dynamic micro-batching of concurrent prediction requests
+    # Max number of images stacked into one inference call, capped by a batch
+    # size fixed in the model; at 1 requests run without waiting for a batch
+    BATCH_MAX_SIZE: int = 8
+    BATCH_MAX_WAIT_MS: float = 2.0  # Max time a request waits for a batch to fill
+
+    # Latency histogram buckets, exponential unless listed explicitly
+    METRICS_BUCKETS_START: float = 0.001  # Upper bound of the first bucket, seconds
+    METRICS_BUCKETS_FACTOR: float = 2.0
+    METRICS_BUCKETS_COUNT: int = 14  # 1 ms to ~8 s with the defaults
+    METRICS_LATENCY_BUCKETS: Optional[list[float]] = None
+
+    # Per-stage latency histograms and span export
+    STAGE_TIMING_ENABLED: bool = True  # Off skips all stage timing at no cost
+    SPAN_EXPORT_PATH: Optional[Path] = None  # Append spans as JSON lines to this file
+
+    # Streaming upload ingest of /predict
+    UPLOAD_MAX_BYTES: int = 32 * 1024 * 1024  # Larger request bodies get a 413
+    UPLOAD_MAX_PIXELS: int = 50_000_000  # Width x height limit against image bombs
+
+    # Prediction cache keyed on the hash of the uploaded bytes
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 10_000  # Entries kept in memory per worker
+    CACHE_TTL_SECONDS: float = 3600
+    CACHE_DIR: Optional[Path] = None  # Enables an on-disk cache shared by workers
+    CACHE_DISK_MAX_ENTRIES: int = 1_000_000  # Oldest stored entries are evicted first
+
+    # Executor for the blocking parts of a prediction (decode, preprocessing)
+    INFERENCE_WORKERS: int = min(4, os.cpu_count() or 1)
+    INFERENCE_QUEUE_SIZE: int = 64  # Requests allowed to wait for a free worker
+    INFERENCE_USE_PROCESSES: bool = False  # Use a process pool instead of threads
+    INFERENCE_RETRY_AFTER_SECONDS: int = 1  # Retry-After sent with 503 responses
+
+    # Decode, preprocessing and inference as separate pipeline stages with
+    # bounded queues in between, instead of decode and preprocessing together
+    # in the executor followed by the micro-batcher
+    PIPELINE_ENABLED: bool = False
+    PIPELINE_DECODE_WORKERS: int = min(4, os.cpu_count() or 1)
+    PIPELINE_PREPROCESS_WORKERS: int = 1
+    PIPELINE_QUEUE_SIZE: int = 32  # Items allowed to wait in front of each stage
+
+    # Limits for the batch prediction endpoint
+    BATCH_MAX_FILES: int = 256  # Max images per request, including archive members
+    BATCH_UPLOAD_MAX_BYTES: int = 256 * 1024 * 1024  # Larger batch bodies get a 413
+    BATCH_MAX_ARCHIVE_BYTES: int = 256 * 1024 * 1024  # Max uncompressed archive size
+
+    # Compressed request bodies (Content-Encoding: gzip or deflate)
+    REQUEST_MAX_DECOMPRESSED_BYTES: int = 64 * 1024 * 1024
+
     API_V1_STR: str = "/api/v1"  # API version prefix
     BASE_URL: str = "http://localhost:8000"
 
+    # HTTP client used by the UI to call the API
+    API_TIMEOUT_SECONDS: float = 5
+    API_MAX_RETRIES: int = 2  # Retries after connection errors and 429/502/503/504
+    API_RETRY_BACKOFF_SECONDS: float = 0.2  # Doubles per retry, with full jitter
+    API_RETRY_MAX_WAIT_SECONDS: float = 5  # Cap on a server's Retry-After, the min wait
+    API_MAX_CONNECTIONS: int = 10  # Keep-alive pool size, also the batch concurrency
+    API_HTTP2: bool = False  # Requires the h2 package
+    API_COMPRESS_MIN_BYTES: int = 256 * 1024  # Gzip uploads not already compressed
+
     PROMETHEUS_URL: str = "http://localhost:9090"
+    MONITORING_CACHE_TTL_SECONDS: float = 2  # Query results shared by all sessions
+    MONITORING_RANGE_MINUTES: int = 15  # Time span of the dashboard trend charts
+    MONITORING_RANGE_STEP_SECONDS: int = 15
 
     model_config = SettingsConfigDict(case_sensitive=True)
 
+    def model_configs(self) -> dict[str, ModelConfig]:
+        """All served models, keyed by the name used in `?model=`"""
+        squeezenet = ModelConfig(
+            display_name="SqueezeNet 1.1",
+            description=(
+                "A lightweight CNN model for image classification, offering a "
+                "smaller architecture with reduced computational requirements"
+            ),
+            model_path=self.MODEL_PATH,
+            labels_path=self.LABELS_PATH,
+            precision=self.MODEL_PRECISION,
+            image_size=self.IMAGE_SIZE,
+            resize_mode=self.PREPROCESS_RESIZE_MODE,
+            normalization=self.PREPROCESS_NORMALIZATION,
+            crop_ratio=self.PREPROCESS_CROP_RATIO,
+        )
+        return {"squeezenet": squeezenet, **self.MODELS}
+
+
+def model_variant_path(model_path: Path, precision: str) -> Path:
+    """Path of a reduced-precision variant stored next to the FP32 model
+
+    Args:
+        model_path (Path): Path to the FP32 model
+        precision (str): The variant, e.g. "int8_static"
+
+    Returns:
+        Path: The variant path, or `model_path` itself for "fp32"
+    """
+    if precision == "fp32":
+        return model_path
+    return model_path.with_name(f"{model_path.stem}.{precision}{model_path.suffix}")
+
 
 settings = Settings()
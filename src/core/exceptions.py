@@ -17,6 +17,13 @@ class ModelError(Exception):
         super().__init__(self.message)
 
 
+class ModelNotFoundError(ModelError):
+    """Raised when a request names a model that is not configured"""
+
+    def __init__(self, message: str = "Model not found"):
+        super().__init__(message)
+
+
 class PrometheusConnectionError(Exception):
     """Raised when unable to connect to Prometheus server"""
 
@@ -25,9 +32,34 @@ class PrometheusConnectionError(Exception):
         super().__init__(self.message)
 
 
+class ServiceOverloadedError(Exception):
+    """Raised when the inference queue is full and new work is rejected"""
+
+    def __init__(
+        self, message: str = "Service is overloaded", retry_after: int = 1
+    ) -> None:
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+
 class ValidationError(Exception):
     """Raised when there is a validation error"""
 
     def __init__(self, message: str = "Validation error occurred"):
         self.message = message
         super().__init__(self.message)
+
+
+class UploadRejectedError(ValidationError):
+    """Raised when an upload is refused before it has been read in full"""
+
+    def __init__(
+        self,
+        message: str = "Upload rejected",
+        reason: str = "invalid",
+        status_code: int = 400,
+    ) -> None:
+        self.reason = reason
+        self.status_code = status_code
+        super().__init__(message)
@@ -0,0 +1,55 @@
+"""Prometheus exposition, aggregated across worker processes when configured"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+
+def multiprocess_dir() -> Optional[Path]:
+    """Directory shared by worker processes for metric values, if configured
+
+    prometheus_client switches to mmap-backed value files when the
+    PROMETHEUS_MULTIPROC_DIR environment variable is set before it is imported,
+    so this has to be set in the environment of the server process, not in
+    Settings.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    return Path(path) if path else None
+
+
+def prepare_multiprocess_dir() -> None:
+    """Create the multiprocess directory and remove values of previous runs
+
+    Must run once in the parent process before any worker starts, otherwise
+    counters from an earlier run would be added to the new ones.
+    """
+    path = multiprocess_dir()
+    if path is None:
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    for db_file in path.glob("*.db"):
+        db_file.unlink()
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop the live gauge values of a worker that has exited
+
+    Counters and histograms of the worker are kept so totals stay correct.
+    """
+    if multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(pid)
+
+
+def render_metrics() -> bytes:
+    """Metrics in the Prometheus text format
+
+    In multiprocess mode the values of all workers are merged from their files,
+    so the answer does not depend on which worker handled the scrape.
+    """
+    if multiprocess_dir() is None:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -1,11 +1,37 @@
 """Middleware for monitoring requests"""
 
 import time
-from typing import Awaitable, Callable
+import zlib
+from typing import Any, Dict, List, Optional
 
-from fastapi import Request, Response
-from prometheus_client import Counter, Histogram
-from starlette.middleware.base import BaseHTTPMiddleware
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core import tracing
+from src.core.config import settings
+from src.core.exceptions import UploadRejectedError
+
+
+def exponential_buckets(start: float, factor: float, count: int) -> List[float]:
+    """Histogram bucket bounds growing by `factor` from `start`
+
+    Args:
+        start (float): Upper bound of the first bucket
+        factor (float): Ratio between consecutive bounds, greater than 1
+        count (int): Number of buckets, excluding +Inf
+
+    Returns:
+        List[float]: The bucket bounds
+    """
+    return [start * factor**i for i in range(count)]
+
+
+LATENCY_BUCKETS = settings.METRICS_LATENCY_BUCKETS or exponential_buckets(
+    settings.METRICS_BUCKETS_START,
+    settings.METRICS_BUCKETS_FACTOR,
+    settings.METRICS_BUCKETS_COUNT,
+)
 
 REQUESTS_TOTAL = Counter(
     "image_classifier_predictions_total",
@@ -16,24 +42,402 @@ REQUESTS_TOTAL = Counter(
 PREDICTION_LATENCY = Histogram(
     "image_classifier_prediction_seconds",
     "Time spent processing prediction",
-    buckets=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "image_classifier_http_request_duration_seconds",
+    "Time spent handling HTTP requests",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "image_classifier_http_requests_in_flight",
+    "Number of HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+
+HTTP_REQUEST_BYTES = Histogram(
+    "image_classifier_http_request_body_bytes",
+    "Size of HTTP request bodies",
+    ["method", "route"],
+    buckets=exponential_buckets(256, 4, 12),
+)
+
+HTTP_RESPONSE_BYTES = Histogram(
+    "image_classifier_http_response_body_bytes",
+    "Size of HTTP response bodies",
+    ["method", "route"],
+    buckets=exponential_buckets(256, 4, 12),
+)
+
+BATCH_SIZE = Histogram(
+    "image_classifier_batch_size",
+    "Number of images per inference batch",
+    buckets=[1, 2, 4, 8, 16, 32, 64],
+)
+
+BATCH_QUEUE_WAIT = Histogram(
+    "image_classifier_batch_queue_wait_seconds",
+    "Time a request waits in the batching queue before inference",
+    buckets=[0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1],
+)
+
+MODEL_INFERENCE_SECONDS = Histogram(
+    "image_classifier_model_inference_seconds",
+    "Time spent running one inference batch, per model",
+    ["model"],
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0],
+)
+
+MODEL_MEMORY_BYTES = Gauge(
+    "image_classifier_model_memory_bytes",
+    "Resident memory added by loading a model",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+
+MODEL_LOADS_TOTAL = Counter(
+    "image_classifier_model_loads_total",
+    "Total number of times a model was loaded or hot-swapped",
+    ["model"],
+)
+
+MODEL_STARTUP_SECONDS = Gauge(
+    "image_classifier_model_startup_seconds",
+    "Time spent loading and warming up a model, per step, slowest worker",
+    ["model", "step"],
+    multiprocess_mode="livemax",
+)
+
+STARTUP_SECONDS = Gauge(
+    "image_classifier_startup_seconds",
+    "Time from process start until the worker was ready, per phase, slowest worker",
+    ["phase"],
+    multiprocess_mode="livemax",
+)
+
+WORKERS_READY = Gauge(
+    "image_classifier_workers_ready",
+    "Number of workers that finished warm-up and report ready",
+    multiprocess_mode="livesum",
+)
+
+STAGE_SECONDS = Histogram(
+    "image_classifier_stage_seconds",
+    "Time spent in each stage of handling a prediction",
+    ["stage"],
+    buckets=[
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+    ],
+)
+
+INPUT_BYTES = Histogram(
+    "image_classifier_input_bytes",
+    "Size of uploaded images in bytes",
+    buckets=[1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7],
+)
+
+INPUT_WIDTH = Histogram(
+    "image_classifier_input_width_pixels",
+    "Width of uploaded images before any resizing",
+    buckets=[64, 128, 224, 320, 480, 640, 1024, 1280, 1920, 2560, 4096, 8192],
+)
+
+INPUT_HEIGHT = Histogram(
+    "image_classifier_input_height_pixels",
+    "Height of uploaded images before any resizing",
+    buckets=[64, 128, 224, 320, 480, 640, 1024, 1280, 1920, 2560, 4096, 8192],
+)
+
+DECODED_PIXELS = Histogram(
+    "image_classifier_decoded_pixels",
+    "Number of pixels in decoded images",
+    buckets=[5e4, 1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6, 16e6],
+)
+
+UPLOAD_BYTES_TOTAL = Counter(
+    "image_classifier_upload_bytes_total",
+    "Total number of request body bytes read by the streaming upload ingest",
 )
 
+UPLOAD_REJECTED_TOTAL = Counter(
+    "image_classifier_upload_rejected_total",
+    "Total number of uploads rejected by the streaming upload ingest",
+    ["reason"],
+)
+
+CACHE_HITS = Counter(
+    "image_classifier_cache_hits_total",
+    "Total number of predictions served from the cache",
+    ["backend"],
+)
+
+CACHE_MISSES = Counter(
+    "image_classifier_cache_misses_total",
+    "Total number of cache lookups that required inference",
+)
+
+CACHE_EVICTIONS = Counter(
+    "image_classifier_cache_evictions_total",
+    "Total number of cache entries evicted",
+    ["backend", "reason"],
+)
+
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "image_classifier_inference_queue_depth",
+    "Number of admitted requests waiting for an inference worker",
+    multiprocess_mode="livesum",
+)
+
+INFERENCE_IN_FLIGHT = Gauge(
+    "image_classifier_inference_in_flight",
+    "Number of requests currently being processed by inference workers",
+    multiprocess_mode="livesum",
+)
+
+INFERENCE_REJECTED_TOTAL = Counter(
+    "image_classifier_inference_rejected_total",
+    "Total number of requests rejected because the inference queue was full",
+)
+
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "image_classifier_pipeline_queue_depth",
+    "Number of items waiting in front of a pipeline stage",
+    ["pipeline", "stage"],
+    multiprocess_mode="livesum",
+)
+
+PIPELINE_BUSY_WORKERS = Gauge(
+    "image_classifier_pipeline_busy_workers",
+    "Number of pipeline stage workers currently processing items",
+    ["pipeline", "stage"],
+    multiprocess_mode="livesum",
+)
+
+
+class MonitoringMiddleware:
+    def __init__(self, app: ASGIApp):
+        """Pure ASGI middleware for monitoring requests.
+
+        Records duration, in-flight count and body sizes of every HTTP request,
+        labelled by method and route template so path parameters do not add
+        label values. Prediction requests also update the prediction metrics.
+
+        Args:
+            app (ASGIApp): The application to wrap
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_bytes = _content_length(scope)
+        response_bytes = 0
+        status_code = 500
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_bytes, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        method = scope["method"]
+        path = scope["path"]
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter_ns()
+        try:
+            with tracing.span("request", method=method, path=path):
+                # Only count the body as it is read when there is no Content-Length
+                await self.app(
+                    scope, receive if request_bytes else receive_wrapper, send_wrapper
+                )
+        finally:
+            duration = (time.perf_counter_ns() - start) / 1e9
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+            metrics = _route_metrics(method, _route_template(scope), status_code)
+            metrics[0].observe(duration)
+            metrics[1].observe(request_bytes)
+            metrics[2].observe(response_bytes)
+            if path.endswith("/predict"):
+                REQUESTS_TOTAL.labels(status=str(status_code)).inc()
+                PREDICTION_LATENCY.observe(duration)
+
+
+# Resolving labelled children takes a lock and builds the label key, so the
+# children for each method, route and status are looked up once
+_route_metrics_cache: Dict[tuple[str, str, int], tuple[Any, Any, Any]] = {}
+
+
+def _route_metrics(method: str, route: str, status_code: int) -> tuple[Any, Any, Any]:
+    key = (method, route, status_code)
+    metrics = _route_metrics_cache.get(key)
+    if metrics is None:
+        metrics = _route_metrics_cache[key] = (
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)),
+            HTTP_REQUEST_BYTES.labels(method, route),
+            HTTP_RESPONSE_BYTES.labels(method, route),
+        )
+    return metrics
+
+
+class RequestDecompressionMiddleware:
+    # zlib window bits selecting the gzip and zlib containers
+    WBITS = {b"gzip": 16 + zlib.MAX_WBITS, b"deflate": zlib.MAX_WBITS}
+    CHUNK_SIZE = 64 * 1024  # Max decompressed bytes passed on per message
+
+    def __init__(
+        self, app: ASGIApp, max_size: int, max_compressed_size: Optional[int] = None
+    ):
+        """Pure ASGI middleware decompressing gzip or deflate request bodies.
+
+        The body is decompressed as the application reads it, in chunks of at
+        most CHUNK_SIZE bytes, so it is never held in memory in full and
+        streaming readers like the upload ingest can reject it early. Bodies
+        over `max_compressed_size`, or expanding past `max_size`, fail the
+        read with an UploadRejectedError, which is answered with a 413 unless
+        the application handles it.
+
+        Args:
+            app (ASGIApp): The application to wrap
+            max_size (int): Max decompressed body size in bytes
+            max_compressed_size (int, optional): Max compressed body size in
+                bytes, unlimited when omitted
+        """
+        self.app = app
+        self.max_size = max_size
+        self.max_compressed_size = max_compressed_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-encoding":
+                    encoding = value.strip().lower()
+        if encoding is None or encoding == b"identity":
+            await self.app(scope, receive, send)
+            return
+
+        wbits = self.WBITS.get(encoding)
+        if wbits is None:
+            await self._reject(
+                scope,
+                receive,
+                send,
+                f"Unsupported Content-Encoding: {encoding.decode()}",
+                415,
+            )
+            return
+
+        decompressor = zlib.decompressobj(wbits)
+        received = decompressed = 0
+        more_body = True
+
+        async def decompressed_receive() -> Message:
+            nonlocal received, decompressed, more_body
+            if decompressor.unconsumed_tail:
+                chunk = decompressor.unconsumed_tail
+            elif more_body:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message  # Client disconnected
+                chunk = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                received += len(chunk)
+                if (
+                    self.max_compressed_size is not None
+                    and received > self.max_compressed_size
+                ):
+                    raise UploadRejectedError(
+                        "Request body too large", reason="too_large", status_code=413
+                    )
+            else:
+                return await receive()
+            try:
+                output = decompressor.decompress(chunk, self.CHUNK_SIZE)
+            except zlib.error as e:
+                raise UploadRejectedError(
+                    "Invalid compressed request body", reason="malformed"
+                ) from e
+            decompressed += len(output)
+            if decompressed > self.max_size:
+                raise UploadRejectedError(
+                    "Decompressed request body too large",
+                    reason="too_large",
+                    status_code=413,
+                )
+            more = more_body or bool(decompressor.unconsumed_tail)
+            if not more and not decompressor.eof:
+                raise UploadRejectedError(
+                    "Invalid compressed request body", reason="malformed"
+                )
+            return {"type": "http.request", "body": output, "more_body": more}
+
+        # Updated in place, since the router records the matched route in this
+        # scope and the outer monitoring middleware labels requests with it.
+        # The decompressed length is not known up front.
+        scope["headers"] = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        response_started = False
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, decompressed_receive, tracking_send)
+        except UploadRejectedError as e:
+            if response_started:
+                raise
+            await self._reject(scope, receive, send, e.message, e.status_code)
 
-class MonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware for monitoring requests"""
+    @staticmethod
+    async def _reject(
+        scope: Scope, receive: Receive, send: Send, detail: str, status_code: int
+    ) -> None:
+        response = JSONResponse({"detail": detail}, status_code=status_code)
+        await response(scope, receive, send)
 
-    async def dispatch(
-        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
-    ) -> Response:
-        if not request.url.path.endswith("/predict"):
-            return await call_next(request)
 
-        start_time = time.time()
-        response = await call_next(request)
-        duration = time.time() - start_time
+def _content_length(scope: Scope) -> int:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            return int(value) if value.isdigit() else 0
+    return 0
 
-        REQUESTS_TOTAL.labels(status=str(response.status_code)).inc()
-        PREDICTION_LATENCY.observe(duration)
 
-        return response
+def _route_template(scope: Scope) -> str:
+    """Path template of the matched route, e.g. /api/v1/models/{name}/reload"""
+    route = scope.get("route")
+    path: Optional[str] = getattr(route, "path", None)
+    # Unmatched paths share one label value so scanners cannot grow the series
+    return path if path is not None else "<unmatched>"
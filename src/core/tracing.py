@@ -0,0 +1,180 @@
+"""Per-stage timing and span export for the prediction hot path"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, TextIO
+
+from src.core.config import settings
+
+_NOOP: AbstractContextManager[None] = nullcontext()
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class SpanExporter:
+    def __init__(self, path: Path):
+        """Appends finished spans to a file as JSON lines.
+
+        Args:
+            path (Path): The file to append to, shared by all workers
+        """
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: TextIO = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "attributes",
+        "record_metric",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "_start",
+        "_start_ns",
+        "_token",
+        "_exporter",
+    )
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+
+    def __init__(self, name: str, attributes: dict, record_metric: bool = True):
+        """A timed stage, used as a context manager.
+
+        Args:
+            name (str): Name of the stage
+            attributes (dict): Extra attributes recorded on the exported span
+            record_metric (bool): Observe the stage histogram on exit
+        """
+        self.name = name
+        self.attributes = attributes
+        self.record_metric = record_metric
+        self._exporter = _exporter
+
+    def __enter__(self) -> "Span":
+        if self._exporter is None:
+            # Only timed, so skip the ids and context bookkeeping
+            self._start = time.perf_counter_ns()
+            return self
+
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else _new_id(16)
+        self.span_id = _new_id(8)
+        self._token = _current_span.set(self)
+        self._start_ns = time.time_ns()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        duration_ns = time.perf_counter_ns() - self._start
+        if self.record_metric:
+            _stage_histogram(self.name).observe(duration_ns / 1e9)
+        if self._exporter is not None:
+            _current_span.reset(self._token)
+            self._exporter.export(
+                {
+                    "trace_id": self.trace_id,
+                    "span_id": self.span_id,
+                    "parent_span_id": self.parent_id,
+                    "name": self.name,
+                    "start_time_unix_nano": self._start_ns,
+                    "end_time_unix_nano": self._start_ns + duration_ns,
+                    "status": "ERROR" if exc_type is not None else "OK",
+                    "attributes": {**self.attributes, "pid": os.getpid()},
+                }
+            )
+
+
+_enabled = settings.STAGE_TIMING_ENABLED
+_exporter: Optional[SpanExporter] = None
+_histograms: dict[str, Any] = {}
+
+
+def _new_id(num_bytes: int) -> str:
+    return f"{random.getrandbits(num_bytes * 8):0{num_bytes * 2}x}"
+
+
+def _stage_histogram(name: str) -> Any:
+    # Resolving a labelled child takes a lock, so cache it per stage name
+    histogram = _histograms.get(name)
+    if histogram is None:
+        # Imported here because the monitoring middleware itself opens spans
+        from src.core.middleware import STAGE_SECONDS
+
+        histogram = _histograms[name] = STAGE_SECONDS.labels(stage=name)
+    return histogram
+
+
+def configure(enabled: bool, export_path: Optional[Path] = None) -> None:
+    """Turn stage timing on or off and set where spans are exported
+
+    Args:
+        enabled (bool): Time stages at all
+        export_path (Path, optional): File to append spans to; spans are only
+            timed into the histogram when omitted
+    """
+    global _enabled, _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _enabled = enabled
+    _exporter = SpanExporter(export_path) if enabled and export_path else None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def stage(name: str, **attributes: Any) -> AbstractContextManager[Any]:
+    """Time a stage of request handling
+
+    The stage is observed in the stage histogram and, when span export is
+    configured, written as an OpenTelemetry-style span. Spans nest through a
+    context variable, so stages of one request share its trace id.
+
+    Args:
+        name (str): Name of the stage, used as the histogram label
+        **attributes: Extra attributes recorded on the exported span
+
+    Returns:
+        A context manager timing its body, or a no-op when timing is disabled
+    """
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def span(name: str, **attributes: Any) -> AbstractContextManager[Any]:
+    """Open a span that groups stages without observing the stage histogram"""
+    if not _enabled or _exporter is None:
+        return _NOOP
+    return Span(name, attributes, record_metric=False)
+
+
+configure(settings.STAGE_TIMING_ENABLED, settings.SPAN_EXPORT_PATH)
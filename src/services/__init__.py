@@ -1,3 +1,21 @@
-from .inference import get_classifier
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["get_classifier"]
+if TYPE_CHECKING:
+    from .inference import (
+        get_classifier,
+        get_executor,
+        get_prediction_cache,
+        get_registry,
+    )
+
+__all__ = ["get_classifier", "get_executor", "get_prediction_cache", "get_registry"]
+
+
+def __getattr__(name: str) -> Any:
+    # Importing the API client or monitoring service for the UI must not load
+    # the inference stack, so the factories are only imported when used
+    if name in __all__:
+        from . import inference
+
+        return getattr(inference, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
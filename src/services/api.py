@@ -1,23 +1,62 @@
 """API service layer"""
 
-import requests
+import asyncio
+import gzip
+import random
+from typing import Any, List, Optional, Union
+
+import httpx
 
 from src.api.schemas import ModelInfo, PredictionResponse
 from src.core.config import settings
 from src.core.exceptions import APIConnectionError
+from src.services.http import PooledClient
+
+# Responses worth retrying: the server is overloaded or restarting
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Formats that are already compressed and would not shrink with gzip
+COMPRESSED_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG", b"GIF8", b"RIFF", b"PK\x03\x04")
 
 
-class APIService:
-    def __init__(self) -> None:
-        self.base_url = settings.BASE_URL
+class APIService(PooledClient):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """Client of the prediction API with a persistent connection pool.
+
+        Args:
+            base_url (str, optional): URL of the API, defaults to BASE_URL
+            timeout (float, optional): Default timeout per request in seconds
+            max_retries (int, optional): Retries after connection errors,
+                timeouts and overloaded responses
+            transport (httpx.AsyncBaseTransport, optional): Transport to use
+                instead of the network, e.g. httpx.ASGITransport in tests
+        """
+        super().__init__(
+            base_url or settings.BASE_URL,
+            timeout if timeout is not None else settings.API_TIMEOUT_SECONDS,
+            max_connections=settings.API_MAX_CONNECTIONS,
+            http2=settings.API_HTTP2,
+            transport=transport,
+        )
         self.api_v1_str = settings.API_V1_STR
-        self.timeout = 5  # seconds
+        self.max_retries = (
+            max_retries if max_retries is not None else settings.API_MAX_RETRIES
+        )
 
-    async def predict(self, image_bytes: bytes) -> PredictionResponse:
+    async def predict(
+        self, image_bytes: bytes, timeout: Optional[float] = None
+    ) -> PredictionResponse:
         """Make prediction API call
 
         Args:
             image_bytes (bytes): The image bytes to predict
+            timeout (float, optional): Timeout for this call in seconds
 
         Returns:
             PredictionResponse: The predicted class and confidence
@@ -26,22 +65,49 @@ class APIService:
             APIConnectionError: If the API request fails
         """
         try:
-            files = {"file": image_bytes}
-            response = requests.post(
-                f"{self.base_url}{self.api_v1_str}/predict",
-                files=files,
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
+            response = await self._call(self._upload(image_bytes, timeout))
             return PredictionResponse(**response.json())
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise APIConnectionError(
                 f"Failed to connect to prediction API: {str(e)}"
             ) from e
 
-    async def get_model_info(self) -> ModelInfo:
+    async def predict_many(
+        self,
+        images: List[bytes],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Union[PredictionResponse, APIConnectionError]]:
+        """Upload several images concurrently over the connection pool
+
+        Args:
+            images (List[bytes]): The image bytes to predict
+            max_concurrency (int, optional): Max uploads in flight, defaults to
+                the connection pool size
+            timeout (float, optional): Timeout for each upload in seconds
+
+        Returns:
+            One prediction, or the error that prevented it, per image in order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or settings.API_MAX_CONNECTIONS)
+
+        async def predict_one(
+            image_bytes: bytes,
+        ) -> Union[PredictionResponse, APIConnectionError]:
+            async with semaphore:
+                try:
+                    return await self.predict(image_bytes, timeout)
+                except APIConnectionError as e:
+                    return e
+
+        return list(await asyncio.gather(*(predict_one(image) for image in images)))
+
+    async def get_model_info(self, timeout: Optional[float] = None) -> ModelInfo:
         """Get model information
 
+        Args:
+            timeout (float, optional): Timeout for this call in seconds
+
         Returns:
             ModelInfo: The model information
 
@@ -49,10 +115,73 @@ class APIService:
             APIConnectionError: If the API request fails
         """
         try:
-            response = requests.get(
-                f"{self.base_url}{self.api_v1_str}/model-info", timeout=self.timeout
+            response = await self._call(
+                self._send("GET", f"{self.api_v1_str}/model-info", timeout)
             )
-            response.raise_for_status()
             return ModelInfo(**response.json())
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise APIConnectionError(f"Failed to fetch model info: {str(e)}") from e
+
+    async def _upload(
+        self, image_bytes: bytes, timeout: Optional[float]
+    ) -> httpx.Response:
+        """POST an image, gzip-compressing large uploads that will shrink"""
+        client = self._get_client()
+        request = client.build_request(
+            "POST", f"{self.api_v1_str}/predict", files={"file": image_bytes}
+        )
+        body = request.read()
+        headers = {"Content-Type": request.headers["Content-Type"]}
+        if len(image_bytes) >= settings.API_COMPRESS_MIN_BYTES and not (
+            image_bytes.startswith(COMPRESSED_SIGNATURES)
+        ):
+            body = await asyncio.to_thread(gzip.compress, body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        return await self._send(
+            "POST",
+            f"{self.api_v1_str}/predict",
+            timeout,
+            content=body,
+            headers=headers,
+        )
+
+    async def _send(
+        self, method: str, url: str, timeout: Optional[float], **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request, retrying with exponential backoff and full jitter
+
+        Raises:
+            httpx.HTTPError: If the request still fails after the retries
+        """
+        client = self._get_client()
+        attempt = 0
+        while True:
+            response: Optional[httpx.Response] = None
+            try:
+                response = await client.request(
+                    method,
+                    url,
+                    timeout=timeout if timeout is not None else self.timeout,
+                    **kwargs,
+                )
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                retry = response.status_code in RETRY_STATUS_CODES
+                if not retry or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    @staticmethod
+    def _backoff(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Seconds to wait before the next attempt"""
+        jitter = random.uniform(0, settings.API_RETRY_BACKOFF_SECONDS * 2**attempt)
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after is not None and retry_after.isdigit():
+            # Wait at least as long as the server asked, capped so the UI does
+            # not hang, with the jitter on top so retries still spread out
+            return min(float(retry_after), settings.API_RETRY_MAX_WAIT_SECONDS) + jitter
+        return jitter
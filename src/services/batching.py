@@ -0,0 +1,147 @@
+"""Dynamic micro-batching of concurrent inference requests"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Generic, List, Optional, TypeVar
+
+import numpy as np
+from loguru import logger
+
+from src.core.middleware import BATCH_QUEUE_WAIT, BATCH_SIZE
+
+T = TypeVar("T")
+
+
+@dataclass
+class _BatchRequest:
+    """A single preprocessed input waiting to be batched"""
+
+    array: np.ndarray
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher(Generic[T]):
+    def __init__(
+        self,
+        run_batch: Callable[[np.ndarray], List[T]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        """Collects concurrent requests into batches for a single model call.
+
+        The first request of a batch waits at most `max_wait_ms` for others to
+        arrive. Batches are run on a dedicated worker thread, so callers on the
+        event loop only await a future.
+
+        Args:
+            run_batch (Callable): Function taking a stacked NCHW array and
+                returning one result per row
+            max_batch_size (int): Max number of inputs per batch
+            max_wait_ms (float): Max time in milliseconds to wait for a batch to fill
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._run_batch = run_batch
+        self._buffer: Optional[np.ndarray] = None
+        self._queue: queue.Queue[Optional[_BatchRequest]] = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._worker_loop, name="micro-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, array: np.ndarray) -> Future:
+        """Queue a preprocessed input for the next batch.
+
+        Args:
+            array (np.ndarray): Preprocessed image of shape (1, C, H, W)
+
+        Returns:
+            Future: Resolves to the result for this input
+        """
+        if self._closed:
+            raise RuntimeError("Batcher is closed")
+        request = _BatchRequest(array=array)
+        self._queue.put(request)
+        return request.future
+
+    async def predict(self, array: np.ndarray) -> T:
+        """Submit an input and await its result from the event loop"""
+        return await asyncio.wrap_future(self.submit(array))
+
+    def close(self) -> None:
+        """Stop the worker thread after the queued requests are served"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _collect(self) -> tuple[List[_BatchRequest], bool]:
+        """Block for the first request, then gather more until the window closes"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = (
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _worker_loop(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            # Drop requests whose callers went away before the batch started
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+
+    def _stack(self, arrays: List[np.ndarray]) -> np.ndarray:
+        """Copy inputs into the reusable batch buffer, one slot per input"""
+        sample = arrays[0]
+        if (
+            self._buffer is None
+            or self._buffer.shape[1:] != sample.shape[1:]
+            or self._buffer.dtype != sample.dtype
+        ):
+            self._buffer = np.empty(
+                (self.max_batch_size, *sample.shape[1:]), dtype=sample.dtype
+            )
+        batch = self._buffer[: len(arrays)]
+        for slot, array in zip(batch, arrays, strict=True):
+            np.copyto(slot, array[0])
+        return batch
+
+    def _process(self, batch: List[_BatchRequest]) -> None:
+        started = time.perf_counter()
+        for request in batch:
+            BATCH_QUEUE_WAIT.observe(started - request.enqueued_at)
+        BATCH_SIZE.observe(len(batch))
+
+        try:
+            results = self._run_batch(self._stack([r.array for r in batch]))
+        except Exception as e:
+            logger.exception("Batch inference failed")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results, strict=True):
+            request.future.set_result(result)
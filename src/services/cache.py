@@ -0,0 +1,211 @@
+"""Prediction cache keyed on the content hash of uploaded images"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from src.core.middleware import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+Predictions = List[tuple[str, float]]
+
+
+class DiskCacheBackend:
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int,
+        ttl_seconds: float,
+        evict_interval: Optional[int] = None,
+    ):
+        """SQLite-backed cache shared by all worker processes on a host.
+
+        Eviction is first in, first out: once there are more than
+        `max_entries` entries the oldest stored ones are deleted, whether or
+        not they were read since. The memory tier in front of it keeps the
+        recently used entries. The size is checked every `evict_interval`
+        inserts rather than on each one, so the table may exceed
+        `max_entries` by up to that many entries in between.
+
+        Args:
+            path (Path): Path to the SQLite database file
+            max_entries (int): Max number of entries before the oldest stored
+                ones are evicted
+            ttl_seconds (float): Time after which entries expire
+            evict_interval (int, optional): Inserts between size checks, 1% of
+                `max_entries` (at most 1000) by default
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_interval = evict_interval or min(1000, max(1, max_entries // 100))
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(path), timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS predictions_stored_at "
+            "ON predictions (stored_at)"
+        )
+
+    def get(self, key: str) -> Optional[Predictions]:
+        """Return the cached predictions, or None if missing or expired"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, stored_at FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if time.time() - stored_at > self.ttl_seconds:
+            with self._lock:
+                self._connection.execute(
+                    "DELETE FROM predictions WHERE key = ?", (key,)
+                )
+            CACHE_EVICTIONS.labels(backend="disk", reason="expired").inc()
+            return None
+        return [(name, confidence) for name, confidence in json.loads(value)]
+
+    def set(self, key: str, predictions: Predictions) -> None:
+        """Store predictions, evicting the oldest entries beyond max_entries"""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                (key, json.dumps(predictions), time.time()),
+            )
+            self._inserts += 1
+            if self._inserts < self.evict_interval:
+                return
+            self._inserts = 0
+            # Counting is a full scan, so it is only done every evict_interval
+            # inserts; the delete walks the stored_at index from the oldest end
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM predictions"
+            ).fetchone()
+            evicted = 0
+            if count > self.max_entries:
+                evicted = self._connection.execute(
+                    "DELETE FROM predictions WHERE rowid IN ("
+                    "SELECT rowid FROM predictions ORDER BY stored_at LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        if evicted > 0:
+            CACHE_EVICTIONS.labels(backend="disk", reason="size").inc(evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class PredictionCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        disk: Optional[DiskCacheBackend] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """In-memory LRU cache of predictions with TTL, optionally backed by disk.
+
+        Keys hash the raw upload bytes together with a namespace describing the
+        model version and preprocessing settings, so changing either never
+        serves stale predictions.
+
+        Args:
+            max_entries (int): Max number of entries kept in memory
+            ttl_seconds (float): Time after which entries expire
+            disk (DiskCacheBackend, optional): Shared second-level cache
+            clock (Callable): Monotonic time source, overridable for tests
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, Predictions]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, contents: Union[bytes, memoryview], namespace: str) -> str:
+        """Build the cache key for uploaded bytes
+
+        Args:
+            contents (bytes | memoryview): The uploaded bytes
+            namespace (str): Model version and settings that affect predictions
+
+        Returns:
+            str: The cache key
+        """
+        digest = hashlib.blake2b(contents, digest_size=16)
+        digest.update(namespace.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Predictions]:
+        """Return cached predictions, checking memory first and then disk"""
+        predictions = self._get_memory(key)
+        if predictions is None and self.disk is not None:
+            predictions = self._get_disk(self.disk, key)
+        if predictions is None:
+            CACHE_MISSES.inc()
+        return predictions
+
+    async def get_async(self, key: str) -> Optional[Predictions]:
+        """`get` for the event loop, querying the disk tier in a thread"""
+        predictions = self._get_memory(key)
+        if predictions is None and self.disk is not None:
+            predictions = await asyncio.to_thread(self._get_disk, self.disk, key)
+        if predictions is None:
+            CACHE_MISSES.inc()
+        return predictions
+
+    def set(self, key: str, predictions: Predictions) -> None:
+        """Store predictions in memory and on disk"""
+        self._store(key, predictions)
+        if self.disk is not None:
+            self.disk.set(key, predictions)
+
+    async def set_async(self, key: str, predictions: Predictions) -> None:
+        """`set` for the event loop, writing to the disk tier in a thread"""
+        self._store(key, predictions)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, predictions)
+
+    def _get_memory(self, key: str) -> Optional[Predictions]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, predictions = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                CACHE_HITS.labels(backend="memory").inc()
+                return predictions
+            del self._entries[key]
+            CACHE_EVICTIONS.labels(backend="memory", reason="expired").inc()
+            return None
+
+    def _get_disk(self, disk: DiskCacheBackend, key: str) -> Optional[Predictions]:
+        stored = disk.get(key)
+        if stored is not None:
+            CACHE_HITS.labels(backend="disk").inc()
+            self._store(key, stored)
+        return stored
+
+    def _store(self, key: str, predictions: Predictions) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, predictions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels(backend="memory", reason="size").inc()
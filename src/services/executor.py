@@ -0,0 +1,122 @@
+"""Bounded executor running blocking inference work off the event loop"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from src.core.exceptions import ServiceOverloadedError
+from src.core.middleware import (
+    INFERENCE_IN_FLIGHT,
+    INFERENCE_QUEUE_DEPTH,
+    INFERENCE_REJECTED_TOTAL,
+)
+
+T = TypeVar("T")
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue_size: int,
+        use_processes: bool = False,
+        retry_after: int = 1,
+    ):
+        """Worker pool with a bounded admission queue.
+
+        At most `max_workers` requests are processed at once and at most
+        `max_queue_size` more may wait; anything beyond that is rejected with
+        ServiceOverloadedError instead of adding latency for everyone.
+
+        Args:
+            max_workers (int): Number of pool workers
+            max_queue_size (int): Number of requests allowed to wait for a worker
+            use_processes (bool): Use a process pool instead of a thread pool;
+                functions and arguments passed to `run` must then be picklable
+            retry_after (int): Seconds clients are told to wait after a rejection
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        self.retry_after = retry_after
+        self._pool: Executor
+        if use_processes:
+            # Imported here since it pulls in multiprocessing
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawned, not forked: a fork copies the locks held by the
+            # onnxruntime, batcher and event loop threads of this process,
+            # and the workers deadlock on them
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="inference"
+            )
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        """Max number of requests admitted at the same time"""
+        return self.max_workers + self.max_queue_size
+
+    @asynccontextmanager
+    async def admit(self, slots: int = 1) -> AsyncIterator[None]:
+        """Reserve slots for a request for the duration of the block
+
+        Args:
+            slots (int): Number of items the request runs, each taking a slot.
+                A request with more items than the capacity reserves all of
+                it, so it is only admitted while the executor is idle.
+
+        Raises:
+            ServiceOverloadedError: If all workers are busy and the queue is full
+        """
+        slots = max(1, min(slots, self.capacity))
+        with self._lock:
+            if self._admitted + slots > self.capacity:
+                INFERENCE_REJECTED_TOTAL.inc()
+                raise ServiceOverloadedError(
+                    "Inference queue is full", retry_after=self.retry_after
+                )
+            self._admitted += slots
+            self._update_gauges()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._admitted -= slots
+                self._update_gauges()
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a blocking function in the pool and await its result
+
+        Args:
+            fn (Callable): The function to run; in process mode a module-level
+                function, so it can be pickled
+            *args: Positional arguments for the function
+
+        Returns:
+            The return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        if isinstance(self._pool, ThreadPoolExecutor):
+            # Carry context variables (the current tracing span) into the thread
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._pool, context.run, fn, *args)
+        return await loop.run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self) -> None:
+        """Shut down the pool after running tasks finish"""
+        self._pool.shutdown(wait=True)
+
+    def _update_gauges(self) -> None:
+        in_flight = min(self._admitted, self.max_workers)
+        INFERENCE_IN_FLIGHT.set(in_flight)
+        INFERENCE_QUEUE_DEPTH.set(self._admitted - in_flight)
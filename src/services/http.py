@@ -0,0 +1,91 @@
+"""Pooled async HTTP clients for the UI's service layer"""
+
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop all pooled clients run on, started on first use
+
+    Streamlit runs every script rerun in a fresh event loop, so connections
+    and cached results would not survive a rerun on the caller's loop. They
+    live on this long-running loop in a daemon thread instead.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="http-clients", daemon=True
+            ).start()
+        return _loop
+
+
+class PooledClient:
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        max_connections: int = 10,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """An httpx.AsyncClient with a keep-alive pool on the background loop.
+
+        Args:
+            base_url (str): URL requests are relative to
+            timeout (float): Default timeout per request in seconds
+            max_connections (int): Size of the connection pool
+            http2 (bool): Use HTTP/2, which requires the h2 package
+            transport (httpx.AsyncBaseTransport, optional): Transport to use
+                instead of the network, e.g. httpx.ASGITransport in tests
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.http2 = http2
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _call(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the background loop and await its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, background_loop())
+        return await asyncio.wrap_future(future)
+
+    def _call_blocking(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the background loop and wait for its result
+
+        For callers without an event loop of their own, e.g. Streamlit fragments.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, background_loop()).result()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Only called on the background loop, so no lock is needed
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                http2=self.http2,
+                transport=self._transport,
+            )
+        return self._client
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+        client, self._client = self._client, None
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(
+                client.aclose(), background_loop()
+            ).result()
@@ -1,15 +1,74 @@
 from functools import lru_cache
+from typing import Optional
 
 from src.classifier.classifier import ImageClassifier
 from src.core.config import settings
+from src.services.cache import DiskCacheBackend, PredictionCache
+from src.services.executor import InferenceExecutor
+from src.services.registry import ModelRegistry
+from src.services.warmup import Readiness
 
 
 @lru_cache()
+def get_registry() -> ModelRegistry:
+    """
+    Creates or returns the cached model registry.
+    Models are loaded on first use and routed by the `model` request parameter.
+    """
+    registry = ModelRegistry(settings.model_configs(), default=settings.DEFAULT_MODEL)
+    registry.start_watching(settings.MODEL_RELOAD_CHECK_SECONDS)
+    return registry
+
+
 def get_classifier() -> ImageClassifier:
     """
-    Creates or returns a cached instance of ImageClassifier.
-    Uses lru_cache to ensure only one instance is created (singleton pattern).
+    Returns the classifier of the default model.
+    """
+    return get_registry().get().classifier
+
+
+@lru_cache()
+def get_executor() -> InferenceExecutor:
+    """
+    Creates or returns the cached executor for blocking prediction work.
+    Bounds the number of admitted requests to apply backpressure.
+    """
+    return InferenceExecutor(
+        max_workers=settings.INFERENCE_WORKERS,
+        max_queue_size=settings.INFERENCE_QUEUE_SIZE,
+        use_processes=settings.INFERENCE_USE_PROCESSES,
+        retry_after=settings.INFERENCE_RETRY_AFTER_SECONDS,
+    )
+
+
+@lru_cache()
+def get_prediction_cache() -> Optional[PredictionCache]:
+    """
+    Creates or returns the cached prediction cache, or None when disabled.
+    Keys are namespaced per model version, see LoadedModel.cache_namespace.
     """
-    return ImageClassifier(
-        model_path=settings.MODEL_PATH, labels_path=settings.LABELS_PATH
+    if not settings.CACHE_ENABLED:
+        return None
+
+    disk = (
+        DiskCacheBackend(
+            settings.CACHE_DIR / "predictions.sqlite3",
+            max_entries=settings.CACHE_DISK_MAX_ENTRIES,
+            ttl_seconds=settings.CACHE_TTL_SECONDS,
+        )
+        if settings.CACHE_DIR is not None
+        else None
+    )
+    return PredictionCache(
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.CACHE_TTL_SECONDS,
+        disk=disk,
     )
+
+
+@lru_cache()
+def get_readiness() -> Readiness:
+    """
+    Returns the readiness of this worker, marked ready once warm-up finished.
+    """
+    return Readiness()
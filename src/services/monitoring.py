@@ -1,100 +1,265 @@
 """Service for fetching monitoring metrics"""
 
-import requests
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import httpx
 
 from src.core.config import settings
 from src.core.exceptions import PrometheusConnectionError
+from src.services.http import PooledClient
+
+TOTAL_QUERY = "sum(image_classifier_predictions_total)"
+SUCCESS_QUERY = (
+    'sum(image_classifier_predictions_total{status="200"}) / '
+    "sum(image_classifier_predictions_total) * 100"
+)
+HISTOGRAM_QUERY = "sum(image_classifier_prediction_seconds_bucket) by (le)"
+
+LATENCY_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+# Query results shared by every MonitoringService, and so by every browser
+# session, keyed by Prometheus URL and query. Values are futures on the
+# background loop, so sessions refreshing at the same time share one request.
+# Range queries are keyed by their start and end, so entries are dropped once
+# expired and the oldest ones beyond _CACHE_MAX_ENTRIES.
+_cache: Dict[tuple, tuple[float, "asyncio.Future[Any]"]] = {}
+_CACHE_MAX_ENTRIES = 256
+
+
+def _prune_cache(now: float) -> None:
+    """Drop expired entries, then the oldest ones beyond the size limit"""
+    for key in [key for key, (expires_at, _) in _cache.items() if expires_at <= now]:
+        del _cache[key]
+    while len(_cache) >= _CACHE_MAX_ENTRIES:
+        del _cache[next(iter(_cache))]
 
 
-class MonitoringService:
+def series_query(window: str) -> str:
+    """One PromQL expression returning throughput and latency quantile series
+
+    Each part is tagged with a `series` label so a single range query returns
+    all of them.
+    """
+    parts = [
+        f"label_replace(sum(rate(image_classifier_predictions_total[{window}])), "
+        '"series", "throughput", "", "")'
+    ]
+    for name, quantile in LATENCY_QUANTILES.items():
+        parts.append(
+            f"label_replace(histogram_quantile({quantile}, sum by (le) "
+            f"(rate(image_classifier_prediction_seconds_bucket[{window}]))), "
+            f'"series", "{name}", "", "")'
+        )
+    return " or ".join(parts)
+
+
+class MonitoringService(PooledClient):
     """Service for fetching monitoring metrics"""
 
-    def __init__(self) -> None:
-        self.prometheus_url = settings.PROMETHEUS_URL
-        self.timeout = 5
+    def __init__(
+        self,
+        prometheus_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        super().__init__(
+            prometheus_url or settings.PROMETHEUS_URL, timeout=5, transport=transport
+        )
+        self.prometheus_url = self.base_url
+        self.cache_ttl = settings.MONITORING_CACHE_TTL_SECONDS
+
+    async def get_metrics(
+        self, include_series: bool = False, since: Optional[float] = None
+    ) -> dict:
+        """Fetch metrics from Prometheus
+
+        The queries are sent concurrently and their results cached for
+        MONITORING_CACHE_TTL_SECONDS across all sessions.
 
-    async def get_metrics(self) -> dict:
-        """Fetch metrics from Prometheus"""
+        Args:
+            include_series (bool): Also return throughput and p50/p95/p99
+                latency over the last MONITORING_RANGE_MINUTES
+            since (float, optional): Timestamp of the newest point the caller
+                already has; only later points are fetched
+
+        Returns:
+            dict: Request totals, the latency histogram and optionally the
+                time series
+
+        Raises:
+            PrometheusConnectionError: If Prometheus cannot be queried
+        """
         try:
-            # Total predictions
-            total_query = "sum(image_classifier_predictions_total)"
-            total_response = requests.get(
-                f"{self.prometheus_url}/api/v1/query",
-                params={"query": total_query},
-                timeout=self.timeout,
-            )
-            total_response.raise_for_status()
-            total_data = total_response.json()
+            return await self._call(self._get_metrics(include_series, since))
+        except httpx.HTTPError as e:
+            raise PrometheusConnectionError(
+                "Unable to connect to Prometheus server"
+            ) from e
 
-            # Success rate of predictions
-            success_query = (
-                'sum(image_classifier_predictions_total{status="200"}) / '
-                "sum(image_classifier_predictions_total) * 100"
-            )
-            success_response = requests.get(
-                f"{self.prometheus_url}/api/v1/query",
-                params={"query": success_query},
-                timeout=self.timeout,
+    def fetch_metrics(
+        self, include_series: bool = False, since: Optional[float] = None
+    ) -> dict:
+        """Blocking version of `get_metrics` for code without an event loop"""
+        try:
+            return self._call_blocking(self._get_metrics(include_series, since))
+        except httpx.HTTPError as e:
+            raise PrometheusConnectionError(
+                "Unable to connect to Prometheus server"
+            ) from e
+
+    async def _get_metrics(self, include_series: bool, since: Optional[float]) -> dict:
+        queries = [
+            self._cached("query", TOTAL_QUERY),
+            self._cached("query", SUCCESS_QUERY),
+            self._cached("query", HISTOGRAM_QUERY),
+        ]
+        if include_series:
+            # Align the range to the step so sessions ask for the same points
+            # and share cached results
+            step = settings.MONITORING_RANGE_STEP_SECONDS
+            end = time.time() // step * step
+            start = (
+                since + step
+                if since is not None
+                else end - settings.MONITORING_RANGE_MINUTES * 60
             )
-            success_response.raise_for_status()
-            success_data = success_response.json()
-
-            # Histogram of prediction latencies
-            histogram_query = "sum(image_classifier_prediction_seconds_bucket) by (le)"
-            histogram_response = requests.get(
-                f"{self.prometheus_url}/api/v1/query",
-                params={"query": histogram_query},
-                timeout=self.timeout,
+            queries.append(
+                self._cached(
+                    "query_range",
+                    series_query("1m"),
+                    start=start,
+                    end=end,
+                    step=step,
+                )
+                if start <= end
+                else _no_new_points()
             )
-            histogram_response.raise_for_status()
-            histogram_data = histogram_response.json()
+        total_data, success_data, histogram_data, *series_data = await asyncio.gather(
+            *queries
+        )
 
-            total_predictions = int(
-                float(
-                    total_data["data"]["result"][0]["value"][1]
-                    if total_data["data"]["result"]
-                    else 0
-                )
+        total_predictions = int(
+            float(
+                total_data["data"]["result"][0]["value"][1]
+                if total_data["data"]["result"]
+                else 0
             )
+        )
 
-            success_rate = min(
-                100,
-                max(
-                    0,
-                    float(
-                        success_data["data"]["result"][0]["value"][1]
-                        if success_data["data"]["result"]
-                        else 100
-                    ),
+        success_rate = min(
+            100,
+            max(
+                0,
+                float(
+                    success_data["data"]["result"][0]["value"][1]
+                    if success_data["data"]["result"]
+                    else 100
                 ),
+            ),
+        )
+
+        histogram_buckets = []
+        if histogram_data["data"]["result"]:
+            results = sorted(
+                histogram_data["data"]["result"],
+                key=lambda x: float(x["metric"]["le"]),
             )
 
-            histogram_buckets = []
-            if histogram_data["data"]["result"]:
-                results = histogram_data["data"]["result"]
-                results.sort(key=lambda x: float(x["metric"]["le"]))
-
-                prev_count = 0
-                for result in results:
-                    bucket = result["metric"].get("le", "inf")
-                    if bucket != "inf":
-                        current_count = int(result["value"][1])
-                        bucket_count = current_count - prev_count
-                        histogram_buckets.append(
-                            {"bucket": float(bucket), "count": bucket_count}
-                        )
-                        prev_count = current_count
-
-            return {
-                "requests": {
-                    "total": total_predictions,
-                    "success": (success_rate / 100) * total_predictions,
-                    "error": ((100 - success_rate) / 100) * total_predictions,
-                },
-                "response_times": histogram_buckets if total_predictions > 0 else [],
-            }
-
-        except requests.exceptions.RequestException as e:
-            raise PrometheusConnectionError(
-                "Unable to connect to Prometheus server"
-            ) from e
+            prev_count = 0
+            for result in results:
+                bucket = result["metric"].get("le", "inf")
+                if bucket != "inf":
+                    current_count = int(float(result["value"][1]))
+                    bucket_count = current_count - prev_count
+                    histogram_buckets.append(
+                        {"bucket": float(bucket), "count": bucket_count}
+                    )
+                    prev_count = current_count
+
+        metrics = {
+            "requests": {
+                "total": total_predictions,
+                "success": (success_rate / 100) * total_predictions,
+                "error": ((100 - success_rate) / 100) * total_predictions,
+            },
+            "response_times": histogram_buckets if total_predictions > 0 else [],
+        }
+        if series_data:
+            metrics["series"] = self._parse_series(series_data[0])
+        return metrics
+
+    @staticmethod
+    def _parse_series(data: dict) -> dict:
+        """Timestamps and one list of values per series, aligned by timestamp
+
+        Missing points (e.g. quantiles with no traffic) are None.
+        """
+        values: Dict[str, Dict[float, Optional[float]]] = {}
+        for result in data["data"]["result"]:
+            points = values.setdefault(result["metric"]["series"], {})
+            for timestamp, value in result["values"]:
+                number = float(value)
+                points[timestamp] = None if number != number else number  # NaN
+        timestamps = sorted({ts for points in values.values() for ts in points})
+        series: Dict[str, Any] = {"timestamps": timestamps}
+        for name in ["throughput", *LATENCY_QUANTILES]:
+            points = values.get(name, {})
+            series[name] = [points.get(ts) for ts in timestamps]
+        return series
+
+    async def _cached(self, endpoint: str, query: str, **params: Any) -> Any:
+        """Run a query, sharing recent and in-flight results"""
+        key = (self.prometheus_url, endpoint, query, *sorted(params.items()))
+        now = time.monotonic()
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            return await asyncio.shield(entry[1])
+
+        _prune_cache(now)
+        future = asyncio.ensure_future(self._query(endpoint, query, params))
+        _cache[key] = (now + self.cache_ttl, future)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Do not keep serving a failure until the TTL runs out
+            if _cache.get(key, (0, None))[1] is future:
+                del _cache[key]
+            raise
+
+    async def _query(self, endpoint: str, query: str, params: dict) -> Any:
+        response = await self._get_client().get(
+            f"/api/v1/{endpoint}", params={"query": query, **params}
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+async def _no_new_points() -> dict:
+    return {"data": {"result": []}}
+
+
+def merge_series(existing: Optional[dict], new: dict, window_seconds: float) -> dict:
+    """Append newly fetched points to series already shown, dropping old ones
+
+    Args:
+        existing (dict, optional): Series kept from earlier refreshes
+        new (dict): Series returned by `get_metrics` with `since`
+        window_seconds (float): Time span to keep, counted back from the newest
+            point
+
+    Returns:
+        dict: The merged series, in the same format
+    """
+    if not existing:
+        return new
+    names = [name for name in existing if name != "timestamps"]
+    merged = {
+        name: existing[name] + new.get(name, [None] * len(new["timestamps"]))
+        for name in ["timestamps", *names]
+    }
+    if not merged["timestamps"]:
+        return merged
+    cutoff = merged["timestamps"][-1] - window_seconds
+    first = next(i for i, ts in enumerate(merged["timestamps"]) if ts >= cutoff)
+    return {name: values[first:] for name, values in merged.items()}
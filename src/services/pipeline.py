@@ -0,0 +1,241 @@
+"""Staged processing with bounded queues between worker pools"""
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+from src.core.middleware import PIPELINE_BUSY_WORKERS, PIPELINE_QUEUE_DEPTH
+
+
+@dataclass
+class Stage:
+    """One step of a Pipeline
+
+    Attributes:
+        name: Name used for the worker threads and metrics labels
+        fn: Function applied to each item, or to a list of items when
+            `batch_size` > 1, returning one result per item
+        workers: Number of threads running the stage
+        queue_size: Max number of items waiting in front of the stage
+        batch_size: Max number of items passed to `fn` at once
+        max_wait_ms: Max time a batch waits to fill once it has an item
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 32
+    batch_size: int = 1
+    max_wait_ms: float = 0.0
+
+
+@dataclass
+class _Job:
+    """An item travelling through the stages with the future of its result"""
+
+    value: Any
+    future: Future = field(default_factory=Future)
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage]):
+        """Runs items through stages, each on its own threads.
+
+        Stages are connected by bounded queues, so different items are in
+        different stages at the same time (one being decoded while another
+        runs through the model) and a slow stage blocks the ones in front of
+        it instead of letting work pile up in memory.
+
+        An exception raised by a stage fails the items it was processing and
+        skips the remaining stages for them; the pipeline keeps running.
+
+        Args:
+            name (str): Name of the pipeline for thread names and metrics labels
+            stages (List[Stage]): The stages, in order
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.name = name
+        self.stages = stages
+        self._queues: List[queue.Queue[Optional[_Job]]] = [
+            queue.Queue(maxsize=max(1, stage.queue_size)) for stage in stages
+        ]
+        self._depth = [
+            PIPELINE_QUEUE_DEPTH.labels(pipeline=name, stage=stage.name)
+            for stage in stages
+        ]
+        self._busy = [
+            PIPELINE_BUSY_WORKERS.labels(pipeline=name, stage=stage.name)
+            for stage in stages
+        ]
+        self._closed = False
+        self._threads: List[List[threading.Thread]] = []
+        for index, stage in enumerate(stages):
+            threads = [
+                threading.Thread(
+                    target=self._worker_loop,
+                    args=(index,),
+                    name=f"{name}-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                for worker in range(max(1, stage.workers))
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads.append(threads)
+
+    @property
+    def capacity(self) -> int:
+        """Max number of items inside the pipeline, queued or being processed"""
+        return sum(
+            q.maxsize + len(threads) * max(1, stage.batch_size)
+            for q, threads, stage in zip(
+                self._queues, self._threads, self.stages, strict=True
+            )
+        )
+
+    def submit(
+        self, value: Any, block: bool = True, timeout: Optional[float] = None
+    ) -> Future:
+        """Queue an item for the first stage.
+
+        Args:
+            value: Input of the first stage
+            block (bool): Wait for room in the first queue when it is full
+            timeout (float, optional): Max seconds to wait when blocking
+
+        Returns:
+            Future: Resolves to the output of the last stage
+
+        Raises:
+            queue.Full: If the first queue is still full
+        """
+        if self._closed:
+            raise RuntimeError("Pipeline is closed")
+        job = _Job(value=value)
+        self._put(0, job, block=block, timeout=timeout)
+        return job.future
+
+    async def predict(self, value: Any) -> Any:
+        """Submit an item and await its result from the event loop
+
+        While the first queue is full this waits without blocking the loop;
+        callers are expected to bound how many requests they admit.
+        """
+        delay = 0.001
+        while True:
+            try:
+                future = self.submit(value, block=False)
+                break
+            except queue.Full:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        return await asyncio.wrap_future(future)
+
+    def map(self, values: Iterable[Any]) -> Iterator[Future]:
+        """Feed items through the pipeline, yielding their futures in order
+
+        At most `capacity` items are submitted ahead of the one being
+        yielded, so arbitrarily long inputs run in bounded memory as long as
+        the caller waits for each future before asking for the next one.
+        """
+        pending: Deque[Future] = deque()
+        for value in values:
+            if len(pending) >= self.capacity:
+                yield pending.popleft()
+            pending.append(self.submit(value))
+        while pending:
+            yield pending.popleft()
+
+    def close(self) -> None:
+        """Stop the workers after the queued items are processed"""
+        if self._closed:
+            return
+        self._closed = True
+        # Stop stage by stage so the items a stage outputs are still consumed
+        for index, threads in enumerate(self._threads):
+            for _ in threads:
+                self._queues[index].put(None)
+            for thread in threads:
+                thread.join()
+
+    def _put(
+        self, index: int, job: _Job, block: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        self._queues[index].put(job, block=block, timeout=timeout)
+        self._depth[index].set(self._queues[index].qsize())
+
+    def _get(self, index: int, timeout: Optional[float] = None) -> Optional[_Job]:
+        job = (
+            self._queues[index].get(timeout=timeout)
+            if timeout is None or timeout > 0
+            else self._queues[index].get_nowait()
+        )
+        self._depth[index].set(self._queues[index].qsize())
+        return job
+
+    def _collect(self, index: int) -> tuple[List[_Job], bool]:
+        """Block for the first item, then gather more until the window closes"""
+        first = self._get(index)
+        if first is None:
+            return [], True
+
+        stage = self.stages[index]
+        jobs = [first]
+        deadline = time.perf_counter() + max(0.0, stage.max_wait_ms) / 1000
+        while len(jobs) < stage.batch_size:
+            try:
+                job = self._get(index, timeout=deadline - time.perf_counter())
+            except queue.Empty:
+                break
+            if job is None:
+                return jobs, True
+            jobs.append(job)
+        return jobs, False
+
+    def _worker_loop(self, index: int) -> None:
+        stop = False
+        while not stop:
+            jobs, stop = self._collect(index)
+            if index == 0:
+                # Drop items whose callers went away before processing started
+                jobs = [
+                    job for job in jobs if job.future.set_running_or_notify_cancel()
+                ]
+            if jobs:
+                self._process(index, jobs)
+
+    def _process(self, index: int, jobs: List[_Job]) -> None:
+        stage = self.stages[index]
+        self._busy[index].inc()
+        try:
+            if stage.batch_size > 1:
+                results = stage.fn([job.value for job in jobs])
+            else:
+                # Run in the submitter's context to keep its tracing span
+                results = [jobs[0].context.run(stage.fn, jobs[0].value)]
+        except Exception as e:
+            if stage.batch_size > 1:
+                logger.exception(f"Pipeline stage {self.name}/{stage.name} failed")
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        finally:
+            self._busy[index].dec()
+
+        last = index == len(self.stages) - 1
+        for job, result in zip(jobs, results, strict=True):
+            if last:
+                job.future.set_result(result)
+            else:
+                job.value = result
+                self._put(index + 1, job)
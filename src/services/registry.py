@@ -0,0 +1,508 @@
+"""Registry of served models with per-model routing and hot-swapping"""
+
+import asyncio
+import io
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from src.classifier.classifier import ImageClassifier
+from src.classifier.session import create_session_options, optimized_model_path
+from src.classifier.weights import shared_index_path, shared_model_path
+from src.core import tracing
+from src.core.config import ModelConfig, model_variant_path, settings
+from src.core.exceptions import ModelError, ModelNotFoundError
+from src.core.middleware import (
+    MODEL_INFERENCE_SECONDS,
+    MODEL_LOADS_TOTAL,
+    MODEL_MEMORY_BYTES,
+    MODEL_STARTUP_SECONDS,
+)
+from src.services.batching import MicroBatcher
+from src.services.pipeline import Pipeline, Stage
+from src.utils.preprocessing import (
+    ImagePreprocessor,
+    decode_input,
+    prepare_array_input,
+    prepare_input,
+)
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+Predictions = List[tuple[str, float]]
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or 0 if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def load_classifier(model_path: Path, labels_path: Path) -> ImageClassifier:
+    """Load a classifier with the ONNX Runtime settings
+
+    With MODEL_SHARED_WEIGHTS the shared-weights export of the model is loaded
+    instead, or the model itself with a warning if there is no export newer
+    than the model.
+
+    Args:
+        model_path (Path): Path to the ONNX model file
+        labels_path (Path): Path to the labels file
+
+    Returns:
+        ImageClassifier: The loaded classifier
+    """
+    session_options = create_session_options(
+        intra_op_threads=settings.ORT_INTRA_OP_THREADS,
+        inter_op_threads=settings.ORT_INTER_OP_THREADS,
+        execution_mode=settings.ORT_EXECUTION_MODE,
+        graph_optimization_level=settings.ORT_GRAPH_OPTIMIZATION_LEVEL,
+        enable_cpu_mem_arena=settings.ORT_ENABLE_CPU_MEM_ARENA,
+        enable_mem_pattern=settings.ORT_ENABLE_MEM_PATTERN,
+        allow_spinning=settings.ORT_ALLOW_SPINNING,
+    )
+    if settings.MODEL_SHARED_WEIGHTS:
+        index_path = shared_index_path(model_path)
+        if (
+            index_path.exists()
+            and index_path.stat().st_mtime >= model_path.stat().st_mtime
+        ):
+            return ImageClassifier(
+                shared_model_path(model_path),
+                labels_path,
+                session_options=session_options,
+                shared_weights=index_path,
+            )
+        logger.warning(
+            f"No shared weights exported for {model_path}, loading it per worker; "
+            "run python -m scripts.export_shared_weights"
+        )
+    return ImageClassifier(
+        model_path,
+        labels_path,
+        session_options=session_options,
+        optimized_model_path=(
+            optimized_model_path(
+                settings.ORT_OPTIMIZED_MODEL_DIR,
+                model_path,
+                settings.ORT_GRAPH_OPTIMIZATION_LEVEL,
+            )
+            if settings.ORT_OPTIMIZED_MODEL_DIR is not None
+            else None
+        ),
+    )
+
+
+def create_preprocessor(config: ModelConfig) -> ImagePreprocessor:
+    """Preprocessing matching a model's input"""
+    return ImagePreprocessor(
+        config.image_size,
+        resize_mode=config.resize_mode,
+        normalization=config.normalization,
+        crop_ratio=config.crop_ratio,
+    )
+
+
+def warmup_models() -> List[str]:
+    """Models loaded at startup, WARMUP_MODELS or the default model"""
+    return settings.WARMUP_MODELS or [settings.DEFAULT_MODEL]
+
+
+def warmup_batch_sizes() -> List[int]:
+    """Batch sizes run at warm-up, WARMUP_BATCH_SIZES or 1 and BATCH_MAX_SIZE"""
+    return settings.WARMUP_BATCH_SIZES or sorted({1, max(1, settings.BATCH_MAX_SIZE)})
+
+
+class LoadedModel:
+    def __init__(self, name: str, config: ModelConfig):
+        """A loaded model with its own preprocessing and micro-batcher.
+
+        Args:
+            name (str): Name the model is routed by
+            config (ModelConfig): The model configuration
+
+        Attributes:
+            classifier: The ONNX Runtime classifier
+            preprocessor: Preprocessing matching the model input
+            batcher: Micro-batcher in front of the classifier
+            pipeline: Decode, preprocess and inference stages taking uploaded
+                bytes or pixel arrays, when PIPELINE_ENABLED is set
+            memory_bytes: Resident memory added by loading the model
+            load_seconds: Time spent creating the inference session
+        """
+        self.name = name
+        self.config = config
+        self.model_path = model_variant_path(config.model_path, config.precision)
+
+        rss_before = current_rss()
+        start = time.perf_counter()
+        self.classifier = load_classifier(self.model_path, config.labels_path)
+        self.load_seconds = time.perf_counter() - start
+        self.memory_bytes = max(0, current_rss() - rss_before)
+        self.model_mtime = self.model_path.stat().st_mtime
+        self.loaded_at = time.time()
+
+        self.preprocessor = create_preprocessor(config)
+        # A model with a fixed batch size runs larger batches in several calls,
+        # so waiting for more requests than that gains nothing. With a fixed
+        # size of 1, the default model's, requests are run as they arrive.
+        self.max_batch_size = min(
+            max(1, settings.BATCH_MAX_SIZE),
+            self.classifier.max_batch_size or settings.BATCH_MAX_SIZE,
+        )
+        self.batcher: MicroBatcher[Predictions] = MicroBatcher(
+            self._run_batch,
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+        )
+        self.pipeline: Optional[Pipeline] = (
+            self._create_pipeline() if settings.PIPELINE_ENABLED else None
+        )
+        # Everything that changes predictions for the same uploaded bytes
+        self.cache_namespace = ":".join(
+            str(part)
+            for part in (
+                name,
+                self.classifier.version,
+                config.image_size,
+                config.resize_mode,
+                config.normalization,
+                config.crop_ratio,
+                settings.DECODE_DRAFT,
+                settings.DECODE_DRAFT_SCALE,
+            )
+        )
+
+        self.inference_count = 0
+        self.inference_seconds = 0.0
+        self._in_flight = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+        MODEL_MEMORY_BYTES.labels(model=name).set(self.memory_bytes)
+        MODEL_LOADS_TOTAL.labels(model=name).inc()
+        MODEL_STARTUP_SECONDS.labels(model=name, step="load").set(self.load_seconds)
+
+    @property
+    def version(self) -> str:
+        return self.classifier.version
+
+    @property
+    def mean_inference_ms(self) -> Optional[float]:
+        """Mean time per inference batch, or None before the first one"""
+        if self.inference_count == 0:
+            return None
+        return self.inference_seconds / self.inference_count * 1000
+
+    def _run_batch(self, batch: np.ndarray) -> List[Predictions]:
+        # Ask for TOP_K_MAX classes so each caller can slice its own k
+        start = time.perf_counter()
+        results = self.classifier.predict_batch(batch, k=settings.TOP_K_MAX)
+        duration = time.perf_counter() - start
+
+        MODEL_INFERENCE_SECONDS.labels(model=self.name).observe(duration)
+        self.inference_count += 1
+        self.inference_seconds += duration
+        return results
+
+    def warm_up(self, batch_sizes: List[int], runs: int) -> Dict[str, float]:
+        """Run a dummy image through decoding, preprocessing and the model
+
+        The first session run allocates the memory arenas and picks kernels,
+        and every new batch size allocates again, so without this the first
+        requests after a deploy pay for it.
+
+        Args:
+            batch_sizes (List[int]): Batch sizes to run the model with
+            runs (int): Number of runs per batch size
+
+        Returns:
+            Dict[str, float]: Seconds spent in "preprocess", "first_inference"
+                and the remaining "inference" runs
+        """
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", self.config.image_size).save(buffer, format="JPEG")
+        start = time.perf_counter()
+        array = prepare_input(buffer.getvalue(), self.preprocessor)
+        durations = {"preprocess": time.perf_counter() - start, "inference": 0.0}
+
+        # Batches are never larger than the model's own batch size
+        for batch_size in sorted(
+            {min(size, self.max_batch_size) for size in batch_sizes}
+        ):
+            batch = np.repeat(array, batch_size, axis=0)
+            for _ in range(max(1, runs)):
+                start = time.perf_counter()
+                self.classifier.predict_batch(batch, k=settings.TOP_K_MAX)
+                duration = time.perf_counter() - start
+                if "first_inference" not in durations:
+                    durations["first_inference"] = duration
+                else:
+                    durations["inference"] += duration
+
+        for step, seconds in durations.items():
+            MODEL_STARTUP_SECONDS.labels(model=self.name, step=step).set(seconds)
+        return durations
+
+    def _create_pipeline(self) -> Pipeline:
+        return Pipeline(
+            self.name,
+            [
+                Stage(
+                    "decode",
+                    self._decode,
+                    workers=settings.PIPELINE_DECODE_WORKERS,
+                    queue_size=settings.PIPELINE_QUEUE_SIZE,
+                ),
+                Stage(
+                    "preprocess",
+                    self._preprocess,
+                    workers=settings.PIPELINE_PREPROCESS_WORKERS,
+                    queue_size=settings.PIPELINE_QUEUE_SIZE,
+                ),
+                Stage(
+                    "inference",
+                    # Stages of batch size 1 are passed single items
+                    self._infer if self.max_batch_size > 1 else self._infer_one,
+                    queue_size=settings.PIPELINE_QUEUE_SIZE,
+                    batch_size=self.max_batch_size,
+                    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+                ),
+            ],
+        )
+
+    def _decode(
+        self, contents: Union[bytes, np.ndarray]
+    ) -> Union["Image.Image", np.ndarray]:
+        # Pixel arrays are already decoded
+        if isinstance(contents, np.ndarray):
+            return contents
+        return decode_input(contents, self.preprocessor)
+
+    def _preprocess(self, image: Union["Image.Image", np.ndarray]) -> np.ndarray:
+        if isinstance(image, np.ndarray):
+            return prepare_array_input(image, self.preprocessor)
+        with tracing.stage("preprocess"):
+            return self.preprocessor.preprocess(image)
+
+    def _infer(self, arrays: List[np.ndarray]) -> List[Predictions]:
+        return self._run_batch(np.concatenate(arrays))
+
+    def _infer_one(self, array: np.ndarray) -> Predictions:
+        return self._run_batch(array)[0]
+
+    def acquire(self) -> bool:
+        """Count a request in, unless the model was retired by a swap"""
+        with self._lock:
+            if self._retired:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            drained = self._retired and self._in_flight == 0
+        if drained:
+            self.close()
+
+    def retire(self) -> None:
+        """Stop serving new requests and close once in-flight requests finish"""
+        with self._lock:
+            self._retired = True
+            drained = self._in_flight == 0
+        if drained:
+            self.close()
+
+    def close(self) -> None:
+        if self.pipeline is not None:
+            self.pipeline.close()
+        self.batcher.close()
+        logger.info(f"Unloaded model {self.name} version {self.version}")
+
+
+class ModelRegistry:
+    def __init__(self, configs: dict[str, ModelConfig], default: str):
+        """Loads models on first use and routes requests to them by name.
+
+        Swapping in a new version builds it completely before replacing the old
+        one under a lock, so requests never see a half-loaded model. The old
+        version keeps serving the requests that already acquired it and is
+        closed once they finish.
+
+        Args:
+            configs (dict[str, ModelConfig]): Model configurations by name
+            default (str): Name of the model used when a request names none
+        """
+        if default not in configs:
+            raise ValueError(f"Default model {default!r} is not configured")
+        self.configs = dict(configs)
+        self.default = default
+        self._models: dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in configs}
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get(self, name: Optional[str] = None) -> LoadedModel:
+        """Return the loaded model, loading it on first use
+
+        Raises:
+            ModelNotFoundError: If no model with that name is configured
+        """
+        name = name or self.default
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self.configs:
+            raise ModelNotFoundError(f"Unknown model: {name}")
+
+        with self._load_locks[name]:
+            # Another request may have loaded it while we waited for the lock
+            model = self._models.get(name)
+            if model is None:
+                model = LoadedModel(name, self.configs[name])
+                with self._lock:
+                    self._models[name] = model
+            return model
+
+    async def get_async(self, name: Optional[str] = None) -> LoadedModel:
+        """`get` for the event loop
+
+        A model that is not loaded yet is loaded, or waited for while warm-up
+        or a reload loads it, in a thread, so the loop keeps serving other
+        requests meanwhile.
+
+        Raises:
+            ModelNotFoundError: If no model with that name is configured
+        """
+        model = self._models.get(name or self.default)
+        if model is not None:
+            return model
+        return await asyncio.to_thread(self.get, name)
+
+    @contextmanager
+    def acquire(self, name: Optional[str] = None) -> Iterator[LoadedModel]:
+        """Use a model for one request, keeping it alive across a hot swap
+
+        Raises:
+            ModelNotFoundError: If no model with that name is configured
+            ModelError: If the registry was closed
+        """
+        model = self.get(name)
+        while not self._enter(model):
+            model = self.get(name)
+        try:
+            yield model
+        finally:
+            model.release()
+
+    @asynccontextmanager
+    async def acquire_async(
+        self, name: Optional[str] = None
+    ) -> AsyncIterator[LoadedModel]:
+        """`acquire` for the event loop, loading the model like `get_async`
+
+        Raises:
+            ModelNotFoundError: If no model with that name is configured
+            ModelError: If the registry was closed
+        """
+        model = await self.get_async(name)
+        while not self._enter(model):
+            model = await self.get_async(name)
+        try:
+            yield model
+        finally:
+            model.release()
+
+    def _enter(self, model: LoadedModel) -> bool:
+        """Count a request in, or return False to look the model up again"""
+        if model.acquire():
+            return True
+        # A reload retired it after the lookup; the new version is already
+        # registered, since the swap happens before the old one is retired
+        if self._stop.is_set():
+            raise ModelError(f"Model {model.name} is shutting down")
+        return False
+
+    def reload(self, name: str) -> LoadedModel:
+        """Load a new version of a model and atomically swap it in
+
+        The model is reloaded from its file with the server-side configuration;
+        only configured models can be reloaded.
+
+        Args:
+            name (str): Name of the model
+
+        Returns:
+            LoadedModel: The newly loaded model
+
+        Raises:
+            ModelNotFoundError: If no model with that name is configured
+            ModelError: If the new version fails to load
+        """
+        if name not in self.configs:
+            raise ModelNotFoundError(f"Unknown model: {name}")
+
+        with self._load_locks[name]:
+            model = LoadedModel(name, self.configs[name])
+            if settings.WARMUP_ENABLED:
+                # Warm the new version up before it takes traffic
+                try:
+                    model.warm_up(warmup_batch_sizes(), settings.WARMUP_RUNS)
+                except Exception:
+                    model.close()
+                    raise
+            with self._lock:
+                previous = self._models.get(name)
+                self._models[name] = model
+        if previous is not None:
+            previous.retire()
+        logger.info(f"Model {name} now serving version {model.version}")
+        return model
+
+    def loaded(self) -> List[LoadedModel]:
+        with self._lock:
+            return list(self._models.values())
+
+    def start_watching(self, interval: float) -> None:
+        """Poll model files and hot-swap models whose file was replaced
+
+        Each worker process runs its own watcher, so replacing the model file
+        (atomically, e.g. with a rename) rolls the new version out to all of them.
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="model-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        for model in self.loaded():
+            model.retire()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self._watch_once()
+
+    def _watch_once(self) -> None:
+        for model in self.loaded():
+            try:
+                if Path(model.model_path).stat().st_mtime != model.model_mtime:
+                    self.reload(model.name)
+            except Exception:
+                logger.exception(f"Failed to hot-swap model {model.name}")
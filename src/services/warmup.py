@@ -0,0 +1,140 @@
+"""Startup warm-up of the served models and the readiness it gates"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from src.classifier.weights import preload_weights, shared_index_path
+from src.core.config import model_variant_path, settings
+from src.core.middleware import STARTUP_SECONDS, WORKERS_READY
+from src.services.registry import ModelRegistry
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started, or None if unavailable"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - started)
+
+
+def preload_shared_weights(models: List[str]) -> int:
+    """Map the exported shared weights of models before workers are forked
+
+    Run in the parent of a pre-forking server, see gunicorn.conf.py. Models
+    without an export are skipped, their workers load them on their own.
+
+    Args:
+        models (List[str]): Names of the models to preload
+
+    Returns:
+        int: Bytes of weights mapped
+    """
+    configs = settings.model_configs()
+    total = 0
+    for name in models:
+        config = configs[name]
+        index_path = shared_index_path(
+            model_variant_path(config.model_path, config.precision)
+        )
+        if index_path.exists():
+            total += preload_weights(index_path)
+    return total
+
+
+class Readiness:
+    def __init__(self) -> None:
+        """Whether this worker finished warming up and can take traffic.
+
+        Liveness (/health) only says the process answers; readiness (/ready)
+        says requests will not pay for loading the model.
+
+        Attributes:
+            error: Why warm-up failed, if it did
+            phases: Seconds spent in each startup phase
+        """
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def status(self) -> str:
+        if self.ready:
+            return "ready"
+        return "failed" if self.error is not None else "starting"
+
+    def mark_ready(self) -> None:
+        if not self.ready:
+            self._ready.set()
+            WORKERS_READY.inc()
+
+    def mark_failed(self, error: str) -> None:
+        self.error = error
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until ready, returning whether it became ready in time"""
+        return self._ready.wait(timeout)
+
+
+def warm_up(
+    registry: ModelRegistry,
+    readiness: Readiness,
+    models: List[str],
+    batch_sizes: List[int],
+    runs: int,
+) -> None:
+    """Load and warm up models, then mark the worker ready
+
+    Failures are logged and recorded on `readiness`, which then stays not
+    ready, instead of being raised: the worker keeps running so its liveness
+    and metrics endpoints still answer.
+
+    Args:
+        registry (ModelRegistry): Registry the models are loaded into
+        readiness (Readiness): Readiness to update
+        models (List[str]): Names of the models to load
+        batch_sizes (List[int]): Batch sizes to run each model with
+        runs (int): Number of runs per batch size
+    """
+    started = time.perf_counter()
+    age = process_age()
+    if age is not None:
+        # Interpreter start-up and imports, before the app started
+        readiness.phases["process_start"] = age
+    try:
+        for name in models:
+            start = time.perf_counter()
+            model = registry.get(name)
+            load = time.perf_counter() - start
+            durations = model.warm_up(batch_sizes, runs)
+            readiness.phases["load"] = readiness.phases.get("load", 0.0) + load
+            readiness.phases["warmup"] = readiness.phases.get("warmup", 0.0) + sum(
+                durations.values()
+            )
+            logger.info(
+                f"Warmed up model {name} in {load + sum(durations.values()):.2f}s "
+                f"(load {load:.2f}s, first inference "
+                f"{durations.get('first_inference', 0):.3f}s)"
+            )
+    except Exception as e:
+        logger.exception("Model warm-up failed")
+        readiness.mark_failed(f"{type(e).__name__}: {e}")
+        return
+
+    readiness.phases["total"] = (age or 0.0) + time.perf_counter() - started
+    for phase, seconds in readiness.phases.items():
+        STARTUP_SECONDS.labels(phase=phase).set(seconds)
+    readiness.mark_ready()
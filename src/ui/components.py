@@ -51,3 +51,35 @@ def create_predictions_plot(predictions: List[PredictionItem]) -> go.Figure:
     )
 
     return fig
+
+
+def create_series_plot(
+    series: dict, names: List[str], yaxis_title: str, scale: float = 1.0
+) -> go.Figure:
+    """Create a line plot of metric time series returned by MonitoringService"""
+    timestamps = pd.to_datetime(series["timestamps"], unit="s")
+    fig = go.Figure(
+        [
+            go.Scatter(
+                x=timestamps,
+                y=[None if v is None else v * scale for v in series[name]],
+                mode="lines",
+                name=name,
+            )
+            for name in names
+        ]
+    )
+
+    fig.update_layout(
+        yaxis_title=yaxis_title,
+        xaxis=dict(gridcolor="rgba(255,255,255,0.1)"),
+        yaxis=dict(gridcolor="rgba(255,255,255,0.1)", rangemode="tozero"),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        legend=dict(orientation="h"),
+        margin=dict(l=20, r=20, t=20, b=20),
+        height=300,
+    )
+
+    return fig
@@ -1,12 +1,11 @@
 """UI pages for the Streamlit application"""
 
-import time
-
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 from PIL import Image
 
+from src.core.config import settings
 from src.core.exceptions import (
     APIConnectionError,
     ModelError,
@@ -14,10 +13,11 @@ from src.core.exceptions import (
     ValidationError,
 )
 from src.services.api import APIService
-from src.services.monitoring import MonitoringService
-from src.ui.components import create_predictions_plot
+from src.services.monitoring import MonitoringService, merge_series
+from src.ui.components import create_predictions_plot, create_series_plot
 
 api_service = APIService()
+monitoring_service = MonitoringService()
 
 
 async def classification_page() -> None:
@@ -145,10 +145,10 @@ async def model_info_page() -> None:
 
         with col1:
             st.markdown(
-                """
+                f"""
                 <div class="tech-card">
                     <div class="tech-label">Model Architecture</div>
-                    <div class="tech-value">SqueezeNet 1.1 (CNN)</div>
+                    <div class="tech-value">{info.name}</div>
                 </div>
                 <div class="tech-card">
                     <div class="tech-label">Framework</div>
@@ -200,8 +200,6 @@ async def model_info_page() -> None:
 
 async def monitoring_page() -> None:
     """Monitoring page content"""
-    monitoring_service = MonitoringService()
-
     # Add refresh rate selector
     refresh_rate = st.sidebar.slider(
         "Refresh Rate (seconds)",
@@ -211,124 +209,162 @@ async def monitoring_page() -> None:
         help="How often to refresh the metrics",
         key="refresh_rate_slider",
     )
+    show_trends = st.sidebar.toggle(
+        "Show trends",
+        value=True,
+        help="Throughput and latency percentiles over the last "
+        f"{settings.MONITORING_RANGE_MINUTES} minutes",
+        key="show_trends_toggle",
+    )
 
-    try:
-        metrics_container = st.empty()
+    # Only the fragment reruns on the timer: no thread sleeps per viewer and
+    # the rest of the page is not rebuilt
+    st.fragment(run_every=refresh_rate)(monitoring_dashboard)(show_trends)
 
-        while True:
-            with metrics_container.container():
-                try:
-                    metrics = await monitoring_service.get_metrics()
-                    current_time = int(time.time())
-
-                    # Create two columns for the layout
-                    left_col, right_col = st.columns(2)
-
-                    # Left Column: Request Statistics
-                    with left_col:
-                        st.subheader("Request Statistics", divider="blue")
-                        total_requests = metrics["requests"]["total"]
-
-                        st.metric(
-                            "Total Predictions",
-                            f"{int(total_requests):,}",
-                            help="Total number of predictions made",
-                        )
-
-                        if total_requests > 0:
-                            success_rate = (
-                                metrics["requests"]["success"] / total_requests * 100
-                            )
-                            st.metric(
-                                "Success Rate",
-                                f"{success_rate:.1f}%",
-                                help="Percentage of successful predictions",
-                            )
-                            st.metric(
-                                "Error Rate",
-                                f"{(100-success_rate):.1f}%",
-                                help="Percentage of failed predictions",
-                            )
-                        else:
-                            st.metric(
-                                "Success Rate",
-                                "N/A",
-                                help="No predictions made yet",
-                            )
-                            st.metric(
-                                "Error Rate",
-                                "N/A",
-                                help="No predictions made yet",
-                            )
-
-                    # Right Column: Response Time Distribution
-                    with right_col:
-                        st.subheader("Response Time Distribution", divider="blue")
-                        if metrics["response_times"]:
-                            df = pd.DataFrame(metrics["response_times"])
-
-                            # Create range labels
-                            ranges = []
-                            for i, row in enumerate(df.itertuples()):
-                                if i == 0:
-                                    ranges.append("0-100ms")
-                                else:
-                                    prev_bucket = df["bucket"].iloc[i - 1]
-                                    curr_bucket = row.bucket
-                                    if curr_bucket == float("inf"):
-                                        ranges.append(">1000ms")
-                                    else:
-                                        ranges.append(
-                                            f"{int(prev_bucket*1000)}-{int(curr_bucket*1000)}ms"
-                                        )
-
-                            df["range"] = ranges
-
-                            fig = go.Figure(
-                                go.Bar(
-                                    x=df["range"],
-                                    y=df["count"],
-                                    text=[f"{int(count):,}" for count in df["count"]],
-                                    textposition="auto",
-                                    marker=dict(
-                                        color="#0078D4",
-                                        line=dict(
-                                            color="rgba(255, 255, 255, 0.5)", width=1
-                                        ),
-                                    ),
-                                )
-                            )
-
-                            fig.update_layout(
-                                xaxis_title="Response Time (milliseconds)",
-                                yaxis_title="Number of Requests",
-                                plot_bgcolor="rgba(0,0,0,0)",
-                                paper_bgcolor="rgba(0,0,0,0)",
-                                font=dict(color="white"),
-                                showlegend=False,
-                                margin=dict(l=20, r=20, t=20, b=20),
-                                height=350,
-                            )
-
-                            st.plotly_chart(
-                                fig,
-                                use_container_width=True,
-                                key=f"latency_histogram_{current_time}",
-                            )
-                        else:
-                            st.info("No prediction requests have been made yet.")
-
-                except PrometheusConnectionError:
-                    st.error("Unable to connect to Prometheus server")
-                    st.warning(
-                        "Please make sure Prometheus is running. You can start it with:\n"
-                        "```bash\n"
-                        "prometheus --config.file=prometheus.local.yml\n"
-                        "```"
-                    )
-
-            time.sleep(refresh_rate)
 
+def monitoring_dashboard(show_trends: bool) -> None:
+    """Metrics and charts, refreshed in place by periodic fragment reruns
+
+    Charts keep stable keys so each refresh updates the existing chart, and
+    the trend series are kept in the session so only new points are fetched.
+    """
+    try:
+        series = None
+        if show_trends:
+            previous = st.session_state.get("monitoring_series")
+            since = (
+                previous["timestamps"][-1]
+                if previous and previous["timestamps"]
+                else None
+            )
+            metrics = monitoring_service.fetch_metrics(include_series=True, since=since)
+            series = merge_series(
+                previous, metrics["series"], settings.MONITORING_RANGE_MINUTES * 60
+            )
+            st.session_state["monitoring_series"] = series
+        else:
+            metrics = monitoring_service.fetch_metrics()
+            st.session_state.pop("monitoring_series", None)
+    except PrometheusConnectionError:
+        st.error("Unable to connect to Prometheus server")
+        st.warning(
+            "Please make sure Prometheus is running. You can start it with:\n"
+            "```bash\n"
+            "prometheus --config.file=prometheus.local.yml\n"
+            "```"
+        )
+        return
     except Exception as e:
         st.error(f"An unexpected error occurred: {str(e)}")
         st.info("Please try refreshing the page")
+        return
+
+    # Create two columns for the layout
+    left_col, right_col = st.columns(2)
+
+    # Left Column: Request Statistics
+    with left_col:
+        st.subheader("Request Statistics", divider="blue")
+        total_requests = metrics["requests"]["total"]
+
+        st.metric(
+            "Total Predictions",
+            f"{int(total_requests):,}",
+            help="Total number of predictions made",
+        )
+
+        if total_requests > 0:
+            success_rate = metrics["requests"]["success"] / total_requests * 100
+            st.metric(
+                "Success Rate",
+                f"{success_rate:.1f}%",
+                help="Percentage of successful predictions",
+            )
+            st.metric(
+                "Error Rate",
+                f"{(100-success_rate):.1f}%",
+                help="Percentage of failed predictions",
+            )
+        else:
+            st.metric(
+                "Success Rate",
+                "N/A",
+                help="No predictions made yet",
+            )
+            st.metric(
+                "Error Rate",
+                "N/A",
+                help="No predictions made yet",
+            )
+
+    # Right Column: Response Time Distribution
+    with right_col:
+        st.subheader("Response Time Distribution", divider="blue")
+        if metrics["response_times"]:
+            df = pd.DataFrame(metrics["response_times"])
+
+            # Create range labels from the bucket bounds
+            ranges = []
+            for i, row in enumerate(df.itertuples()):
+                prev_bucket = df["bucket"].iloc[i - 1] if i else 0.0
+                curr_bucket = row.bucket
+                if curr_bucket == float("inf"):
+                    ranges.append(f">{prev_bucket * 1000:g}ms")
+                else:
+                    ranges.append(f"{prev_bucket * 1000:g}-{curr_bucket * 1000:g}ms")
+
+            df["range"] = ranges
+
+            fig = go.Figure(
+                go.Bar(
+                    x=df["range"],
+                    y=df["count"],
+                    text=[f"{int(count):,}" for count in df["count"]],
+                    textposition="auto",
+                    marker=dict(
+                        color="#0078D4",
+                        line=dict(color="rgba(255, 255, 255, 0.5)", width=1),
+                    ),
+                )
+            )
+
+            fig.update_layout(
+                xaxis_title="Response Time (milliseconds)",
+                yaxis_title="Number of Requests",
+                plot_bgcolor="rgba(0,0,0,0)",
+                paper_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="white"),
+                showlegend=False,
+                margin=dict(l=20, r=20, t=20, b=20),
+                height=350,
+            )
+
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key="latency_histogram",
+            )
+        else:
+            st.info("No prediction requests have been made yet.")
+
+    if series and series["timestamps"]:
+        throughput_col, latency_col = st.columns(2)
+        with throughput_col:
+            st.subheader("Throughput", divider="blue")
+            st.plotly_chart(
+                create_series_plot(series, ["throughput"], "Requests/s"),
+                use_container_width=True,
+                key="throughput_series",
+            )
+        with latency_col:
+            st.subheader("Latency Percentiles", divider="blue")
+            st.plotly_chart(
+                create_series_plot(
+                    series,
+                    ["p50", "p95", "p99"],
+                    "Milliseconds",
+                    scale=1000,
+                ),
+                use_container_width=True,
+                key="latency_series",
+            )
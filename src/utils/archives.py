@@ -0,0 +1,114 @@
+"""Utilities for reading images out of zip and tar archives"""
+
+import io
+import tarfile
+import zipfile
+from functools import partial
+from pathlib import PurePosixPath
+from typing import Callable, List, Optional
+
+from src.core.exceptions import ValidationError
+
+
+def is_archive(contents: bytes) -> bool:
+    """Check whether the bytes are a zip or tar archive
+
+    Args:
+        contents (bytes): The uploaded bytes
+
+    Returns:
+        bool: True if the bytes are a zip or tar archive
+    """
+    if zipfile.is_zipfile(io.BytesIO(contents)):
+        return True
+    try:
+        with tarfile.open(fileobj=io.BytesIO(contents)):
+            return True
+    except tarfile.TarError:
+        return False
+
+
+def is_hidden(name: str) -> bool:
+    """Skip macOS resource forks and dotfiles that archivers like to add"""
+    return any(part.startswith((".", "__MACOSX")) for part in PurePosixPath(name).parts)
+
+
+def _read_member(archive: tarfile.TarFile, member: tarfile.TarInfo) -> bytes:
+    file = archive.extractfile(member)
+    if file is None:
+        raise ValidationError(f"Unable to read {member.name} from archive")
+    return file.read()
+
+
+def extract_archive(
+    contents: bytes,
+    max_members: int,
+    max_total_bytes: int,
+    max_entries: Optional[int] = None,
+) -> List[tuple[str, bytes]]:
+    """Extract the regular files from a zip or tar archive into memory
+
+    Tar headers are read one at a time and extraction stops at the first
+    limit exceeded, so a small compressed tar of many entries is rejected
+    without decompressing all of it.
+
+    Args:
+        contents (bytes): The archive bytes
+        max_members (int): Max number of files to extract
+        max_total_bytes (int): Max total uncompressed size of the extracted files
+        max_entries (int, optional): Max number of entries, directories and
+            skipped files included; 4 x `max_members` by default
+
+    Returns:
+        List of (member name, member bytes) tuples
+
+    Raises:
+        ValidationError: If the archive is invalid or exceeds the limits
+    """
+    if max_entries is None:
+        max_entries = 4 * max_members
+    members: List[tuple[str, bytes]] = []
+    total_bytes = 0
+    entries = 0
+
+    def count_entry() -> None:
+        nonlocal entries
+        entries += 1
+        if entries > max_entries:
+            raise ValidationError(f"Archive contains more than {max_entries} entries")
+
+    def add(name: str, size: int, read: Callable[[], bytes]) -> None:
+        nonlocal total_bytes
+        if len(members) >= max_members:
+            raise ValidationError(f"Archive contains more than {max_members} files")
+        total_bytes += size
+        if total_bytes > max_total_bytes:
+            raise ValidationError(
+                f"Archive expands to more than {max_total_bytes} bytes"
+            )
+        members.append((name, read()))
+
+    try:
+        if zipfile.is_zipfile(io.BytesIO(contents)):
+            with zipfile.ZipFile(io.BytesIO(contents)) as zip_archive:
+                for info in zip_archive.infolist():
+                    count_entry()
+                    if info.is_dir() or is_hidden(info.filename):
+                        continue
+                    add(info.filename, info.file_size, partial(zip_archive.read, info))
+        else:
+            with tarfile.open(fileobj=io.BytesIO(contents)) as tar_archive:
+                # Iterated rather than getmembers(), which reads every header
+                for member in tar_archive:
+                    count_entry()
+                    if not member.isfile() or is_hidden(member.name):
+                        continue
+                    add(
+                        member.name,
+                        member.size,
+                        partial(_read_member, tar_archive, member),
+                    )
+    except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+        raise ValidationError("Invalid archive file") from e
+
+    return members
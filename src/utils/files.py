@@ -0,0 +1,22 @@
+"""Utilities for finding images on disk"""
+
+from pathlib import Path
+from typing import List
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def find_images(directory: Path) -> List[Path]:
+    """Find the image files in a directory tree
+
+    Args:
+        directory (Path): The directory to search
+
+    Returns:
+        List of image file paths
+    """
+    return sorted(
+        path
+        for path in directory.rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES
+    )
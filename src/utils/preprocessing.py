@@ -1,13 +1,218 @@
 """Preprocessing utilities"""
 
 import io
+import math
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Literal, Optional, Sequence
 
 import numpy as np
 from fastapi import HTTPException, status
-from PIL import Image
 
+from src.core import tracing
+from src.core.config import settings
+from src.core.exceptions import ValidationError
+from src.core.middleware import DECODED_PIXELS, INPUT_BYTES, INPUT_HEIGHT, INPUT_WIDTH
 
-def preprocess_image(image: Image.Image, size: tuple[int, int]) -> np.ndarray:
+if TYPE_CHECKING:
+    # Pillow is imported by the first decode, not with the API
+    from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+# Modes Image.reduce averages correctly, others are converted to RGB first
+REDUCE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F"}
+
+
+class ImagePreprocessor:
+    def __init__(
+        self,
+        size: tuple[int, int],
+        resize_mode: Literal["resize", "center_crop"] = "resize",
+        normalization: Literal["unit", "imagenet"] = "unit",
+        crop_ratio: float = 0.875,
+    ):
+        """Converts PIL images into float32 NCHW model inputs.
+
+        The uint8 HWC pixels are converted, transposed and scaled in a single
+        ufunc pass straight into the output array, with no float64 or
+        transposed temporaries.
+
+        Args:
+            size (tuple[int, int]): Output width and height
+            resize_mode (str): "resize" stretches the image to `size`,
+                "center_crop" keeps the aspect ratio and crops the central
+                `crop_ratio` of the shorter side
+            normalization (str): "unit" scales to [0, 1], "imagenet" also
+                subtracts the ImageNet mean and divides by its std
+            crop_ratio (float): Fraction of the shorter side kept by center crop
+        """
+        if resize_mode not in ("resize", "center_crop"):
+            raise ValueError(f"Unknown resize mode: {resize_mode}")
+        if normalization not in ("unit", "imagenet"):
+            raise ValueError(f"Unknown normalization: {normalization}")
+
+        self.size = size
+        self.resize_mode = resize_mode
+        self.normalization = normalization
+        self.crop_ratio = crop_ratio
+
+        # Fold [0, 1] scaling and mean/std normalization into x * scale + offset
+        mean = np.array(IMAGENET_MEAN if normalization == "imagenet" else (0, 0, 0))
+        std = np.array(IMAGENET_STD if normalization == "imagenet" else (1, 1, 1))
+        self._scale = (1 / (255.0 * std)).astype(np.float32).reshape(3, 1, 1)
+        self._offset = (
+            (-mean / std).astype(np.float32).reshape(3, 1, 1)
+            if normalization == "imagenet"
+            else None
+        )
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict:
+        # Thread-local buffers are not picklable; process pool workers make their own
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def resize(self, image: "Image.Image") -> "Image.Image":
+        """Resize (and center crop) an image to the output size
+
+        Args:
+            image (PIL.Image.Image): The image to resize
+
+        Returns:
+            PIL.Image.Image: The resized RGB image
+        """
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if self.resize_mode == "resize":
+            return image.resize(self.size)
+
+        # Crop the largest centered box with the output aspect ratio, scaled by
+        # crop_ratio, and resample it to the output size in a single pass
+        width, height = image.size
+        out_width, out_height = self.size
+        scale = min(width / out_width, height / out_height) * self.crop_ratio
+        box_width, box_height = out_width * scale, out_height * scale
+        left, top = (width - box_width) / 2, (height - box_height) / 2
+        return image.resize(
+            self.size, box=(left, top, left + box_width, top + box_height)
+        )
+
+    def min_source_size(self, scale: float = 1.0) -> tuple[int, int]:
+        """Smallest source size that still yields `scale` source pixels per output pixel
+
+        Decoders may downscale images to this size before preprocessing
+        without losing detail the model input could use.
+
+        Args:
+            scale (float): Source pixels per output pixel along each axis
+
+        Returns:
+            tuple[int, int]: Minimum source width and height
+        """
+        out_width, out_height = self.size
+        if self.resize_mode == "center_crop":
+            # Only the central crop_ratio of the shorter side reaches the output
+            scale /= self.crop_ratio
+        return math.ceil(out_width * scale), math.ceil(out_height * scale)
+
+    def preprocess(
+        self, image: "Image.Image", out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Preprocess one image
+
+        Args:
+            image (PIL.Image.Image): The image to preprocess
+            out (np.ndarray, optional): float32 array of shape (1, 3, H, W) or
+                (3, H, W) to write into; a new (1, 3, H, W) array when omitted
+
+        Returns:
+            np.ndarray: The preprocessed image
+        """
+        return self._convert(np.asarray(self.resize(image)), out)
+
+    def preprocess_array(
+        self, pixels: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Preprocess one image given as uint8 RGB pixels in HWC order
+
+        Pixels already at the output size are converted directly, without a
+        round trip through PIL.
+
+        Args:
+            pixels (np.ndarray): uint8 array of shape (H, W, 3)
+            out (np.ndarray, optional): Array to write into, as in `preprocess`
+
+        Returns:
+            np.ndarray: The preprocessed image
+        """
+        if self.resize_mode == "resize" and pixels.shape[1::-1] == self.size:
+            return self._convert(pixels, out)
+        from PIL import Image
+
+        return self.preprocess(Image.fromarray(pixels), out)
+
+    def _convert(self, pixels: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        """Scale and transpose HWC pixels of the output size into NCHW floats"""
+        if out is None:
+            out = np.empty((1, 3, self.size[1], self.size[0]), dtype=np.float32)
+        target = out[0] if out.ndim == 4 else out
+        np.multiply(
+            pixels.transpose(2, 0, 1), self._scale, out=target, dtype=np.float32
+        )
+        if self._offset is not None:
+            np.add(target, self._offset, out=target)
+        return out
+
+    def preprocess_batch(
+        self, images: Sequence["Image.Image"], out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Preprocess several images into one NCHW batch
+
+        Without `out`, the batch is written into a buffer owned by the calling
+        thread and reused by its next call, so consume it before calling again.
+
+        Args:
+            images (Sequence[PIL.Image.Image]): The images to preprocess
+            out (np.ndarray, optional): float32 array of shape (N, 3, H, W)
+
+        Returns:
+            np.ndarray: The preprocessed batch
+        """
+        if out is None:
+            out = self.batch_buffer(len(images))
+        for slot, image in zip(out, images, strict=True):
+            self.preprocess(image, out=slot)
+        return out
+
+    def batch_buffer(self, batch_size: int) -> np.ndarray:
+        """Return the calling thread's reusable buffer for `batch_size` images"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < batch_size:
+            buffer = np.empty(
+                (batch_size, 3, self.size[1], self.size[0]), dtype=np.float32
+            )
+            self._local.buffer = buffer
+        return buffer[:batch_size]
+
+
+@lru_cache()
+def get_preprocessor(size: tuple[int, int]) -> ImagePreprocessor:
+    """Return the shared preprocessor for the configured preprocessing settings"""
+    return ImagePreprocessor(
+        size,
+        resize_mode=settings.PREPROCESS_RESIZE_MODE,
+        normalization=settings.PREPROCESS_NORMALIZATION,
+        crop_ratio=settings.PREPROCESS_CROP_RATIO,
+    )
+
+
+def preprocess_image(image: "Image.Image", size: tuple[int, int]) -> np.ndarray:
     """Preprocess image for classification
 
     Args:
@@ -17,21 +222,169 @@ def preprocess_image(image: Image.Image, size: tuple[int, int]) -> np.ndarray:
     Returns:
         np.ndarray: The preprocessed image
     """
-    # Resize and preprocess image
-    image = image.resize(size)
-    image_array = np.array(image)
-    # Normalize to [0,1] and convert to NCHW format
-    image_array = image_array.transpose(2, 0, 1)
-    image_array = image_array / 255.0
-    image_array = image_array.astype(np.float32)
-    return np.expand_dims(image_array, axis=0)
+    with tracing.stage("preprocess"):
+        return get_preprocessor(size).preprocess(image)
+
+
+def decode_image(
+    contents: bytes, min_size: Optional[tuple[int, int]] = None
+) -> "Image.Image":
+    """Decode uploaded bytes to an RGB PIL Image
 
+    When `min_size` is given, JPEGs are decoded at the smallest DCT scale
+    (1/2, 1/4 or 1/8) that is still at least `min_size`, which skips most of the
+    decoding work for large photos. Other formats are decoded in full and then
+    shrunk by an integer factor with a cheap box filter.
 
-async def validate_image(contents: bytes) -> Image.Image:
+    Args:
+        contents (bytes): The image bytes to decode
+        min_size (tuple[int, int], optional): Smallest width and height the
+            decoded image may be reduced to
+
+    Returns:
+        PIL.Image.Image: The decoded image
+
+    Raises:
+        ValidationError: If the bytes are not a valid image or it has more
+            than UPLOAD_MAX_PIXELS pixels
+    """
+    from PIL import Image
+
+    with tracing.stage("decode", bytes=len(contents)):
+        try:
+            image: Image.Image = Image.open(io.BytesIO(contents))
+            input_width, input_height = image.size
+            if input_width * input_height > settings.UPLOAD_MAX_PIXELS:
+                raise ValidationError(
+                    f"Image too large: {input_width}x{input_height} pixels"
+                )
+            if min_size is not None:
+                image = _decode_reduced(image, min_size)
+            image = image.convert("RGB")
+        except ValidationError:
+            raise
+        except Exception as e:
+            raise ValidationError("Invalid image file") from e
+
+    if tracing.is_enabled():
+        INPUT_BYTES.observe(len(contents))
+        INPUT_WIDTH.observe(input_width)
+        INPUT_HEIGHT.observe(input_height)
+        DECODED_PIXELS.observe(image.width * image.height)
+    return image
+
+
+def _decode_reduced(image: "Image.Image", min_size: tuple[int, int]) -> "Image.Image":
+    """Decode at reduced resolution without going below `min_size`"""
+    if image.format == "JPEG":
+        image.draft("RGB", min_size)
+        image.load()
+        return image
+
+    image.load()
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    if factor < 2:
+        return image
+    if image.mode not in REDUCE_MODES:
+        # Palette indices cannot be averaged, and Image.reduce does not
+        # support 1-bit or 16-bit images either
+        image = image.convert("RGB")
+    return image.reduce(factor)
+
+
+def prepare_input(contents: bytes, preprocessor: ImagePreprocessor) -> np.ndarray:
+    """Decode and preprocess uploaded bytes into a model input
+
+    Runs entirely synchronously so it can be handed to a thread or process pool.
+
+    Args:
+        contents (bytes): The image bytes to decode
+        preprocessor (ImagePreprocessor): Preprocessing of the target model
+
+    Returns:
+        np.ndarray: The preprocessed image
+
+    Raises:
+        ValidationError: If the bytes are not a valid image
+    """
+    image = decode_input(contents, preprocessor)
+    with tracing.stage("preprocess"):
+        return preprocessor.preprocess(image)
+
+
+def decode_input(contents: bytes, preprocessor: ImagePreprocessor) -> "Image.Image":
+    """Decode uploaded bytes no larger than the preprocessor needs
+
+    The decode half of `prepare_input`, for callers that run decoding and
+    preprocessing as separate steps.
+
+    Raises:
+        ValidationError: If the bytes are not a valid image
+    """
+    min_size = (
+        preprocessor.min_source_size(settings.DECODE_DRAFT_SCALE)
+        if settings.DECODE_DRAFT
+        else None
+    )
+    return decode_image(contents, min_size)
+
+
+def prepare_array_input(
+    pixels: np.ndarray, preprocessor: ImagePreprocessor
+) -> np.ndarray:
+    """Preprocess already decoded pixels into a model input
+
+    The counterpart of `prepare_input` for callers that send pixels instead
+    of an encoded image, skipping decoding entirely.
+
+    Args:
+        pixels (np.ndarray): uint8 RGB array of shape (H, W, 3)
+        preprocessor (ImagePreprocessor): Preprocessing of the target model
+
+    Returns:
+        np.ndarray: The preprocessed image
+
+    Raises:
+        ValidationError: If the array is not uint8 (H, W, 3) or has more than
+            UPLOAD_MAX_PIXELS pixels
+    """
+    if (
+        pixels.dtype != np.uint8
+        or pixels.ndim != 3
+        or pixels.shape[2] != 3
+        or min(pixels.shape) < 1
+    ):
+        raise ValidationError("Expected a uint8 array of shape (H, W, 3)")
+    height, width, _ = pixels.shape
+    if width * height > settings.UPLOAD_MAX_PIXELS:
+        raise ValidationError(f"Image too large: {width}x{height} pixels")
+
+    if tracing.is_enabled():
+        INPUT_BYTES.observe(pixels.nbytes)
+        INPUT_WIDTH.observe(width)
+        INPUT_HEIGHT.observe(height)
+    with tracing.stage("preprocess"):
+        if not settings.DECODE_DRAFT:
+            return preprocessor.preprocess_array(pixels)
+        # Shrink large arrays with the cheap box filter first, as decode does
+        min_size = preprocessor.min_source_size(settings.DECODE_DRAFT_SCALE)
+        if width // min_size[0] < 2 or height // min_size[1] < 2:
+            return preprocessor.preprocess_array(pixels)
+        from PIL import Image
+
+        image = _decode_reduced(Image.fromarray(pixels), min_size)
+        return preprocessor.preprocess(image)
+
+
+async def validate_image(
+    contents: bytes, min_size: Optional[tuple[int, int]] = None
+) -> "Image.Image":
     """Validates and converts uploaded bytes to PIL Image
 
     Args:
         contents (bytes): The image bytes to validate
+        min_size (tuple[int, int], optional): Smallest width and height the
+            decoded image may be reduced to, see decode_image
 
     Returns:
         PIL.Image.Image: The validated image
@@ -40,9 +393,8 @@ async def validate_image(contents: bytes) -> Image.Image:
         HTTPException: If the image is invalid
     """
     try:
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
-        return image
-    except Exception as e:
+        return decode_image(contents, min_size)
+    except ValidationError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file"
         ) from e
@@ -0,0 +1,569 @@
+"""Streaming ingest of uploaded images and pixel arrays"""
+
+import io
+import math
+import struct
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+import numpy as np
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+from src.core.exceptions import UploadRejectedError, ValidationError
+from src.core.middleware import UPLOAD_BYTES_TOTAL, UPLOAD_REJECTED_TOTAL
+
+# Bytes needed to recognise any of the supported signatures
+SIGNATURE_BYTES = 12
+
+# JPEG start-of-frame markers, which carry the image size. C4, C8 and CC are
+# other markers in the same range.
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}
+
+ImageHeader = Tuple[str, Optional[int], Optional[int]]
+
+
+def sniff_image_header(data: bytes, complete: bool = False) -> Optional[ImageHeader]:
+    """Format and size of an image from the first bytes of its file
+
+    Supports JPEG, PNG, GIF, BMP and WebP, and recognises TIFF without reading
+    its size. Only the header is parsed, so this is cheap enough to run on
+    every chunk of an upload until it answers.
+
+    Args:
+        data (bytes): The start of the file
+        complete (bool): Whether `data` is the whole file, so a header that
+            is not complete yet is invalid rather than undecided
+
+    Returns:
+        The format, width and height, with None for sizes not in the header,
+        or None if more bytes are needed
+
+    Raises:
+        ValidationError: If the bytes are not one of the supported formats
+    """
+    header = _parse_header(data)
+    if header is None and complete:
+        raise ValidationError("Invalid image file")
+    return header
+
+
+def _parse_header(data: bytes) -> Optional[ImageHeader]:
+    if data[:3] == b"\xff\xd8\xff":
+        return _parse_jpeg(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        if len(data) < 24:
+            return None
+        width, height = struct.unpack(">II", data[16:24])
+        return "PNG", width, height
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        if len(data) < 10:
+            return None
+        width, height = struct.unpack("<HH", data[6:10])
+        return "GIF", width, height
+    if data[:2] == b"BM" and len(data) >= SIGNATURE_BYTES:
+        return _parse_bmp(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _parse_webp(data)
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "TIFF", None, None
+    if len(data) < SIGNATURE_BYTES:
+        return None
+    raise ValidationError("Invalid image file")
+
+
+def _parse_jpeg(data: bytes) -> Optional[ImageHeader]:
+    """Walk the marker segments up to the start of frame"""
+    offset = 2
+    while True:
+        # Markers may be preceded by any number of 0xFF fill bytes
+        while offset < len(data) and data[offset] == 0xFF:
+            offset += 1
+        if offset >= len(data):
+            return None
+        if data[offset - 1] != 0xFF:
+            raise ValidationError("Invalid image file")
+        marker = data[offset]
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 1
+            continue
+        if offset + 3 > len(data):
+            return None
+        (length,) = struct.unpack(">H", data[offset + 1 : offset + 3])
+        if length < 2:
+            raise ValidationError("Invalid image file")
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 8 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 4 : offset + 8])
+            return "JPEG", width, height
+        offset += 1 + length
+
+
+def _parse_bmp(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 26:
+        return None
+    (dib_size,) = struct.unpack("<I", data[14:18])
+    if dib_size == 12:  # OS/2 core header with 16-bit sizes
+        width, height = struct.unpack("<HH", data[18:22])
+    else:
+        width, height = struct.unpack("<ii", data[18:26])
+    return "BMP", abs(width), abs(height)  # Negative height means top-down
+
+
+def _parse_webp(data: bytes) -> Optional[ImageHeader]:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        if len(data) < 30:
+            return None
+        width, height = struct.unpack("<HH", data[26:30])
+        return "WEBP", width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        if len(data) < 25:
+            return None
+        bits = int.from_bytes(data[21:25], "little")
+        return "WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        if len(data) < 30:
+            return None
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return "WEBP", width, height
+    if len(data) < 16:
+        return None
+    raise ValidationError("Invalid image file")
+
+
+class _ImagePart:
+    """Collects one multipart field in memory, checking it as it arrives"""
+
+    def __init__(self, field: str, max_pixels: int) -> None:
+        self.field = field
+        self.max_pixels = max_pixels
+        self.data: Optional[bytearray] = None  # Set once the field starts
+        self.header: Optional[ImageHeader] = None
+        self.complete = False
+        self._in_field = False
+        self._header_field = b""
+        self._disposition = b""
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field = data[start:end].lower()
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        if self._header_field == b"content-disposition":
+            self._disposition += data[start:end]
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("latin-1")
+        # Only the first field with the name is used, like FastAPI's Form parsing
+        self._in_field = name == self.field and self.data is None
+        if self._in_field:
+            self.data = bytearray()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_field and self.data is not None:
+            self.data += data[start:end]
+
+    def on_part_end(self) -> None:
+        if self._in_field:
+            self._in_field = False
+            self.complete = True
+
+    def check(self) -> None:
+        """Sniff the image header once enough of the field has arrived
+
+        Raises:
+            UploadRejectedError: If the field is not an image or too large
+        """
+        if self.data is None or self.header is not None:
+            return
+        try:
+            self.header = sniff_image_header(self.data, complete=self.complete)
+        except ValidationError as e:
+            raise UploadRejectedError(e.message, reason="not_an_image") from e
+        if self.header is None:
+            return
+        _, width, height = self.header
+        if width is not None and height is not None:
+            _check_pixels(width, height, self.max_pixels)
+
+
+async def read_upload(
+    request: Request, field: str, max_bytes: int, max_pixels: int
+) -> Union[bytes, np.ndarray, None]:
+    """Read an uploaded image as it streams in, in any supported input mode
+
+    The input mode follows the request headers:
+
+    - multipart/form-data: an encoded image in the form field `field`
+    - image/* or application/octet-stream: an encoded image as the raw body
+    - application/x-npy: a uint8 (H, W, 3) RGB array in .npy format
+    - an X-Image-Shape: H,W,3 header: uint8 RGB pixels in HWC order as the
+      raw body, whatever the Content-Type
+
+    Unlike FastAPI's UploadFile, the body is parsed while it is received and
+    kept in memory rather than spooled to a temporary file. Requests are
+    rejected as soon as the body exceeds `max_bytes`, or the image or array
+    header shows a non-image or more than `max_pixels` pixels, without
+    reading the rest.
+
+    Args:
+        request (Request): The request to read
+        field (str): Name of the form field with the image
+        max_bytes (int): Max request body size in bytes
+        max_pixels (int): Max width x height the image may have
+
+    Returns:
+        The encoded image bytes, a uint8 HWC array for the tensor modes, or
+        None if the request has no image
+
+    Raises:
+        UploadRejectedError: If the upload is refused
+    """
+    try:
+        return await _read_upload(request, field, max_bytes, max_pixels)
+    except UploadRejectedError as e:
+        UPLOAD_REJECTED_TOTAL.labels(e.reason).inc()
+        raise
+
+
+class _FileParts:
+    """Collects every file of one multipart field, capping the size of each"""
+
+    def __init__(self, field: str, max_file_bytes: int, max_files: int) -> None:
+        self.field = field
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.files: List[Tuple[str, bytearray]] = []
+        self.complete = True
+        self._in_field = False
+        self._header_field = b""
+        self._disposition = b""
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field = data[start:end].lower()
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        if self._header_field == b"content-disposition":
+            self._disposition += data[start:end]
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._in_field = options.get(b"name", b"").decode("latin-1") == self.field
+        if not self._in_field:
+            return
+        if len(self.files) >= self.max_files:
+            raise UploadRejectedError(
+                f"Too many files, the limit is {self.max_files}",
+                reason="too_many_files",
+                status_code=413,
+            )
+        filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        self.files.append((filename, bytearray()))
+        self.complete = False
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_field:
+            return
+        contents = self.files[-1][1]
+        contents += data[start:end]
+        if len(contents) > self.max_file_bytes:
+            raise _too_large(self.max_file_bytes)
+
+    def on_part_end(self) -> None:
+        if self._in_field:
+            self._in_field = False
+            self.complete = True
+
+
+async def read_files(
+    request: Request, field: str, max_file_bytes: int, max_bytes: int, max_files: int
+) -> List[Tuple[str, bytes]]:
+    """Read the files of a multipart form field as the body streams in
+
+    The streaming counterpart of a FastAPI `List[UploadFile]` parameter for
+    batch uploads. The files are not checked to be images, so that each can
+    fail on its own, but the request is rejected as soon as one of them
+    exceeds `max_file_bytes`, the body exceeds `max_bytes` or the field has
+    more than `max_files` files.
+
+    Args:
+        request (Request): The request to read
+        field (str): Name of the form field with the files
+        max_file_bytes (int): Max size of each file in bytes
+        max_bytes (int): Max request body size in bytes
+        max_files (int): Max number of files
+
+    Returns:
+        The filename, empty if not given, and contents of each file in order
+
+    Raises:
+        UploadRejectedError: If the upload is refused
+    """
+    try:
+        return await _read_files(request, field, max_file_bytes, max_bytes, max_files)
+    except UploadRejectedError as e:
+        UPLOAD_REJECTED_TOTAL.labels(e.reason).inc()
+        raise
+
+
+async def _read_files(
+    request: Request, field: str, max_file_bytes: int, max_bytes: int, max_files: int
+) -> List[Tuple[str, bytes]]:
+    content_type, options = parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    if content_type != b"multipart/form-data":
+        raise UploadRejectedError(
+            "Expected a multipart/form-data body",
+            reason="unsupported_media_type",
+            status_code=415,
+        )
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise UploadRejectedError("Missing multipart boundary", reason="malformed")
+
+    parts = _FileParts(field, max_file_bytes, max_files)
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": parts.on_part_begin,
+            "on_header_field": parts.on_header_field,
+            "on_header_value": parts.on_header_value,
+            "on_headers_finished": parts.on_headers_finished,
+            "on_part_data": parts.on_part_data,
+            "on_part_end": parts.on_part_end,
+        },
+    )
+    async for chunk in _stream(request, max_bytes):
+        try:
+            parser.write(chunk)
+        except UploadRejectedError:
+            raise
+        except Exception as e:
+            raise UploadRejectedError(
+                "Malformed multipart body", reason="malformed"
+            ) from e
+
+    if not parts.complete:
+        raise UploadRejectedError("Incomplete multipart body", reason="malformed")
+    return [(filename, bytes(contents)) for filename, contents in parts.files]
+
+
+async def _read_upload(
+    request: Request, field: str, max_bytes: int, max_pixels: int
+) -> Union[bytes, np.ndarray, None]:
+    content_type, options = parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    shape = request.headers.get("x-image-shape")
+    if shape is not None:
+        return await _read_pixels(request, shape, max_bytes, max_pixels)
+    if content_type == b"multipart/form-data":
+        return await _read_multipart(
+            request, options.get(b"boundary"), field, max_bytes, max_pixels
+        )
+    if content_type == b"application/x-npy":
+        return await _read_npy(request, max_bytes, max_pixels)
+    if content_type == b"application/octet-stream" or content_type.startswith(
+        b"image/"
+    ):
+        return await _read_raw(request, max_bytes, max_pixels)
+    if content_type:
+        raise UploadRejectedError(
+            f"Unsupported Content-Type: {content_type.decode('latin-1')}",
+            reason="unsupported_media_type",
+            status_code=415,
+        )
+    UPLOAD_REJECTED_TOTAL.labels("missing_file").inc()
+    return None
+
+
+async def _stream(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    """The request body in chunks, cut off once it exceeds `max_bytes`"""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise _too_large(max_bytes)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        UPLOAD_BYTES_TOTAL.inc(len(chunk))
+        if received > max_bytes:
+            raise _too_large(max_bytes)
+        yield chunk
+
+
+async def _read_multipart(
+    request: Request,
+    boundary: Optional[bytes],
+    field: str,
+    max_bytes: int,
+    max_pixels: int,
+) -> Optional[bytes]:
+    if not boundary:
+        raise UploadRejectedError("Missing multipart boundary", reason="malformed")
+
+    part = _ImagePart(field, max_pixels)
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": part.on_part_begin,
+            "on_header_field": part.on_header_field,
+            "on_header_value": part.on_header_value,
+            "on_headers_finished": part.on_headers_finished,
+            "on_part_data": part.on_part_data,
+            "on_part_end": part.on_part_end,
+        },
+    )
+    async for chunk in _stream(request, max_bytes):
+        try:
+            parser.write(chunk)
+        except Exception as e:
+            raise UploadRejectedError(
+                "Malformed multipart body", reason="malformed"
+            ) from e
+        part.check()
+        if part.complete:
+            break  # The rest of the body is not needed
+
+    if part.data is None:
+        UPLOAD_REJECTED_TOTAL.labels("missing_file").inc()
+        return None
+    if not part.complete:
+        raise UploadRejectedError("Incomplete multipart body", reason="malformed")
+    return bytes(part.data)
+
+
+async def _read_raw(request: Request, max_bytes: int, max_pixels: int) -> bytes:
+    """An encoded image sent as the whole request body"""
+    part = _ImagePart("", max_pixels)
+    part.data = bytearray()
+    async for chunk in _stream(request, max_bytes):
+        part.data += chunk
+        part.check()
+    part.complete = True
+    part.check()
+    return bytes(part.data)
+
+
+async def _read_pixels(
+    request: Request, shape_header: str, max_bytes: int, max_pixels: int
+) -> np.ndarray:
+    """Raw uint8 HWC pixels, whose shape is known before the body is read"""
+    try:
+        shape = tuple(int(size) for size in shape_header.split(","))
+    except ValueError:
+        shape = ()
+    if len(shape) != 3 or shape[2] != 3 or min(shape) < 1:
+        raise _invalid_tensor("X-Image-Shape must be height,width,3")
+    height, width, _ = shape
+    _check_pixels(width, height, max_pixels)
+
+    expected = height * width * 3
+    if expected > max_bytes:
+        raise _too_large(max_bytes)
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) != expected:
+        raise _invalid_tensor(f"Expected {expected:,} bytes of pixels")
+
+    # Filled in place, so the array below is a view of the received bytes
+    buffer = bytearray(expected)
+    view = memoryview(buffer)
+    received = 0
+    async for chunk in _stream(request, max_bytes):
+        if received + len(chunk) > expected:
+            raise _invalid_tensor(f"Expected {expected:,} bytes of pixels")
+        view[received : received + len(chunk)] = chunk
+        received += len(chunk)
+    if received != expected:
+        raise _invalid_tensor(f"Expected {expected:,} bytes of pixels")
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+
+
+async def _read_npy(request: Request, max_bytes: int, max_pixels: int) -> np.ndarray:
+    """A .npy array, rejected from its header before the data is read"""
+    body = bytearray()
+    offset: Optional[int] = None
+    shape: tuple = ()
+    async for chunk in _stream(request, max_bytes):
+        body += chunk
+        if offset is None:
+            header = _parse_npy_header(body)
+            if header is not None:
+                shape, offset = header
+                _check_pixels(shape[1], shape[0], max_pixels)
+    if offset is None:
+        raise _invalid_tensor("Truncated .npy header")
+    if len(body) - offset != math.prod(shape):
+        raise _invalid_tensor("The .npy data does not match its shape")
+    return np.frombuffer(body, dtype=np.uint8, offset=offset).reshape(shape)
+
+
+def _parse_npy_header(data: bytearray) -> Optional[tuple[tuple, int]]:
+    """Shape and data offset of a .npy file, or None if more bytes are needed"""
+    if len(data) < 10:
+        return None
+    if data[:6] != b"\x93NUMPY":
+        raise _invalid_tensor("Not a .npy file")
+    major = data[6]
+    if major == 1:
+        (header_length,) = struct.unpack("<H", data[8:10])
+        offset = 10 + header_length
+    elif len(data) < 12:
+        return None
+    else:
+        (header_length,) = struct.unpack("<I", data[8:12])
+        offset = 12 + header_length
+    if len(data) < offset:
+        return None
+
+    stream = io.BytesIO(bytes(data[:offset]))
+    try:
+        version = np.lib.format.read_magic(stream)
+        read_header = (
+            np.lib.format.read_array_header_1_0
+            if version == (1, 0)
+            else np.lib.format.read_array_header_2_0
+        )
+        shape, fortran_order, dtype = read_header(stream)
+    except ValueError as e:
+        raise _invalid_tensor("Invalid .npy header") from e
+    if (
+        dtype != np.uint8
+        or fortran_order
+        or len(shape) != 3
+        or shape[2] != 3
+        or min(shape) < 1
+    ):
+        raise _invalid_tensor("Expected a C-ordered uint8 array of shape (H, W, 3)")
+    return shape, offset
+
+
+def _check_pixels(width: int, height: int, max_pixels: int) -> None:
+    if width * height > max_pixels:
+        raise UploadRejectedError(
+            f"Image too large: {width}x{height} pixels, the limit is "
+            f"{max_pixels:,}",
+            reason="too_many_pixels",
+        )
+
+
+def _invalid_tensor(message: str) -> UploadRejectedError:
+    return UploadRejectedError(message, reason="invalid_tensor")
+
+
+def _too_large(max_bytes: int) -> UploadRejectedError:
+    return UploadRejectedError(
+        f"Upload too large, the limit is {max_bytes:,} bytes",
+        reason="too_large",
+        status_code=413,
+    )
@@ -42,3 +42,36 @@ def test_image_bytes(test_image):
     img_byte_arr = io.BytesIO()
     test_image.save(img_byte_arr, format="PNG")
     return img_byte_arr.getvalue()
+
+
+@pytest.fixture(scope="session")
+def large_model(tmp_path_factory):
+    """A model with 1000 classes and about 38 MB of weights, in a Gemm layer"""
+    pytest.importorskip("onnx")
+    import numpy as np
+    from onnx import TensorProto, helper, numpy_helper
+
+    # Average-pool 224x224 inputs 4x4 and classify the 3x56x56 features
+    features = 3 * 56 * 56
+    weights = np.random.default_rng(0).standard_normal((features, 1000))
+    graph = helper.make_graph(
+        [
+            helper.make_node(
+                "AveragePool", ["data"], ["pooled"], kernel_shape=[4, 4], strides=[4, 4]
+            ),
+            helper.make_node("Flatten", ["pooled"], ["features"]),
+            helper.make_node("Gemm", ["features", "W", "B"], ["logits"]),
+        ],
+        "large",
+        [helper.make_tensor_value_info("data", TensorProto.FLOAT, ["N", 3, 224, 224])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["N", 1000])],
+        [
+            numpy_helper.from_array((weights * 0.01).astype(np.float32), "W"),
+            numpy_helper.from_array(np.zeros(1000, dtype=np.float32), "B"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8  # onnx writes newer versions than onnxruntime 1.20 reads
+    path = tmp_path_factory.mktemp("models") / "large.onnx"
+    path.write_bytes(model.SerializeToString())
+    return path
@@ -0,0 +1,159 @@
+"""Integration tests for the API client used by the UI"""
+
+import gzip
+import io
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from PIL import Image
+
+from src.api.main import create_app
+from src.core.config import settings
+from src.core.exceptions import APIConnectionError
+from src.services.api import APIService
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards to the in-process app and records the requests sent"""
+
+    def __init__(self, app: FastAPI):
+        self.transport = httpx.ASGITransport(app=app)
+        self.requests: list[httpx.Request] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return await self.transport.handle_async_request(request)
+
+
+@pytest.fixture
+def transport():
+    return RecordingTransport(create_app())
+
+
+@pytest.fixture
+def api_service(transport):
+    service = APIService(base_url="http://testserver", transport=transport)
+    yield service
+    service.close()
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_predict_and_model_info(api_service, test_image_bytes):
+    """Test the client talks to the app through one pooled client"""
+    info = await api_service.get_model_info()
+    response = await api_service.predict(test_image_bytes)
+
+    assert info.name == "SqueezeNet 1.1"
+    assert len(response.predictions) > 0
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_predict_many_keeps_order(api_service, transport, test_image_bytes):
+    """Test concurrent uploads return one result per image, in order"""
+    results = await api_service.predict_many(
+        [test_image_bytes, b"not an image", test_image_bytes], max_concurrency=2
+    )
+
+    assert len(transport.requests) == 3
+    assert len(results[0].predictions) > 0
+    assert isinstance(results[1], APIConnectionError)
+    assert results[0] == results[2]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_large_uncompressed_upload_is_gzipped(
+    api_service, transport, monkeypatch
+):
+    """Test large uploads in uncompressed formats are gzipped and accepted"""
+    monkeypatch.setattr(settings, "API_COMPRESS_MIN_BYTES", 1024)
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), color="blue").save(buffer, format="BMP")
+
+    response = await api_service.predict(buffer.getvalue())
+
+    request = transport.requests[-1]
+    assert request.headers["Content-Encoding"] == "gzip"
+    assert len(request.content) < len(buffer.getvalue()) / 10
+    assert len(response.predictions) > 0
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_retries_overloaded_responses(monkeypatch):
+    """Test 503 responses are retried and a later success is returned"""
+    monkeypatch.setattr(settings, "API_RETRY_BACKOFF_SECONDS", 0.001)
+    attempts = []
+    app = FastAPI()
+
+    @app.get(f"{settings.API_V1_STR}/model-info")
+    async def flaky(request: Request) -> Response:
+        attempts.append(request)
+        if len(attempts) < 3:
+            return Response(status_code=503, headers={"Retry-After": "0"})
+        return Response(
+            '{"name": "m", "description": "", "input_shape": [], "output_shape": []}',
+            media_type="application/json",
+        )
+
+    service = APIService(
+        base_url="http://testserver",
+        max_retries=2,
+        transport=httpx.ASGITransport(app=app),
+    )
+    try:
+        info = await service.get_model_info()
+    finally:
+        service.close()
+
+    assert info.name == "m"
+    assert len(attempts) == 3
+
+
+@pytest.mark.integration
+def test_backoff_waits_at_least_retry_after(monkeypatch):
+    """Test Retry-After is the minimum wait, with the jitter added on top"""
+    monkeypatch.setattr(settings, "API_RETRY_BACKOFF_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "API_RETRY_MAX_WAIT_SECONDS", 5)
+
+    def backoff(retry_after: str) -> float:
+        response = httpx.Response(503, headers={"Retry-After": retry_after})
+        return APIService._backoff(1, response)
+
+    delays = [backoff("2") for _ in range(50)]
+    assert all(2 <= delay <= 3 for delay in delays)
+    assert len(set(delays)) > 1
+    assert all(5 <= backoff("60") <= 6 for _ in range(50))
+    assert all(0 <= APIService._backoff(1) <= 1 for _ in range(50))
+
+
+@pytest.mark.integration
+def test_compressed_request_limits(test_client, test_image_bytes):
+    """Test invalid and oversized compressed bodies are rejected"""
+    response = test_client.post(
+        "/api/v1/predict",
+        content=b"not gzip",
+        headers={"Content-Encoding": "gzip", "Content-Type": "image/png"},
+    )
+    assert response.status_code == 400
+
+    # The body is decompressed as it is read, so the upload checks see it
+    # before it has been decompressed in full
+    response = test_client.post(
+        "/api/v1/predict",
+        content=gzip.compress(b"\0" * settings.REQUEST_MAX_DECOMPRESSED_BYTES),
+        headers={"Content-Encoding": "gzip", "Content-Type": "image/png"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid image file"
+
+    bomb = test_image_bytes + b"\0" * settings.REQUEST_MAX_DECOMPRESSED_BYTES
+    response = test_client.post(
+        "/api/v1/predict",
+        content=gzip.compress(bomb),
+        headers={"Content-Encoding": "gzip", "Content-Type": "image/png"},
+    )
+    assert response.status_code == 413
@@ -13,6 +13,36 @@ def test_health_check(test_client):
     assert response.json() == {"status": "OK"}
 
 
+@pytest.mark.integration
+def test_ready_after_warm_up(test_client):
+    """Test /ready answers 503 until the lifespan warm-up finished, then 200"""
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from src.api.main import create_app
+    from src.services.inference import get_readiness
+
+    get_readiness.cache_clear()
+    try:
+        # The session client does not run the lifespan, so nothing warms up
+        response = test_client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "starting"
+
+        with TestClient(create_app()) as client:
+            deadline = time.monotonic() + 30
+            while (response := client.get("/ready")).status_code != 200:
+                assert time.monotonic() < deadline, response.json()
+                time.sleep(0.05)
+            assert client.get("/health").status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert data["startup_seconds"]["total"] > 0
+    finally:
+        get_readiness.cache_clear()
+
+
 @pytest.mark.integration
 def test_model_info(test_client):
     """Test model info endpoint"""
@@ -60,3 +90,455 @@ def test_predict_no_file(test_client):
     response = test_client.post("/api/v1/predict")
     assert response.status_code == 422
     assert "detail" in response.json()
+
+
+@pytest.mark.integration
+def test_predict_overloaded(test_client, test_image_bytes, monkeypatch):
+    """Test prediction is rejected with 503 when the inference queue is full"""
+    from src.services.inference import get_executor
+
+    # Cache hits are served without a worker slot, so bypass the cache
+    monkeypatch.setattr("src.api.endpoints.get_prediction_cache", lambda: None)
+    executor = get_executor()
+    monkeypatch.setattr(executor, "max_workers", 0)
+    monkeypatch.setattr(executor, "max_queue_size", 0)
+
+    response = test_client.post(
+        "/api/v1/predict", files={"file": ("test.png", test_image_bytes, "image/png")}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.integration
+def test_predict_with_process_pool(test_client, monkeypatch):
+    """Test a prediction completes with decoding in a process pool"""
+    from pathlib import Path
+
+    from src.services.executor import InferenceExecutor
+
+    executor = InferenceExecutor(max_workers=1, max_queue_size=1, use_processes=True)
+    monkeypatch.setattr("src.api.endpoints.get_executor", lambda: executor)
+    monkeypatch.setattr("src.api.endpoints.get_prediction_cache", lambda: None)
+    contents = (Path(__file__).parent.parent.parent / "images/lemon.jpg").read_bytes()
+    try:
+        response = test_client.post(
+            "/api/v1/predict", files={"file": ("lemon.jpg", contents, "image/jpeg")}
+        )
+    finally:
+        executor.shutdown()
+
+    assert response.status_code == 200
+    assert len(response.json()["predictions"]) > 0
+
+
+@pytest.mark.integration
+def test_predict_batch(test_client, test_image_bytes):
+    """Test batch prediction with valid, invalid and archived images"""
+    import io
+    import zipfile
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.png", test_image_bytes)
+        zf.writestr("b.png", test_image_bytes)
+
+    response = test_client.post(
+        "/api/v1/predict/batch",
+        files=[
+            ("files", ("one.png", test_image_bytes, "image/png")),
+            ("files", ("bad.txt", b"invalid image data", "text/plain")),
+            ("files", ("gallery.zip", archive.getvalue(), "application/zip")),
+        ],
+    )
+    assert response.status_code == 200
+
+    results = {item["filename"]: item for item in response.json()["results"]}
+    assert set(results) == {
+        "one.png",
+        "bad.txt",
+        "gallery.zip/a.png",
+        "gallery.zip/b.png",
+    }
+    assert results["bad.txt"]["error"] == "Invalid image file"
+    assert results["bad.txt"]["predictions"] == []
+    for name in ("one.png", "gallery.zip/a.png", "gallery.zip/b.png"):
+        assert results[name]["error"] is None
+        assert len(results[name]["predictions"]) > 0
+
+
+@pytest.mark.integration
+def test_predict_batch_keeps_upload_order(test_client, test_image_bytes, monkeypatch):
+    """Test archives that fail to extract are reported in their upload place"""
+    import io
+    import zipfile
+
+    from src.core.config import settings
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("large.png", b"\0" * 1000)
+    monkeypatch.setattr(settings, "BATCH_MAX_ARCHIVE_BYTES", 100)
+
+    response = test_client.post(
+        "/api/v1/predict/batch",
+        files=[
+            ("files", ("one.png", test_image_bytes, "image/png")),
+            ("files", ("large.zip", archive.getvalue(), "application/zip")),
+            ("files", ("two.png", test_image_bytes, "image/png")),
+        ],
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["filename"] for item in results] == ["one.png", "large.zip", "two.png"]
+    assert "Archive expands" in results[1]["error"]
+    assert results[2]["error"] is None
+
+
+@pytest.mark.integration
+def test_predict_batch_limits_upload_size(test_client, test_image_bytes, monkeypatch):
+    """Test batch files over UPLOAD_MAX_BYTES and bodies over the batch limit get 413"""
+    from src.core.config import settings
+
+    files = [
+        ("files", ("one.png", test_image_bytes, "image/png")),
+        ("files", ("two.png", test_image_bytes, "image/png")),
+    ]
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", len(test_image_bytes) - 1)
+    before = _upload_metric("rejected_total", {"reason": "too_large"})
+    response = test_client.post("/api/v1/predict/batch", files=files)
+    assert response.status_code == 413
+    assert _upload_metric("rejected_total", {"reason": "too_large"}) == before + 1
+
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", len(test_image_bytes))
+    monkeypatch.setattr(settings, "BATCH_UPLOAD_MAX_BYTES", len(test_image_bytes) * 2)
+    response = test_client.post("/api/v1/predict/batch", files=files)
+    assert response.status_code == 413
+
+    monkeypatch.setattr(settings, "BATCH_UPLOAD_MAX_BYTES", len(test_image_bytes) * 3)
+    monkeypatch.setattr(settings, "BATCH_MAX_FILES", 1)
+    response = test_client.post("/api/v1/predict/batch", files=files)
+    assert response.status_code == 413
+
+
+@pytest.mark.integration
+def test_predict_batch_admits_each_image(test_client, test_image_bytes, monkeypatch):
+    """Test a batch is rejected when the executor has no slot for every image"""
+    import asyncio
+
+    from src.services.executor import InferenceExecutor
+
+    executor = InferenceExecutor(max_workers=1, max_queue_size=1)
+    monkeypatch.setattr("src.api.endpoints.get_executor", lambda: executor)
+    monkeypatch.setattr("src.api.endpoints.get_prediction_cache", lambda: None)
+    files = [("files", (f"{i}.png", test_image_bytes, "image/png")) for i in range(2)]
+
+    async def busy():
+        async with executor.admit():
+            return test_client.post("/api/v1/predict/batch", files=files)
+
+    try:
+        assert test_client.post("/api/v1/predict/batch", files=files).status_code == 200
+        assert asyncio.run(busy()).status_code == 503
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.integration
+def test_predict_top_k(test_client, test_image_bytes):
+    """Test the number of predictions follows the k query parameter"""
+    response = test_client.post(
+        "/api/v1/predict?k=3",
+        files={"file": ("test.png", test_image_bytes, "image/png")},
+    )
+    assert response.status_code == 200
+    assert len(response.json()["predictions"]) == 3
+
+    response = test_client.post(
+        "/api/v1/predict?k=0",
+        files={"file": ("test.png", test_image_bytes, "image/png")},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.integration
+def test_list_models(test_client):
+    """Test the model list includes the default model"""
+    response = test_client.get("/api/v1/models")
+    assert response.status_code == 200
+    models = {model["name"]: model for model in response.json()["models"]}
+    assert models["squeezenet"]["is_default"]
+    assert models["squeezenet"]["display_name"] == "SqueezeNet 1.1"
+
+
+@pytest.mark.integration
+def test_predict_unknown_model(test_client, test_image_bytes):
+    """Test requesting an unknown model returns 404"""
+    response = test_client.post(
+        "/api/v1/predict?model=missing",
+        files={"file": ("test.png", test_image_bytes, "image/png")},
+    )
+    assert response.status_code == 404
+    assert "missing" in response.json()["detail"]
+
+
+@pytest.mark.integration
+def test_reload_model_requires_admin_token(test_client, monkeypatch):
+    """Test reloads are disabled without ADMIN_TOKEN and need the right token"""
+    from src.core.config import settings
+
+    assert test_client.post("/api/v1/models/squeezenet/reload").status_code == 403
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    response = test_client.post(
+        "/api/v1/models/squeezenet/reload", headers={"X-Admin-Token": "wrong"}
+    )
+    assert response.status_code == 401
+
+    response = test_client.post(
+        "/api/v1/models/squeezenet/reload", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert response.json()["name"] == "squeezenet"
+
+
+@pytest.mark.integration
+def test_reload_model_uses_server_config(test_client, monkeypatch, tmp_path):
+    """Test only configured models reload, and a failed load is a JSON 503"""
+    from src.core.config import settings
+    from src.services.inference import get_registry
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+
+    # A client-supplied configuration is ignored, unknown names stay unknown
+    response = test_client.post(
+        "/api/v1/models/evil/reload",
+        headers=headers,
+        json={"display_name": "x", "model_path": "/x", "labels_path": "/etc/passwd"},
+    )
+    assert response.status_code == 404
+    assert "evil" not in get_registry().configs
+
+    registry = get_registry()
+    broken = registry.configs["squeezenet"].model_copy(
+        update={"model_path": tmp_path / "missing.onnx"}
+    )
+    monkeypatch.setitem(registry.configs, "squeezenet", broken)
+    response = test_client.post("/api/v1/models/squeezenet/reload", headers=headers)
+    assert response.status_code == 503
+    assert "detail" in response.json()
+
+
+def _upload_metric(name, labels=None):
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(f"image_classifier_upload_{name}", labels) or 0
+
+
+@pytest.mark.integration
+def test_predict_rejects_large_body(test_client, test_image_bytes, monkeypatch):
+    """Test bodies over UPLOAD_MAX_BYTES are rejected with 413"""
+    from src.core.config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 1000)
+    before = _upload_metric("rejected_total", {"reason": "too_large"})
+
+    response = test_client.post(
+        "/api/v1/predict",
+        files={"file": ("test.png", test_image_bytes + b"\0" * 2000, "image/png")},
+    )
+    assert response.status_code == 413
+    assert _upload_metric("rejected_total", {"reason": "too_large"}) == before + 1
+
+
+@pytest.mark.integration
+def test_predict_rejects_decompression_bomb(test_client):
+    """Test images declaring too many pixels are rejected from their header"""
+    import struct
+    import zlib
+
+    # A valid PNG header claiming 100000x100000 pixels, with no pixel data
+    ihdr = struct.pack(">IIBBBBB", 100_000, 100_000, 8, 2, 0, 0, 0)
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + b"IHDR"
+        + ihdr
+        + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    )
+    before = _upload_metric("rejected_total", {"reason": "too_many_pixels"})
+
+    response = test_client.post(
+        "/api/v1/predict", files={"file": ("bomb.png", png, "image/png")}
+    )
+    assert response.status_code == 400
+    assert "Image too large" in response.json()["detail"]
+    assert _upload_metric("rejected_total", {"reason": "too_many_pixels"}) == (
+        before + 1
+    )
+
+
+@pytest.mark.integration
+def test_predict_counts_upload_bytes(test_client, test_image_bytes):
+    """Test the bytes read by the upload ingest are counted"""
+    before = _upload_metric("bytes_total")
+    response = test_client.post(
+        "/api/v1/predict", files={"file": ("test.png", test_image_bytes, "image/png")}
+    )
+    assert response.status_code == 200
+    assert _upload_metric("bytes_total") - before > len(test_image_bytes)
+
+
+@pytest.mark.integration
+def test_predict_openapi_describes_upload(test_client):
+    """Test the OpenAPI schema still documents the multipart file field"""
+    schema = test_client.get("/api/v1/openapi.json").json()
+    body = schema["paths"]["/api/v1/predict"]["post"]["requestBody"]
+    form = body["content"]["multipart/form-data"]["schema"]
+    assert form["required"] == ["file"]
+    assert form["properties"]["file"]["format"] == "binary"
+
+
+def _top_class(response):
+    assert response.status_code == 200, response.text
+    return response.json()["predictions"][0]["class_name"]
+
+
+@pytest.mark.integration
+def test_predict_input_modes(test_client, test_image, test_image_bytes):
+    """Test raw bodies, .npy arrays and raw pixels predict like multipart"""
+    import io
+
+    import numpy as np
+
+    pixels = np.asarray(test_image)
+    npy = io.BytesIO()
+    np.save(npy, pixels)
+
+    expected = _top_class(
+        test_client.post(
+            "/api/v1/predict", files={"file": ("test.png", test_image_bytes)}
+        )
+    )
+    requests = [
+        (test_image_bytes, {"Content-Type": "application/octet-stream"}),
+        (test_image_bytes, {"Content-Type": "image/png"}),
+        (npy.getvalue(), {"Content-Type": "application/x-npy"}),
+        (
+            pixels.tobytes(),
+            {"Content-Type": "application/octet-stream", "X-Image-Shape": "224,224,3"},
+        ),
+    ]
+    for body, headers in requests:
+        response = test_client.post("/api/v1/predict", content=body, headers=headers)
+        assert _top_class(response) == expected
+
+
+@pytest.mark.integration
+def test_predict_with_pipeline(test_client, test_image, test_image_bytes, monkeypatch):
+    """Test the staged pipeline predicts like the executor and batcher"""
+    import numpy as np
+
+    from src.core.config import settings
+    from src.services.registry import ModelRegistry
+
+    monkeypatch.setattr("src.api.endpoints.get_prediction_cache", lambda: None)
+    expected = test_client.post(
+        "/api/v1/predict", files={"file": ("test.png", test_image_bytes)}
+    ).json()
+
+    monkeypatch.setattr(settings, "PIPELINE_ENABLED", True)
+    registry = ModelRegistry(settings.model_configs(), default=settings.DEFAULT_MODEL)
+    monkeypatch.setattr("src.api.endpoints.get_registry", lambda: registry)
+    try:
+        assert registry.get().pipeline is not None
+        response = test_client.post(
+            "/api/v1/predict", files={"file": ("test.png", test_image_bytes)}
+        )
+        assert response.json() == expected
+        pixels = np.asarray(test_image)
+        response = test_client.post(
+            "/api/v1/predict",
+            content=pixels.tobytes(),
+            headers={"X-Image-Shape": "224,224,3"},
+        )
+        assert _top_class(response) == expected["predictions"][0]["class_name"]
+        response = test_client.post(
+            "/api/v1/predict", files={"file": ("bad.txt", b"invalid image data")}
+        )
+        assert response.status_code == 400
+    finally:
+        registry.close()
+
+
+@pytest.mark.integration
+def test_predict_rejects_bad_tensors(test_client):
+    """Test malformed tensor bodies and unknown content types are rejected"""
+    import io
+
+    import numpy as np
+
+    npy = io.BytesIO()
+    np.save(npy, np.zeros((8, 8), dtype=np.float32))
+    response = test_client.post(
+        "/api/v1/predict",
+        content=npy.getvalue(),
+        headers={"Content-Type": "application/x-npy"},
+    )
+    assert response.status_code == 400
+
+    for shape in [(0, 5, 3), (5, 0, 3)]:
+        npy = io.BytesIO()
+        np.save(npy, np.zeros(shape, dtype=np.uint8))
+        response = test_client.post(
+            "/api/v1/predict",
+            content=npy.getvalue(),
+            headers={"Content-Type": "application/x-npy"},
+        )
+        assert response.status_code == 400
+
+    response = test_client.post(
+        "/api/v1/predict",
+        content=b"\0" * 10,
+        headers={"X-Image-Shape": "2,2,3"},
+    )
+    assert response.status_code == 400
+    assert "Expected 12 bytes" in response.json()["detail"]
+
+    response = test_client.post(
+        "/api/v1/predict", content=b"{}", headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.integration
+def test_predict_compact_format(test_client, test_image_bytes):
+    """Test the compact format returns parallel labels and scores arrays"""
+    response = test_client.post(
+        "/api/v1/predict?k=3&format=compact",
+        files={"file": ("test.png", test_image_bytes, "image/png")},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"labels", "scores"}
+    assert len(body["labels"]) == len(body["scores"]) == 3
+
+    response = test_client.post(
+        "/api/v1/predict/batch?k=3&format=compact",
+        files=[("files", ("one.png", test_image_bytes, "image/png"))],
+    )
+    assert response.status_code == 200
+    (item,) = response.json()["results"]
+    assert item["filename"] == "one.png" and len(item["labels"]) == 3
+
+
+@pytest.mark.integration
+def test_predict_not_acceptable(test_client, test_image_bytes):
+    """Test unsupported Accept headers are refused with 406"""
+    response = test_client.post(
+        "/api/v1/predict",
+        files={"file": ("test.png", test_image_bytes, "image/png")},
+        headers={"Accept": "text/html"},
+    )
+    assert response.status_code == 406
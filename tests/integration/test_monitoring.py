@@ -29,3 +29,32 @@ def test_metrics_after_prediction(test_client, test_image_bytes):
     # Verify prediction counters
     assert 'image_classifier_predictions_total{status="200"}' in metrics_text
     assert "image_classifier_prediction_seconds_count" in metrics_text
+
+
+@pytest.mark.integration
+def test_cache_metrics_after_repeated_prediction(test_client, test_image_bytes):
+    """Test repeated uploads are served from the prediction cache"""
+    for _ in range(2):
+        test_client.post(
+            "/api/v1/predict",
+            files={"file": ("test.png", test_image_bytes, "image/png")},
+        )
+
+    response = test_client.get("/metrics")
+    assert 'image_classifier_cache_hits_total{backend="memory"}' in response.text
+
+
+@pytest.mark.integration
+def test_stage_metrics_after_prediction(test_client, test_image_bytes):
+    """Test each stage of an uncached prediction is timed"""
+    test_client.post(
+        "/api/v1/predict?k=3",
+        files={"file": ("stages.png", test_image_bytes + b"stages", "image/png")},
+    )
+
+    response = test_client.get("/metrics")
+    for stage in ("upload_read", "decode", "preprocess", "session_run", "serialize"):
+        assert f'image_classifier_stage_seconds_count{{stage="{stage}"}}' in (
+            response.text
+        )
+    assert "image_classifier_input_width_pixels_count" in response.text
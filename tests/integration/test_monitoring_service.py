@@ -0,0 +1,212 @@
+"""Integration tests for the Prometheus client used by the dashboard"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from src.core.exceptions import PrometheusConnectionError
+from src.services import monitoring
+from src.services.monitoring import MonitoringService, merge_series
+
+
+def _vector(*samples: tuple[dict, str]) -> dict:
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {"metric": metric, "value": [1700000000, value]}
+                for metric, value in samples
+            ],
+        },
+    }
+
+
+class FakePrometheus:
+    """Answers the dashboard's queries and records them"""
+
+    def __init__(self, concurrent_queries: int = 1):
+        self.queries: list[tuple[str, str]] = []
+        self.ranges: list[tuple[float, float]] = []
+        self.app = FastAPI()
+        # Every query waits until this many are in flight, proving concurrency
+        self._barrier = asyncio.Barrier(concurrent_queries)
+
+        @self.app.get("/api/v1/query")
+        async def query(request: Request) -> dict:
+            promql = request.query_params["query"]
+            self.queries.append(("query", promql))
+            await asyncio.wait_for(self._barrier.wait(), timeout=2)
+            if promql == monitoring.TOTAL_QUERY:
+                return _vector(({}, "10"))
+            if promql == monitoring.SUCCESS_QUERY:
+                return _vector(({}, "90"))
+            return _vector(
+                ({"le": "0.01"}, "4"), ({"le": "0.02"}, "9"), ({"le": "+Inf"}, "10")
+            )
+
+        @self.app.get("/api/v1/query_range")
+        async def query_range(request: Request) -> dict:
+            params = request.query_params
+            self.queries.append(("query_range", params["query"]))
+            self.ranges.append((float(params["start"]), float(params["end"])))
+            await asyncio.wait_for(self._barrier.wait(), timeout=2)
+            return {
+                "status": "success",
+                "data": {
+                    "resultType": "matrix",
+                    "result": [
+                        {
+                            "metric": {"series": "throughput"},
+                            "values": [[100, "2.5"], [115, "3"]],
+                        },
+                        {"metric": {"series": "p99"}, "values": [[115, "0.02"]]},
+                        {"metric": {"series": "p50"}, "values": [[115, "NaN"]]},
+                    ],
+                },
+            }
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    monitoring._cache.clear()
+    yield
+    monitoring._cache.clear()
+
+
+def _service(prometheus: FakePrometheus) -> MonitoringService:
+    return MonitoringService(
+        "http://prometheus", transport=httpx.ASGITransport(app=prometheus.app)
+    )
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_queries_are_concurrent_and_cached():
+    """Test the three queries run at once and repeated refreshes are cached"""
+    prometheus = FakePrometheus(concurrent_queries=3)
+    service = _service(prometheus)
+    try:
+        metrics = await service.get_metrics()
+        again = await service.get_metrics()
+    finally:
+        service.close()
+
+    assert len(prometheus.queries) == 3
+    assert again == metrics
+    assert metrics["requests"] == {"total": 10, "success": 9.0, "error": 1.0}
+    assert metrics["response_times"] == [
+        {"bucket": 0.01, "count": 4},
+        {"bucket": 0.02, "count": 5},
+        {"bucket": float("inf"), "count": 1},
+    ]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_cache_shared_between_sessions():
+    """Test sessions refreshing at the same time share one set of queries"""
+    prometheus = FakePrometheus(concurrent_queries=3)
+    first, second = _service(prometheus), _service(prometheus)
+    try:
+        await asyncio.gather(first.get_metrics(), second.get_metrics())
+    finally:
+        first.close()
+        second.close()
+
+    assert len(prometheus.queries) == 3
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_cache_drops_expired_and_oldest_entries(monkeypatch):
+    """Test the shared cache does not grow with every range query refresh"""
+    monkeypatch.setattr(monitoring, "_CACHE_MAX_ENTRIES", 3)
+    done: asyncio.Future = asyncio.get_running_loop().create_future()
+    done.set_result({})
+    monitoring._cache[("expired",)] = (0.0, done)
+    monitoring._cache[("oldest",)] = (float("inf"), done)
+
+    prometheus = FakePrometheus(concurrent_queries=3)
+    service = _service(prometheus)
+    try:
+        await service.get_metrics()
+    finally:
+        service.close()
+
+    assert ("expired",) not in monitoring._cache
+    assert ("oldest",) not in monitoring._cache
+    assert len(monitoring._cache) == 3
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_series_from_one_range_query():
+    """Test throughput and latency series come from a single range query"""
+    prometheus = FakePrometheus(concurrent_queries=4)
+    service = _service(prometheus)
+    try:
+        metrics = await service.get_metrics(include_series=True)
+    finally:
+        service.close()
+
+    assert [kind for kind, _ in prometheus.queries].count("query_range") == 1
+    assert metrics["series"] == {
+        "timestamps": [100, 115],
+        "throughput": [2.5, 3.0],
+        "p50": [None, None],
+        "p95": [None, None],
+        "p99": [None, 0.02],
+    }
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_unreachable_prometheus():
+    """Test connection failures raise PrometheusConnectionError"""
+
+    def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    service = MonitoringService(
+        "http://prometheus", transport=httpx.MockTransport(refuse)
+    )
+    try:
+        with pytest.raises(PrometheusConnectionError):
+            await service.get_metrics()
+    finally:
+        service.close()
+    assert monitoring._cache == {}
+
+
+@pytest.mark.integration
+def test_fetch_metrics_only_asks_for_new_points(monkeypatch):
+    """Test a refresh with `since` queries from the next step to the aligned end"""
+    monkeypatch.setattr(monitoring.time, "time", lambda: 1007.0)
+    prometheus = FakePrometheus()
+    service = _service(prometheus)
+    try:
+        # Called without an event loop, as a Streamlit fragment does
+        service.fetch_metrics(include_series=True, since=960)
+        monitoring._cache.clear()
+        up_to_date = service.fetch_metrics(include_series=True, since=1005)
+    finally:
+        service.close()
+
+    step = 15
+    assert prometheus.ranges == [(960 + step, 1005)]
+    assert up_to_date["series"]["timestamps"] == []
+
+
+@pytest.mark.integration
+def test_merge_series_appends_and_trims():
+    """Test new points are appended and points outside the window dropped"""
+    existing = {"timestamps": [0, 15, 30], "throughput": [1.0, 2.0, 3.0]}
+    new = {"timestamps": [45, 60], "throughput": [4.0, None]}
+
+    merged = merge_series(existing, new, window_seconds=30)
+
+    assert merged == {"timestamps": [30, 45, 60], "throughput": [3.0, 4.0, None]}
+    assert merge_series(None, new, 30) is new
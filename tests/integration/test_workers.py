@@ -0,0 +1,108 @@
+"""Integration tests of the memory of several gunicorn workers"""
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).parent.parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        for child in (task / "children").read_text().split():
+            pids.extend(_process_tree(int(child)))
+    return pids
+
+
+def _pss(pid: int) -> int:
+    """Proportional set size: shared pages are split between the processes"""
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        line = next(line for line in f if line.startswith("Pss:"))
+    return int(line.split()[1]) * 1024
+
+
+def _serve_and_measure(
+    tmp_path: Path, model_path: Path, workers: int, shared: bool
+) -> int:
+    """Total PSS of gunicorn and its workers once every worker is ready"""
+    metrics_dir = tmp_path / f"metrics-{workers}-{shared}"
+    port = _free_port()
+    env = {
+        **os.environ,
+        "API_WORKERS": str(workers),
+        "MODEL_PATH": str(model_path),
+        "MODEL_SHARED_WEIGHTS": str(shared).lower(),
+        "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir),
+        "WARMUP_BATCH_SIZES": "[1]",
+        "INFERENCE_WORKERS": "1",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "src.api.main:app",
+            "--config",
+            "gunicorn.conf.py",
+            "--bind",
+            f"127.0.0.1:{port}",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            assert server.poll() is None, "gunicorn exited"
+            try:
+                metrics = httpx.get(f"http://127.0.0.1:{port}/metrics").text
+            except httpx.TransportError:
+                metrics = ""
+            ready = re.search(r"^image_classifier_workers_ready (\S+)", metrics, re.M)
+            if ready and float(ready.group(1)) == workers:
+                break
+            time.sleep(0.2)
+        else:
+            pytest.fail(f"{workers} workers did not get ready")
+        return sum(_pss(pid) for pid in _process_tree(server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+@pytest.mark.integration
+def test_shared_weights_are_not_duplicated_per_worker(tmp_path, large_model):
+    """Test extra workers on shared weights do not each add a copy of them"""
+    pytest.importorskip("gunicorn")
+    from scripts.export_shared_weights import export_shared_weights
+
+    export_shared_weights(large_model)
+    weights_bytes = large_model.stat().st_size
+    workers = 3
+
+    growth = {}
+    for shared in (False, True):
+        one = _serve_and_measure(tmp_path, large_model, 1, shared)
+        many = _serve_and_measure(tmp_path, large_model, workers, shared)
+        growth[shared] = (many - one) / (workers - 1)
+
+    # Each extra worker adds its own copy of the weights, unless they are shared
+    assert growth[False] > weights_bytes * 0.8
+    assert growth[True] < growth[False] - weights_bytes * 0.6
@@ -0,0 +1,75 @@
+"""Test archive utilities"""
+
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from src.core.exceptions import ValidationError
+from src.utils.archives import extract_archive, is_archive
+
+
+def _zip(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_extract_archive(build):
+    """Test regular files are extracted and hidden files skipped"""
+    contents = build({"a.png": b"a", "dir/b.png": b"b", "__MACOSX/._a.png": b"x"})
+    assert is_archive(contents)
+    assert extract_archive(contents, max_members=10, max_total_bytes=100) == [
+        ("a.png", b"a"),
+        ("dir/b.png", b"b"),
+    ]
+
+
+@pytest.mark.unit
+def test_is_archive_rejects_images(test_image_bytes):
+    """Test plain images are not mistaken for archives"""
+    assert not is_archive(test_image_bytes)
+
+
+@pytest.mark.unit
+def test_extract_archive_limits():
+    """Test member count and expanded size limits"""
+    contents = _zip({"a.png": b"a" * 10, "b.png": b"b" * 10})
+    with pytest.raises(ValidationError):
+        extract_archive(contents, max_members=1, max_total_bytes=100)
+    with pytest.raises(ValidationError):
+        extract_archive(contents, max_members=10, max_total_bytes=15)
+
+
+@pytest.mark.unit
+def test_extract_archive_stops_at_entry_limit():
+    """Test a tar of many entries is rejected without reading all of them"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for index in range(5000):
+            info = tarfile.TarInfo(f"dir{index}")
+            info.type = tarfile.DIRTYPE
+            archive.addfile(info)
+    contents = buffer.getvalue()
+
+    with pytest.raises(ValidationError, match="more than 40 entries"):
+        extract_archive(contents, max_members=10, max_total_bytes=100)
+    assert (
+        extract_archive(contents, max_members=10, max_total_bytes=100, max_entries=5000)
+        == []
+    )
@@ -0,0 +1,74 @@
+"""Test dynamic micro-batching"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.services.batching import MicroBatcher
+
+
+def _row_ids(batch: np.ndarray) -> list[float]:
+    return [float(row[0, 0, 0]) for row in batch]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batcher_groups_concurrent_requests():
+    """Test concurrent requests share one batch and get their own result"""
+    batch_sizes = []
+
+    def run_batch(batch):
+        batch_sizes.append(len(batch))
+        return _row_ids(batch)
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+    try:
+        inputs = [np.full((1, 3, 2, 2), i, dtype=np.float32) for i in range(4)]
+        results = await asyncio.gather(*(batcher.predict(x) for x in inputs))
+    finally:
+        batcher.close()
+
+    assert results == [0.0, 1.0, 2.0, 3.0]
+    assert batch_sizes == [4]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batcher_respects_max_batch_size():
+    """Test batches never exceed the configured size"""
+    batch_sizes = []
+    lock = threading.Lock()
+
+    def run_batch(batch):
+        with lock:
+            batch_sizes.append(len(batch))
+        return _row_ids(batch)
+
+    batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait_ms=50)
+    try:
+        inputs = [np.full((1, 3, 2, 2), i, dtype=np.float32) for i in range(7)]
+        results = await asyncio.gather(*(batcher.predict(x) for x in inputs))
+    finally:
+        batcher.close()
+
+    assert results == [float(i) for i in range(7)]
+    assert sum(batch_sizes) == 7
+    assert max(batch_sizes) <= 3
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batcher_propagates_errors():
+    """Test a failing batch raises in every waiting caller"""
+
+    def run_batch(batch):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=50)
+    try:
+        with pytest.raises(ValueError):
+            await batcher.predict(np.zeros((1, 3, 2, 2), dtype=np.float32))
+    finally:
+        batcher.close()
@@ -0,0 +1,48 @@
+"""Test the service benchmark suite"""
+
+import pytest
+
+from benchmarks.bench_service import compare_to_baseline, run_benchmark
+
+
+@pytest.mark.unit
+def test_compare_to_baseline_flags_regressions():
+    """Test slower latencies and lower throughput beyond tolerance are flagged"""
+    baseline = {
+        "meta": {"timestamp": 100.0},
+        "latency": {"lemon.jpg": {"p50_ms": 10.0, "p99_ms": 20.0}},
+        "throughput": {"concurrency_8": {"throughput_rps": 100.0}},
+        "memory": {"peak_rss_bytes": 1000},
+    }
+    results = {
+        "meta": {"timestamp": 200.0},
+        "latency": {"lemon.jpg": {"p50_ms": 10.5, "p99_ms": 30.0}},
+        "throughput": {"concurrency_8": {"throughput_rps": 50.0}},
+        "memory": {"peak_rss_bytes": 900},
+    }
+
+    regressions = compare_to_baseline(results, baseline, tolerance=0.1)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith("latency.lemon.jpg.p99_ms")
+    assert regressions[1].startswith("throughput.concurrency_8.throughput_rps")
+    assert compare_to_baseline(results, baseline, tolerance=1.0) == []
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_run_benchmark_in_process(test_image_bytes):
+    """Test a minimal in-process run produces every section"""
+    results = await run_benchmark(
+        None,
+        {"test.png": test_image_bytes},
+        latency_repeats=2,
+        concurrency_levels=[2],
+        total_requests=4,
+        stage_repeats=1,
+    )
+
+    assert results["latency"]["test.png"]["p50_ms"] > 0
+    assert results["throughput"]["concurrency_2"]["status_counts"] == {"200": 4}
+    assert set(results["stages"]["test.png"]) >= {"decode_ms", "session_run_ms"}
+    assert results["memory"]["peak_rss_bytes"] > 0
@@ -0,0 +1,115 @@
+"""Test the prediction cache"""
+
+import pytest
+
+from src.services.cache import DiskCacheBackend, PredictionCache
+
+PREDICTIONS = [("goldfish", 0.9), ("lemon", 0.1)]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.unit
+def test_cache_key_depends_on_namespace():
+    """Test the same bytes get different keys for different models or settings"""
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+
+    assert cache.key(b"image", "model-a") == cache.key(b"image", "model-a")
+    assert cache.key(b"image", "model-a") != cache.key(b"other", "model-a")
+    assert cache.key(b"image", "model-a") != cache.key(b"image", "model-b")
+
+
+@pytest.mark.unit
+def test_cache_lru_eviction():
+    """Test the least recently used entry is evicted when full"""
+    cache = PredictionCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", PREDICTIONS)
+    cache.set("b", PREDICTIONS)
+    assert cache.get("a") == PREDICTIONS  # "b" is now least recently used
+    cache.set("c", PREDICTIONS)
+
+    assert cache.get("a") == PREDICTIONS
+    assert cache.get("b") is None
+    assert cache.get("c") == PREDICTIONS
+
+
+@pytest.mark.unit
+def test_cache_ttl_expiry():
+    """Test entries expire after the TTL"""
+    clock = FakeClock()
+    cache = PredictionCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.set("a", PREDICTIONS)
+
+    clock.now = 4
+    assert cache.get("a") == PREDICTIONS
+    clock.now = 6
+    assert cache.get("a") is None
+
+
+@pytest.mark.unit
+def test_disk_cache_shared_between_instances(tmp_path):
+    """Test a second cache (another worker) sees entries through the disk backend"""
+    path = tmp_path / "predictions.sqlite3"
+    first = PredictionCache(
+        10, 60, disk=DiskCacheBackend(path, max_entries=10, ttl_seconds=60)
+    )
+    second = PredictionCache(
+        10, 60, disk=DiskCacheBackend(path, max_entries=10, ttl_seconds=60)
+    )
+
+    key = first.key(b"image", "model")
+    first.set(key, PREDICTIONS)
+    assert second.get(key) == PREDICTIONS
+
+
+@pytest.mark.unit
+def test_disk_cache_size_eviction(tmp_path):
+    """Test the disk backend keeps only the newest entries"""
+    disk = DiskCacheBackend(tmp_path / "cache.sqlite3", max_entries=2, ttl_seconds=60)
+    for key in ("a", "b", "c"):
+        disk.set(key, PREDICTIONS)
+
+    assert disk.get("a") is None
+    assert disk.get("b") == PREDICTIONS
+    assert disk.get("c") == PREDICTIONS
+
+
+@pytest.mark.unit
+def test_disk_cache_evicts_in_batches(tmp_path):
+    """Test the size is enforced every evict_interval inserts, oldest first"""
+    disk = DiskCacheBackend(
+        tmp_path / "cache.sqlite3", max_entries=10, ttl_seconds=60, evict_interval=5
+    )
+    for index in range(14):
+        disk.set(str(index), PREDICTIONS)
+
+    def count():
+        return disk._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[
+            0
+        ]
+
+    # The last check ran after the 10th insert, when nothing was over the limit
+    assert count() == 14
+    disk.set("14", PREDICTIONS)
+    assert count() == 10
+    assert disk.get("4") is None
+    assert disk.get("5") == PREDICTIONS
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cache_async_methods_use_the_disk(tmp_path):
+    """Test the event loop variants read and write both tiers"""
+    disk = DiskCacheBackend(tmp_path / "cache.sqlite3", max_entries=10, ttl_seconds=60)
+    cache = PredictionCache(10, 60, disk=disk)
+
+    await cache.set_async("a", PREDICTIONS)
+    assert disk.get("a") == PREDICTIONS
+    assert await PredictionCache(10, 60, disk=disk).get_async("a") == PREDICTIONS
+    assert await cache.get_async("missing") is None
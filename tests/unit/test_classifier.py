@@ -32,3 +32,59 @@ def test_classifier_invalid_image(classifier):
 
     with pytest.raises(ModelError):
         classifier.predict(invalid_image, (224, 224))
+
+
+@pytest.mark.unit
+def test_classifier_predict_batch(classifier):
+    """Test batched prediction returns one result per image"""
+    batch = np.random.default_rng(0).random((3, 3, 224, 224), dtype=np.float32)
+    results = classifier.predict_batch(batch)
+
+    assert len(results) == 3
+    for predictions, image in zip(results, batch, strict=False):
+        expected = classifier.predict_batch(image[np.newaxis])[0]
+        assert [name for name, _ in predictions] == [name for name, _ in expected]
+        assert [conf for _, conf in predictions] == pytest.approx(
+            [conf for _, conf in expected], abs=1e-5
+        )
+
+
+@pytest.mark.unit
+def test_classifier_persists_optimized_model(tmp_path, test_image):
+    """Test the optimized graph is written once and reused on the next start"""
+    from src.classifier.classifier import ImageClassifier
+    from src.classifier.session import create_session_options
+    from src.core.config import settings
+
+    optimized_path = tmp_path / "optimized.onnx"
+    options = create_session_options(intra_op_threads=1, allow_spinning=False)
+    first = ImageClassifier(
+        settings.MODEL_PATH, settings.LABELS_PATH, options, optimized_path
+    )
+    # Written through a temporary file, which is gone once renamed into place
+    assert [path.name for path in tmp_path.iterdir()] == ["optimized.onnx"]
+
+    second = ImageClassifier(
+        settings.MODEL_PATH,
+        settings.LABELS_PATH,
+        create_session_options(),
+        optimized_path,
+    )
+    assert second.version == first.version
+    assert [name for name, _ in second.predict(test_image, (224, 224))] == [
+        name for name, _ in first.predict(test_image, (224, 224))
+    ]
+
+
+@pytest.mark.unit
+def test_optimized_model_path_names_level_and_version(tmp_path):
+    """Test graphs built at another level or ONNX Runtime version are not reused"""
+    import onnxruntime as ort
+
+    from src.classifier.session import optimized_model_path
+
+    path = optimized_model_path(tmp_path, tmp_path / "model.onnx", "all")
+
+    assert path.parent == tmp_path and path.suffix == ".onnx"
+    assert ort.__version__ in path.name
+    assert path != optimized_model_path(tmp_path, tmp_path / "model.onnx", "basic")
@@ -0,0 +1,133 @@
+"""Test the offline bulk classification CLI"""
+
+import csv
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from scripts.classify_bulk import classify, count_items, iter_items
+
+
+@pytest.fixture
+def image_dir(tmp_path, test_image_bytes):
+    """A directory tree with four images and one corrupt file"""
+    source = tmp_path / "images"
+    (source / "nested").mkdir(parents=True)
+    for name in ["a.png", "b.png", "nested/c.png", "nested/d.png"]:
+        (source / name).write_bytes(test_image_bytes)
+    (source / "broken.png").write_bytes(b"not an image")
+    (source / "notes.txt").write_text("ignored")
+    return source
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.unit
+def test_classify_directory(image_dir, tmp_path):
+    """Test every image gets a row and corrupt files an error"""
+    output = tmp_path / "labels.jsonl"
+    assert classify(image_dir, output, k=3, workers=2, batch_size=2) == 5
+
+    rows = {row["path"]: row for row in _read_jsonl(output)}
+    assert set(rows) == {"a.png", "b.png", "broken.png", "nested/c.png", "nested/d.png"}
+    assert rows["broken.png"]["error"] == "Invalid image file"
+    assert rows["broken.png"]["labels"] == []
+    assert len(rows["a.png"]["labels"]) == len(rows["a.png"]["scores"]) == 3
+    assert rows["a.png"]["labels"] == rows["nested/d.png"]["labels"]
+    assert not (tmp_path / "labels.jsonl.checkpoint.json").exists()
+
+
+@pytest.mark.unit
+def test_classify_resumes_after_interruption(image_dir, tmp_path):
+    """Test a stopped run continues from its checkpoint without duplicates"""
+    output = tmp_path / "labels.jsonl"
+    checkpoint = tmp_path / "labels.jsonl.checkpoint.json"
+
+    assert classify(image_dir, output, workers=0, batch_size=2, limit=3) == 3
+    assert json.loads(checkpoint.read_text())["completed"] == 3
+    # Rows written after the checkpoint are discarded on resume
+    with open(output, "a") as f:
+        f.write('{"path": "partial"')
+
+    assert classify(image_dir, output, workers=0, batch_size=2) == 2
+    paths = [row["path"] for row in _read_jsonl(output)]
+    assert paths == sorted(paths) and len(set(paths)) == 5
+    assert not checkpoint.exists()
+
+    with pytest.raises(SystemExit):
+        classify(image_dir, output, workers=0)
+
+
+@pytest.mark.unit
+def test_classify_resumes_by_path(image_dir, tmp_path, test_image_bytes):
+    """Test a resumed run skips the images done, not the first ones listed"""
+    output = tmp_path / "labels.jsonl"
+
+    assert classify(image_dir, output, workers=0, batch_size=2, limit=3) == 3
+    # Sorts before the images already done
+    (image_dir / "0.png").write_bytes(test_image_bytes)
+
+    assert classify(image_dir, output, workers=0, batch_size=2) == 3
+    paths = [row["path"] for row in _read_jsonl(output)]
+    assert sorted(paths) == sorted(
+        ["0.png", "a.png", "b.png", "broken.png", "nested/c.png", "nested/d.png"]
+    )
+    assert not (tmp_path / "labels.jsonl.checkpoint.keys").exists()
+
+
+@pytest.mark.unit
+def test_classify_overwrite_starts_over(image_dir, tmp_path):
+    """Test --overwrite discards the checkpoint instead of resuming from it"""
+    output = tmp_path / "labels.jsonl"
+    checkpoint = tmp_path / "labels.jsonl.checkpoint.json"
+
+    assert classify(image_dir, output, workers=0, limit=2) == 2
+    assert classify(image_dir, output, workers=0, limit=4, overwrite=True) == 4
+    assert json.loads(checkpoint.read_text())["completed"] == 4
+    assert len(_read_jsonl(output)) == 4
+
+
+@pytest.mark.unit
+def test_archives_and_manifest(image_dir, tmp_path, test_image_bytes):
+    """Test zip, tar and manifest sources list the same images"""
+    names = ["a.png", "b.png", "__MACOSX/._a.png"]
+    zip_path = tmp_path / "images.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for name in names:
+            archive.writestr(name, test_image_bytes)
+    tar_path = tmp_path / "images.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as archive:
+        for name in names:
+            info = tarfile.TarInfo(name)
+            info.size = len(test_image_bytes)
+            archive.addfile(info, io.BytesIO(test_image_bytes))
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# images to label\nimages/a.png\n\nimages/b.png\n")
+
+    assert [key for key, _ in iter_items(zip_path)] == ["a.png", "b.png"]
+    assert [key for key, _ in iter_items(tar_path, done={"a.png"})] == ["b.png"]
+    assert count_items(zip_path) == 2 and count_items(tar_path) is None
+    assert count_items(manifest) == 2
+
+    output = tmp_path / "labels.csv"
+    assert classify(tar_path, output, k=2, workers=0) == 2
+    rows = list(csv.DictReader(output.open()))
+    assert [row["path"] for row in rows] == ["a.png", "b.png"]
+    assert set(rows[0]) == {"path", "label_1", "score_1", "label_2", "score_2", "error"}
+
+
+@pytest.mark.unit
+def test_classify_parquet(image_dir, tmp_path):
+    """Test Parquet output is a directory of complete part files"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "labels.parquet"
+    classify(image_dir, output, workers=0, batch_size=2, checkpoint_every=2)
+
+    table = pq.read_table(output)
+    assert table.num_rows == 5
+    assert len(list(output.glob("part-*.parquet"))) > 1
@@ -0,0 +1,79 @@
+"""Test the bounded inference executor"""
+
+import pytest
+
+from src.core.exceptions import ServiceOverloadedError
+from src.services.executor import InferenceExecutor
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_executor_runs_blocking_function():
+    """Test functions run in the pool and return their result"""
+    executor = InferenceExecutor(max_workers=2, max_queue_size=0)
+    try:
+        async with executor.admit():
+            assert await executor.run(sum, [1, 2, 3]) == 6
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_executor_rejects_when_full():
+    """Test admission fails once workers and queue are exhausted"""
+    executor = InferenceExecutor(max_workers=1, max_queue_size=1, retry_after=3)
+    try:
+        async with executor.admit(), executor.admit():
+            with pytest.raises(ServiceOverloadedError) as exc_info:
+                async with executor.admit():
+                    pass
+            assert exc_info.value.retry_after == 3
+
+        # Slots are released once the requests finish
+        async with executor.admit():
+            pass
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_executor_admits_batches_by_item():
+    """Test a batch takes a slot per item, and all of them when it is larger"""
+    executor = InferenceExecutor(max_workers=2, max_queue_size=2)
+    try:
+        async with executor.admit(slots=3):
+            with pytest.raises(ServiceOverloadedError):
+                async with executor.admit(slots=2):
+                    pass
+            async with executor.admit():
+                pass
+
+        async with executor.admit(slots=100):
+            with pytest.raises(ServiceOverloadedError):
+                async with executor.admit():
+                    pass
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_executor_process_mode(test_image_bytes):
+    """Test process mode runs the preprocessing function in a spawned worker"""
+    import asyncio
+
+    from src.utils.preprocessing import ImagePreprocessor, prepare_input
+
+    preprocessor = ImagePreprocessor((224, 224))
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0, use_processes=True)
+    try:
+        async with executor.admit():
+            array = await asyncio.wait_for(
+                executor.run(prepare_input, test_image_bytes, preprocessor), 60
+            )
+    finally:
+        executor.shutdown()
+
+    assert array.shape == (1, 3, 224, 224)
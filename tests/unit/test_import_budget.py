@@ -0,0 +1,39 @@
+"""Test the API cold start stays within its import budget"""
+
+import pytest
+
+from benchmarks.bench_import import DEFERRED_MODULES, check_budget, measure_import
+
+# Budgets for importing src.api.main, with headroom over the measured ~0.6s
+# and ~65 MiB so only real regressions fail, e.g. importing onnxruntime again
+IMPORT_SECONDS_BUDGET = 1.5
+IMPORT_RSS_MIB_BUDGET = 72
+
+
+@pytest.mark.unit
+def test_api_import_within_budget():
+    """Test importing the API is fast, small and does not load the runtime"""
+    results = measure_import("src.api.main", runs=3)
+
+    assert results["loaded"] == []
+    assert check_budget(results, IMPORT_SECONDS_BUDGET, IMPORT_RSS_MIB_BUDGET) == []
+
+
+@pytest.mark.unit
+def test_ui_services_skip_inference_stack():
+    """Test the UI's API client does not import the inference stack"""
+    results = measure_import("src.services.api", runs=1)
+
+    assert results["loaded"] == []
+
+
+@pytest.mark.unit
+def test_check_budget_reports_violations():
+    """Test each exceeded budget and eager import is reported"""
+    results = {"min_seconds": 2.0, "rss_bytes": 100 * 2**20, "loaded": ["PIL.Image"]}
+
+    violations = check_budget(results, max_seconds=1.0, max_rss_mib=50)
+
+    assert len(violations) == 3
+    assert check_budget({**results, "loaded": []}, None, None) == []
+    assert "onnxruntime" in DEFERRED_MODULES
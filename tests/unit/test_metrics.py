@@ -0,0 +1,64 @@
+"""Test metrics aggregation across worker processes"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+WORKER = """
+from src.core.middleware import INFERENCE_IN_FLIGHT, PREDICTION_LATENCY, REQUESTS_TOTAL
+REQUESTS_TOTAL.labels(status="200").inc()
+PREDICTION_LATENCY.observe(0.01)
+INFERENCE_IN_FLIGHT.inc()
+"""
+
+SCRAPE = """
+import sys
+from src.core.metrics import mark_worker_dead, render_metrics
+mark_worker_dead(int(sys.argv[1]))
+sys.stdout.write(render_metrics().decode())
+"""
+
+
+def _run(code: str, env: dict, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", code, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@pytest.mark.unit
+def test_metrics_aggregated_across_workers(tmp_path):
+    """Test counters and histograms of all workers are summed on scrape"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER], env=env) for _ in range(2)
+    ]
+    for worker in workers:
+        assert worker.wait() == 0
+
+    output = _run(SCRAPE, env, str(workers[0].pid)).stdout
+
+    assert 'image_classifier_predictions_total{status="200"} 2.0' in output
+    assert "image_classifier_prediction_seconds_count 2.0" in output
+    # The gauge of the worker marked dead is dropped, the other one is kept
+    assert "image_classifier_inference_in_flight 1.0" in output
+
+
+@pytest.mark.unit
+def test_prepare_multiprocess_dir_removes_stale_values(tmp_path, monkeypatch):
+    """Test values left by a previous run are removed before workers start"""
+    from src.core.metrics import prepare_multiprocess_dir
+
+    path = tmp_path / "metrics"
+    path.mkdir()
+    (path / "counter_123.db").write_bytes(b"stale")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(path))
+
+    prepare_multiprocess_dir()
+
+    assert list(path.iterdir()) == []
@@ -0,0 +1,150 @@
+"""Test the monitoring and request decompression middleware"""
+
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from src.core.middleware import (
+    MonitoringMiddleware,
+    RequestDecompressionMiddleware,
+    exponential_buckets,
+)
+
+
+def _sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.add_middleware(MonitoringMiddleware)
+
+    @app.post("/items/{item_id}")
+    async def echo(item_id: str) -> dict:
+        return {"item_id": item_id}
+
+    return TestClient(app)
+
+
+@pytest.mark.unit
+def test_exponential_buckets():
+    """Test bucket bounds grow geometrically"""
+    assert exponential_buckets(0.001, 2, 4) == [0.001, 0.002, 0.004, 0.008]
+
+
+@pytest.mark.unit
+def test_requests_labelled_by_route_template(client):
+    """Test path parameters are collapsed into the route template"""
+    labels = {"method": "POST", "route": "/items/{item_id}", "status": "200"}
+    before = _sample("image_classifier_http_request_duration_seconds_count", labels)
+
+    client.post("/items/a", content=b"12345")
+    client.post("/items/b", content=b"12345")
+
+    after = _sample("image_classifier_http_request_duration_seconds_count", labels)
+    assert after == before + 2
+    size_labels = {"method": "POST", "route": "/items/{item_id}"}
+    assert _sample("image_classifier_http_request_body_bytes_sum", size_labels) >= 10
+    assert _sample("image_classifier_http_response_body_bytes_sum", size_labels) > 0
+
+
+@pytest.mark.unit
+def test_unmatched_paths_share_a_label(client):
+    """Test unknown paths do not create a series per path"""
+    labels = {"method": "GET", "route": "<unmatched>", "status": "404"}
+    before = _sample("image_classifier_http_request_duration_seconds_count", labels)
+
+    client.get("/missing/1")
+    client.get("/missing/2")
+
+    after = _sample("image_classifier_http_request_duration_seconds_count", labels)
+    assert after == before + 2
+    assert _sample("image_classifier_http_requests_in_flight", {}) == 0
+
+
+@pytest.fixture(scope="module")
+def decompressing_client():
+    app = FastAPI()
+    app.add_middleware(
+        RequestDecompressionMiddleware, max_size=1000, max_compressed_size=500
+    )
+    app.add_middleware(MonitoringMiddleware)
+
+    @app.post("/echo/{item_id}")
+    async def echo(request: Request) -> dict:
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+@pytest.mark.unit
+def test_decompressed_requests_keep_their_route(decompressing_client):
+    """Test compressed requests are decompressed and labelled by their route"""
+    labels = {"method": "POST", "route": "/echo/{item_id}", "status": "200"}
+    before = _sample("image_classifier_http_request_duration_seconds_count", labels)
+
+    response = decompressing_client.post(
+        "/echo/a",
+        content=gzip.compress(b"x" * 800),
+        headers={"Content-Encoding": "gzip"},
+    )
+
+    assert response.json() == {"size": 800}
+    after = _sample("image_classifier_http_request_duration_seconds_count", labels)
+    assert after == before + 1
+
+
+@pytest.mark.unit
+def test_decompression_limits(decompressing_client):
+    """Test compressed and decompressed sizes are both limited"""
+    incompressible = gzip.compress(bytes(range(256)) * 4, compresslevel=0)
+    response = decompressing_client.post(
+        "/echo/a", content=incompressible, headers={"Content-Encoding": "gzip"}
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body too large"
+
+    response = decompressing_client.post(
+        "/echo/a",
+        content=gzip.compress(b"x" * 1001),
+        headers={"Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Decompressed request body too large"
+
+    response = decompressing_client.post(
+        "/echo/a",
+        content=gzip.compress(b"x" * 1000),
+        headers={"Content-Encoding": "gzip"},
+    )
+    assert response.json() == {"size": 1000}
+
+
+@pytest.mark.unit
+def test_decompression_streams_the_body():
+    """Test the body is decompressed as it is read, not before the app runs"""
+    app = FastAPI()
+    app.add_middleware(RequestDecompressionMiddleware, max_size=10_000_000)
+    chunks = []
+
+    @app.post("/first")
+    async def first_chunks(request: Request) -> dict:
+        async for chunk in request.stream():
+            chunks.append(len(chunk))
+            if len(chunks) == 2:
+                break
+        return {"read": sum(chunks)}
+
+    response = TestClient(app).post(
+        "/first",
+        content=gzip.compress(b"x" * 5_000_000),
+        headers={"Content-Encoding": "gzip"},
+    )
+
+    chunk_size = RequestDecompressionMiddleware.CHUNK_SIZE
+    assert response.json() == {"read": 2 * chunk_size}
+    assert chunks == [chunk_size, chunk_size]
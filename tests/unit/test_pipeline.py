@@ -0,0 +1,165 @@
+"""Test the staged processing pipeline"""
+
+import asyncio
+import queue
+import threading
+import time
+
+import pytest
+
+from src.core.middleware import PIPELINE_QUEUE_DEPTH
+from src.services.pipeline import Pipeline, Stage
+
+
+def _slow_copy(x: int) -> int:
+    time.sleep(0.01)
+    return x
+
+
+@pytest.mark.unit
+def test_pipeline_runs_items_through_stages_in_order():
+    """Test each item goes through every stage and map keeps the input order"""
+    pipeline = Pipeline(
+        "test-order",
+        [
+            Stage("double", lambda x: x * 2, workers=4),
+            Stage("increment", lambda x: x + 1, workers=2),
+        ],
+    )
+    try:
+        results = [future.result() for future in pipeline.map(range(100))]
+    finally:
+        pipeline.close()
+
+    assert results == [x * 2 + 1 for x in range(100)]
+
+
+@pytest.mark.unit
+def test_pipeline_overlaps_stages():
+    """Test different items are in different stages at the same time"""
+    active = set()
+    overlapped = threading.Event()
+    lock = threading.Lock()
+
+    def step(name):
+        def run(x):
+            with lock:
+                active.add(name)
+                if len(active) > 1:
+                    overlapped.set()
+            time.sleep(0.02)
+            with lock:
+                active.discard(name)
+            return x
+
+        return run
+
+    pipeline = Pipeline("test-overlap", [Stage("a", step("a")), Stage("b", step("b"))])
+    try:
+        for future in pipeline.map(range(10)):
+            future.result()
+    finally:
+        pipeline.close()
+
+    assert overlapped.is_set()
+
+
+@pytest.mark.unit
+def test_pipeline_batches_items():
+    """Test a batched stage gets several queued items in one call"""
+    batch_sizes = []
+
+    def run_batch(values):
+        batch_sizes.append(len(values))
+        return [value * 10 for value in values]
+
+    gate = threading.Event()
+    pipeline = Pipeline(
+        "test-batch",
+        [
+            Stage("wait", lambda x: gate.wait() and x),
+            Stage("model", run_batch, batch_size=4, max_wait_ms=200),
+        ],
+    )
+    try:
+        futures = [pipeline.submit(x) for x in range(4)]
+        gate.set()
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        pipeline.close()
+
+    assert results == [0, 10, 20, 30]
+    assert max(batch_sizes) > 1
+    assert all(size <= 4 for size in batch_sizes)
+
+
+@pytest.mark.unit
+def test_pipeline_fails_only_the_failing_item():
+    """Test a stage error is set on that item's future and later items still run"""
+
+    def check(x):
+        if x == 1:
+            raise ValueError("bad item")
+        return x
+
+    pipeline = Pipeline("test-error", [Stage("check", check), Stage("copy", str)])
+    try:
+        futures = [pipeline.submit(x) for x in range(3)]
+        with pytest.raises(ValueError, match="bad item"):
+            futures[1].result(timeout=5)
+        assert futures[0].result(timeout=5) == "0"
+        assert futures[2].result(timeout=5) == "2"
+    finally:
+        pipeline.close()
+
+
+@pytest.mark.unit
+def test_pipeline_bounds_queues():
+    """Test a full first queue rejects non-blocking submissions and shows in the depth gauge"""
+    gate = threading.Event()
+    pipeline = Pipeline("test-bounded", [Stage("wait", gate.wait, queue_size=2)])
+    try:
+        first = pipeline.submit(None)
+        # Wait until the worker took the first item
+        deadline = time.monotonic() + 5
+        while pipeline._queues[0].qsize() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        pipeline.submit(None)
+        pipeline.submit(None)
+        with pytest.raises(queue.Full):
+            pipeline.submit(None, block=False)
+
+        depth = PIPELINE_QUEUE_DEPTH.labels(pipeline="test-bounded", stage="wait")
+        assert depth._value.get() == 2
+    finally:
+        gate.set()
+        pipeline.close()
+    assert first.result() is True
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_pipeline_predict_waits_for_room():
+    """Test predict from the event loop waits for room instead of failing"""
+    pipeline = Pipeline("test-predict", [Stage("slow", _slow_copy, queue_size=1)])
+    try:
+        results = await asyncio.gather(*(pipeline.predict(x) for x in range(8)))
+    finally:
+        pipeline.close()
+
+    assert results == list(range(8))
+
+
+@pytest.mark.unit
+def test_pipeline_close_drains_queued_items():
+    """Test closing finishes the items already submitted"""
+    pipeline = Pipeline(
+        "test-close",
+        [Stage("slow", _slow_copy), Stage("copy", lambda x: x)],
+    )
+    futures = [pipeline.submit(x) for x in range(10)]
+    pipeline.close()
+
+    assert [future.result(timeout=0) for future in futures] == list(range(10))
+    with pytest.raises(RuntimeError):
+        pipeline.submit(0)
@@ -0,0 +1,37 @@
+"""Test top-k post-processing"""
+
+import numpy as np
+import pytest
+
+from src.classifier.postprocessing import softmax, top_k
+
+
+@pytest.mark.unit
+def test_softmax_is_stable():
+    """Test softmax handles large logits without overflow"""
+    probabilities = softmax(np.array([[1000.0, 1000.0, -1000.0]]))
+    np.testing.assert_allclose(probabilities, [[0.5, 0.5, 0.0]])
+
+
+@pytest.mark.unit
+def test_top_k_matches_full_sort():
+    """Test partial selection matches softmax followed by a full sort"""
+    logits = np.random.default_rng(0).normal(size=(4, 1000)).astype(np.float32)
+    indices, probabilities = top_k(logits, 10)
+
+    expected_probabilities = softmax(logits)
+    expected_indices = np.argsort(-expected_probabilities, axis=1)[:, :10]
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(
+        probabilities,
+        np.take_along_axis(expected_probabilities, expected_indices, axis=1),
+        rtol=1e-5,
+    )
+
+
+@pytest.mark.unit
+def test_top_k_caps_k_at_number_of_classes():
+    """Test asking for more classes than exist returns all of them"""
+    indices, probabilities = top_k(np.array([[0.0, 2.0, 1.0]]), 10)
+    np.testing.assert_array_equal(indices, [[1, 2, 0]])
+    assert probabilities.sum() == pytest.approx(1.0)
@@ -1,11 +1,21 @@
 """Test preprocessing utilities"""
 
+import io
+
 import numpy as np
 import pytest
 from fastapi import HTTPException
 from PIL import Image
 
-from src.utils.preprocessing import preprocess_image, validate_image
+from src.utils.preprocessing import (
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+    ImagePreprocessor,
+    decode_image,
+    prepare_input,
+    preprocess_image,
+    validate_image,
+)
 
 
 @pytest.mark.unit
@@ -18,6 +28,51 @@ def test_preprocess_image(test_image):
     assert np.all((processed >= 0) & (processed <= 1))
 
 
+@pytest.mark.unit
+def test_preprocessor_matches_reference():
+    """Test fused preprocessing matches a plain NumPy implementation"""
+    pixels = np.random.default_rng(0).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+
+    unit = ImagePreprocessor((224, 224)).preprocess(image)
+    expected = np.asarray(image.resize((224, 224))).transpose(2, 0, 1) / 255.0
+    np.testing.assert_allclose(unit[0], expected, atol=1e-6)
+
+    imagenet = ImagePreprocessor((224, 224), normalization="imagenet").preprocess(image)
+    mean = np.array(IMAGENET_MEAN)[:, None, None]
+    std = np.array(IMAGENET_STD)[:, None, None]
+    np.testing.assert_allclose(imagenet[0], (expected - mean) / std, atol=1e-5)
+
+
+@pytest.mark.unit
+def test_preprocessor_center_crop():
+    """Test center crop keeps only the middle of a wide image"""
+    # Red left third, green middle, blue right third
+    pixels = np.zeros((100, 300, 3), dtype=np.uint8)
+    pixels[:, :100, 0] = pixels[:, 100:200, 1] = pixels[:, 200:, 2] = 255
+    image = Image.fromarray(pixels)
+
+    processed = ImagePreprocessor((32, 32), resize_mode="center_crop").preprocess(image)
+    assert processed.shape == (1, 3, 32, 32)
+    np.testing.assert_allclose(processed[0, 1], 1.0, atol=1e-6)
+    np.testing.assert_allclose(processed[0, [0, 2]], 0.0, atol=1e-6)
+
+
+@pytest.mark.unit
+def test_preprocessor_batch_reuses_buffer(test_image):
+    """Test batched preprocessing writes into a reused per-thread buffer"""
+    preprocessor = ImagePreprocessor((224, 224))
+    first = preprocessor.preprocess_batch([test_image, test_image])
+    second = preprocessor.preprocess_batch([test_image])
+
+    assert first.shape == (2, 3, 224, 224)
+    assert second.shape == (1, 3, 224, 224)
+    assert np.shares_memory(first, second)
+    np.testing.assert_array_equal(
+        second[0], preprocess_image(test_image, (224, 224))[0]
+    )
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 async def test_validate_image(test_image_bytes):
@@ -33,3 +88,77 @@ async def test_validate_invalid_image():
     """Test validation with invalid image"""
     with pytest.raises(HTTPException):
         await validate_image(b"invalid image data")
+
+
+def _encode(size: tuple[int, int], fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color="blue").save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_decode_image_reduced(fmt):
+    """Test large images are decoded at reduced size without going below min_size"""
+    contents = _encode((2000, 1600), fmt)
+
+    full = decode_image(contents)
+    reduced = decode_image(contents, min_size=(224, 224))
+
+    assert full.size == (2000, 1600)
+    assert reduced.mode == "RGB"
+    assert reduced.width >= 224 and reduced.height >= 224
+    assert reduced.width * reduced.height <= full.width * full.height // 16
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("mode", ["P", "1", "I;16"])
+def test_decode_image_reduced_modes(mode):
+    """Test palette, 1-bit and 16-bit images are reduced like RGB ones"""
+    buffer = io.BytesIO()
+    Image.new(mode, (1200, 900), color=1).save(buffer, format="PNG")
+
+    reduced = decode_image(buffer.getvalue(), min_size=(224, 224))
+
+    assert reduced.mode == "RGB"
+    assert reduced.size == (300, 225)
+    array = prepare_input(buffer.getvalue(), ImagePreprocessor((224, 224)))
+    assert array.shape == (1, 3, 224, 224)
+
+
+@pytest.mark.unit
+def test_min_source_size_accounts_for_crop():
+    """Test center crop needs a larger source than a plain resize"""
+    assert ImagePreprocessor((224, 224)).min_source_size() == (224, 224)
+    assert ImagePreprocessor(
+        (224, 224), resize_mode="center_crop", crop_ratio=0.875
+    ).min_source_size() == (256, 256)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("shape", [(224, 224, 3), (300, 400, 3)])
+def test_preprocess_array_matches_image(shape):
+    """Test pixel arrays preprocess like the same pixels as a PIL image"""
+    pixels = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    preprocessor = ImagePreprocessor((224, 224))
+
+    np.testing.assert_array_equal(
+        preprocessor.preprocess_array(pixels),
+        preprocessor.preprocess(Image.fromarray(pixels)),
+    )
+
+
+@pytest.mark.unit
+def test_prepare_array_input_rejects_bad_arrays():
+    """Test arrays that are not uint8 RGB HWC are rejected"""
+    from src.core.exceptions import ValidationError
+    from src.utils.preprocessing import prepare_array_input
+
+    preprocessor = ImagePreprocessor((224, 224))
+    with pytest.raises(ValidationError):
+        prepare_array_input(np.zeros((224, 224, 3), np.float32), preprocessor)
+    with pytest.raises(ValidationError):
+        prepare_array_input(np.zeros((224, 224), np.uint8), preprocessor)
+    for shape in [(0, 5, 3), (5, 0, 3)]:
+        with pytest.raises(ValidationError):
+            prepare_array_input(np.zeros(shape, np.uint8), preprocessor)
@@ -0,0 +1,32 @@
+"""Test reduced-precision model variants"""
+
+from pathlib import Path
+
+import pytest
+
+from src.classifier.classifier import ImageClassifier
+from src.core.config import model_variant_path, settings
+
+
+@pytest.mark.unit
+def test_model_variant_path():
+    """Test variants are stored next to the FP32 model"""
+    model_path = Path("models/squeezenet1.1-7.onnx")
+    assert model_variant_path(model_path, "fp32") == model_path
+    assert model_variant_path(model_path, "int8_static") == Path(
+        "models/squeezenet1.1-7.int8_static.onnx"
+    )
+
+
+@pytest.mark.unit
+def test_dynamic_quantization(tmp_path, test_image):
+    """Test the dynamically quantized model loads and predicts"""
+    pytest.importorskip("onnx")
+    from scripts.quantize_model import quantize_dynamic_int8
+
+    output_path = tmp_path / "model.int8_dynamic.onnx"
+    quantize_dynamic_int8(settings.MODEL_PATH, output_path)
+
+    classifier = ImageClassifier(output_path, settings.LABELS_PATH)
+    predictions = classifier.predict(test_image, settings.IMAGE_SIZE, k=5)
+    assert len(predictions) == 5
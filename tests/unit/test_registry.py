@@ -0,0 +1,194 @@
+"""Test the multi-model registry"""
+
+import os
+import shutil
+
+import pytest
+
+from src.core.config import ModelConfig, settings
+from src.core.exceptions import ModelError, ModelNotFoundError
+from src.services.registry import ModelRegistry
+
+
+def _config(model_path, **kwargs) -> ModelConfig:
+    return ModelConfig(
+        display_name=kwargs.pop("display_name", "Test model"),
+        model_path=model_path,
+        labels_path=settings.LABELS_PATH,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def registry(tmp_path):
+    model_path = tmp_path / "model.onnx"
+    shutil.copy(settings.MODEL_PATH, model_path)
+    registry = ModelRegistry(
+        {
+            "first": _config(model_path),
+            "second": _config(
+                model_path, image_size=(112, 112), resize_mode="center_crop"
+            ),
+        },
+        default="first",
+    )
+    yield registry
+    registry.close()
+
+
+@pytest.mark.unit
+def test_registry_routes_by_name(registry):
+    """Test models load lazily and requests without a name use the default"""
+    assert registry.loaded() == []
+
+    first = registry.get()
+    second = registry.get("second")
+
+    assert first.name == "first"
+    assert registry.get("first") is first
+    assert second.preprocessor.size == (112, 112)
+    assert first.cache_namespace != second.cache_namespace
+
+
+@pytest.mark.unit
+def test_registry_unknown_model(registry):
+    """Test an unknown model name raises ModelNotFoundError"""
+    with pytest.raises(ModelNotFoundError):
+        registry.get("missing")
+    with pytest.raises(ModelNotFoundError):
+        registry.reload("missing")
+
+
+@pytest.mark.unit
+def test_registry_rejects_unknown_default():
+    """Test the default model must be configured"""
+    with pytest.raises(ValueError):
+        ModelRegistry({}, default="squeezenet")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_hot_swap_keeps_in_flight_requests(registry, test_image):
+    """Test a request holding the old version finishes after a swap"""
+    with registry.acquire("first") as old:
+        new = registry.reload("first")
+        assert registry.get("first") is new
+
+        # The old batcher is still running until the request releases it
+        input_array = old.preprocessor.preprocess(test_image)
+        assert len(await old.batcher.predict(input_array)) > 0
+
+    assert old.batcher._worker is not None
+    old.batcher._worker.join(timeout=5)
+    assert not old.batcher._worker.is_alive()
+
+
+@pytest.mark.unit
+def test_acquire_skips_a_version_retired_after_lookup(registry, monkeypatch):
+    """Test a request racing a swap gets the new version, not a closed one"""
+    old = registry.get("first")
+    new = None
+    lookup = registry.get
+
+    def get_then_swap(name=None):
+        # The swap lands between the lookup and the reference count increment
+        nonlocal new
+        model = lookup(name)
+        if new is None:
+            new = registry.reload("first")
+        return model
+
+    monkeypatch.setattr(registry, "get", get_then_swap)
+    with registry.acquire("first") as model:
+        assert model is new
+    assert old._retired
+
+
+@pytest.mark.unit
+def test_acquire_after_close(registry):
+    """Test acquiring from a closed registry fails instead of spinning"""
+    registry.get("first")
+    registry.close()
+    with pytest.raises(ModelError):
+        with registry.acquire("first"):
+            pass
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_acquire_async_waits_for_a_load_off_the_loop(registry):
+    """Test a request waiting for a model being loaded leaves the loop free"""
+    import asyncio
+
+    lock = registry._load_locks["first"]
+    lock.acquire()  # As warm-up or a reload holds it while loading
+    try:
+        task = asyncio.create_task(registry.get_async("first"))
+        # Other coroutines keep running while the request waits
+        await asyncio.sleep(0.05)
+        assert not task.done()
+    finally:
+        lock.release()
+
+    async with registry.acquire_async("first") as model:
+        assert model is await task
+
+
+@pytest.mark.unit
+def test_reload_closes_a_version_that_fails_warm_up(registry, monkeypatch):
+    """Test a new version failing its warm-up is closed, not leaked"""
+    from src.services.registry import LoadedModel
+
+    old = registry.get("first")
+    closed = []
+
+    def fail(self, batch_sizes, runs):
+        raise RuntimeError("warm-up failed")
+
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(LoadedModel, "warm_up", fail)
+    close = LoadedModel.close
+
+    def record_close(self):
+        closed.append(self)
+        close(self)
+
+    monkeypatch.setattr(LoadedModel, "close", record_close)
+
+    with pytest.raises(RuntimeError):
+        registry.reload("first")
+
+    assert len(closed) == 1 and closed[0] is not old
+    assert registry.get("first") is old
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_fixed_batch_size_model_skips_the_batch_wait(
+    registry, test_image, monkeypatch
+):
+    """Test a model with a batch size fixed at 1 does not wait for a batch"""
+    import time
+
+    monkeypatch.setattr(settings, "BATCH_MAX_WAIT_MS", 5000)
+    model = registry.get("first")
+    input_array = model.preprocessor.preprocess(test_image)
+
+    start = time.perf_counter()
+    assert len(await model.batcher.predict(input_array)) > 0
+
+    assert model.classifier.max_batch_size == 1
+    assert model.max_batch_size == model.batcher.max_batch_size == 1
+    assert time.perf_counter() - start < 2
+
+
+@pytest.mark.unit
+def test_watcher_reloads_replaced_model(registry):
+    """Test replacing the model file is picked up by the watcher"""
+    model = registry.get("first")
+    stat = model.model_path.stat()
+    os.utime(model.model_path, (stat.st_atime, stat.st_mtime + 10))
+
+    registry._watch_once()
+
+    assert registry.get("first") is not model
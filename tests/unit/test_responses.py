@@ -0,0 +1,84 @@
+"""Test prediction response encoding"""
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from src.api.responses import (
+    JSON_MEDIA_TYPE,
+    batch_item_content,
+    encode_response,
+    negotiate_media_type,
+    prediction_content,
+)
+from src.api.schemas import (
+    BatchPredictionItem,
+    CompactBatchPredictionItem,
+    CompactPredictionResponse,
+    PredictionResponse,
+)
+
+PREDICTIONS = [("tabby", 0.75), ("tiger cat", 0.2), ("lynx", 0.05)]
+
+
+@pytest.mark.unit
+def test_prediction_content_matches_schemas():
+    """Test both formats validate against the documented response models"""
+    objects = prediction_content(PREDICTIONS, 2, "objects")
+    assert PredictionResponse.model_validate(objects).model_dump() == objects
+    assert objects["predictions"][0] == {"class_name": "tabby", "confidence": 0.75}
+
+    compact = prediction_content(PREDICTIONS, 2, "compact")
+    assert CompactPredictionResponse.model_validate(compact).model_dump() == compact
+    assert compact == {"labels": ["tabby", "tiger cat"], "scores": [0.75, 0.2]}
+
+
+@pytest.mark.unit
+def test_batch_item_content_matches_schemas():
+    """Test batch entries, including failed ones, match their response models"""
+    item = batch_item_content("a.png", PREDICTIONS, 3, "objects")
+    assert BatchPredictionItem.model_validate(item).model_dump() == item
+
+    failed = batch_item_content("b.png", None, 3, "compact", "Invalid image file")
+    assert CompactBatchPredictionItem.model_validate(failed).model_dump() == failed
+    assert failed["labels"] == [] and failed["error"] == "Invalid image file"
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "accept",
+    [None, "", "*/*", "application/json", "text/html, application/*;q=0.5"],
+)
+def test_negotiate_json(accept):
+    """Test JSON is chosen by default and for wildcards"""
+    assert negotiate_media_type(accept) == JSON_MEDIA_TYPE
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("accept", ["text/html", "application/json;q=0"])
+def test_negotiate_not_acceptable(accept):
+    """Test clients accepting no supported media type get 406"""
+    with pytest.raises(HTTPException) as exc_info:
+        negotiate_media_type(accept)
+    assert exc_info.value.status_code == 406
+
+
+@pytest.mark.unit
+def test_encode_response():
+    """Test JSON responses round-trip"""
+    content = prediction_content(PREDICTIONS, 3, "objects")
+    response = encode_response(content, JSON_MEDIA_TYPE)
+    assert response.media_type == JSON_MEDIA_TYPE
+    assert orjson.loads(response.body) == content
+
+
+@pytest.mark.unit
+def test_encode_msgpack():
+    """Test MessagePack is negotiated and round-trips when installed"""
+    msgpack = pytest.importorskip("msgpack")
+    media_type = negotiate_media_type("application/msgpack, application/json;q=0.9")
+    assert media_type == "application/msgpack"
+
+    content = prediction_content(PREDICTIONS, 3, "compact")
+    response = encode_response(content, media_type)
+    assert msgpack.unpackb(response.body) == content
@@ -0,0 +1,74 @@
+"""Test per-stage timing and span export"""
+
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.core import tracing
+from src.core.config import settings
+
+
+def _stage_count(stage: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "image_classifier_stage_seconds_count", {"stage": stage}
+    )
+    return value or 0.0
+
+
+@pytest.fixture
+def configure_tracing():
+    yield tracing.configure
+    tracing.configure(settings.STAGE_TIMING_ENABLED, settings.SPAN_EXPORT_PATH)
+
+
+@pytest.mark.unit
+def test_stage_observes_histogram(configure_tracing):
+    """Test a stage is recorded in the stage histogram"""
+    configure_tracing(True)
+    before = _stage_count("unit_test")
+
+    with tracing.stage("unit_test"):
+        pass
+
+    assert _stage_count("unit_test") == before + 1
+
+
+@pytest.mark.unit
+def test_spans_exported_with_parents(configure_tracing, tmp_path):
+    """Test nested stages share a trace and point at their parent span"""
+    path = tmp_path / "spans.jsonl"
+    configure_tracing(True, path)
+
+    with tracing.span("request", path="/predict"):
+        with tracing.stage("decode", bytes=10):
+            pass
+        with pytest.raises(ValueError):
+            with tracing.stage("preprocess"):
+                raise ValueError
+    configure_tracing(False)
+
+    decode, preprocess, request = [
+        json.loads(line) for line in path.read_text().splitlines()
+    ]
+    assert request["parent_span_id"] is None
+    assert decode["parent_span_id"] == request["span_id"]
+    assert decode["trace_id"] == preprocess["trace_id"] == request["trace_id"]
+    assert decode["attributes"]["bytes"] == 10
+    assert preprocess["status"] == "ERROR"
+    assert decode["end_time_unix_nano"] >= decode["start_time_unix_nano"]
+
+
+@pytest.mark.unit
+def test_disabled_stage_is_noop(configure_tracing, tmp_path):
+    """Test nothing is timed or exported when stage timing is disabled"""
+    path = tmp_path / "spans.jsonl"
+    configure_tracing(False, path)
+    before = _stage_count("unit_test")
+
+    with tracing.stage("unit_test"):
+        pass
+
+    assert tracing.stage("unit_test") is tracing.stage("other")
+    assert _stage_count("unit_test") == before
+    assert not path.exists()
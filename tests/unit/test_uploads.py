@@ -0,0 +1,52 @@
+"""Test image header sniffing of the streaming upload ingest"""
+
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from src.core.exceptions import ValidationError
+from src.utils.uploads import sniff_image_header
+
+
+def _encode(format: str, size: tuple[int, int] = (300, 200)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color="blue").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("format", ["JPEG", "PNG", "GIF", "BMP", "WEBP"])
+def test_sniff_image_header(format):
+    """Test format and size are read from the header of each format"""
+    contents = _encode(format)
+    assert sniff_image_header(contents) == (format, 300, 200)
+
+
+@pytest.mark.unit
+def test_sniff_jpeg_after_large_metadata():
+    """Test the JPEG walk skips metadata segments before the frame header"""
+    contents = _encode("JPEG")
+    app1 = b"\xff\xe1" + struct.pack(">H", 60_002) + b"\x00" * 60_000
+    contents = contents[:2] + app1 + contents[2:]
+
+    assert sniff_image_header(contents[:1000]) is None
+    assert sniff_image_header(contents) == ("JPEG", 300, 200)
+
+
+@pytest.mark.unit
+def test_sniff_needs_more_bytes():
+    """Test a truncated header asks for more bytes unless the file is complete"""
+    contents = _encode("PNG")[:20]
+    assert sniff_image_header(contents) is None
+    with pytest.raises(ValidationError):
+        sniff_image_header(contents, complete=True)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("contents", [b"invalid image data", b"%PDF-1.7\n" * 4])
+def test_sniff_rejects_non_images(contents):
+    """Test unknown signatures are rejected from the first bytes"""
+    with pytest.raises(ValidationError, match="Invalid image file"):
+        sniff_image_header(contents)
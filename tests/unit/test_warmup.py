@@ -0,0 +1,67 @@
+"""Test startup warm-up and readiness"""
+
+import pytest
+
+from src.core.config import ModelConfig, settings
+from src.services.registry import ModelRegistry
+from src.services.warmup import Readiness, process_age, warm_up
+
+
+@pytest.fixture
+def registry():
+    config = ModelConfig(
+        display_name="Test model",
+        model_path=settings.MODEL_PATH,
+        labels_path=settings.LABELS_PATH,
+    )
+    registry = ModelRegistry({"test": config}, default="test")
+    yield registry
+    registry.close()
+
+
+@pytest.mark.unit
+def test_warm_up_marks_ready(registry):
+    """Test warm-up loads the models and records each startup phase"""
+    readiness = Readiness()
+    assert readiness.status == "starting"
+
+    warm_up(registry, readiness, ["test"], batch_sizes=[1, 4], runs=2)
+
+    assert readiness.ready
+    assert readiness.wait(timeout=0)
+    assert readiness.status == "ready"
+    assert [model.name for model in registry.loaded()] == ["test"]
+    assert {"load", "warmup", "total"} <= set(readiness.phases)
+    assert readiness.phases["total"] >= readiness.phases["load"]
+
+
+@pytest.mark.unit
+def test_warm_up_failure_keeps_not_ready(registry):
+    """Test a model that fails to load leaves the worker not ready"""
+    readiness = Readiness()
+
+    warm_up(registry, readiness, ["missing"], batch_sizes=[1], runs=1)
+
+    assert not readiness.ready
+    assert readiness.status == "failed"
+    assert readiness.error is not None and "missing" in readiness.error
+
+
+@pytest.mark.unit
+def test_model_warm_up_steps(registry):
+    """Test a model's warm-up times the first inference apart from the others"""
+    durations = registry.get().warm_up(batch_sizes=[2, 1, 2], runs=3)
+
+    assert set(durations) == {"preprocess", "first_inference", "inference"}
+    assert all(seconds > 0 for seconds in durations.values())
+    # Warm-up does not count as served inferences
+    assert registry.get().inference_count == 0
+
+
+@pytest.mark.unit
+def test_process_age():
+    """Test the process age is known on Linux and plausible"""
+    age = process_age()
+    if age is None:
+        pytest.skip("/proc is not available")
+    assert 0 <= age < 24 * 3600
@@ -0,0 +1,112 @@
+"""Test models running on memory-mapped weights shared by all workers"""
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.classifier.classifier import ImageClassifier
+from src.classifier.weights import map_weights, shared_index_path, shared_model_path
+from src.core.config import settings
+from src.services.registry import load_classifier
+
+# Anonymous memory added by loading a model, the part that is not shared
+LOAD = """
+import sys
+from pathlib import Path
+import numpy as np
+from src.classifier.classifier import ImageClassifier
+
+def anonymous():
+    with open("/proc/self/status") as f:
+        line = next(line for line in f if line.startswith("RssAnon:"))
+    return int(line.split()[1]) * 1024
+
+before = anonymous()
+model_path, labels_path, index_path = sys.argv[1:4]
+classifier = ImageClassifier(
+    Path(model_path), Path(labels_path), shared_weights=Path(index_path)
+)
+classifier.predict_batch(np.zeros((1, 3, 224, 224), dtype=np.float32))
+print(anonymous() - before)
+"""
+
+
+@pytest.fixture(scope="module")
+def shared_export(large_model):
+    from scripts.export_shared_weights import export_shared_weights
+
+    return export_shared_weights(large_model)
+
+
+@pytest.mark.unit
+def test_export_writes_aligned_weights(large_model, shared_export):
+    """Test the weights are moved to the weights file at aligned offsets"""
+    index = json.loads(shared_export.read_text())
+    weights = map_weights(shared_export)
+
+    assert shared_export == shared_index_path(large_model)
+    assert {tensor["name"] for tensor in index["tensors"]} == {"W", "B"}
+    assert all(tensor["offset"] % 64 == 0 for tensor in index["tensors"])
+    assert weights["W"].shape == (3 * 56 * 56, 1000)
+    assert not weights["W"].flags.writeable
+    # The graph no longer holds the weights
+    assert shared_model_path(large_model).stat().st_size < 64 * 1024
+
+
+@pytest.mark.unit
+def test_shared_weights_predict_like_the_model(large_model, shared_export):
+    """Test a classifier on the shared weights matches one on the model file"""
+    batch = np.random.default_rng(1).random((2, 3, 224, 224), dtype=np.float32)
+    classifier = ImageClassifier(large_model, settings.LABELS_PATH)
+    shared = ImageClassifier(
+        shared_model_path(large_model),
+        settings.LABELS_PATH,
+        shared_weights=shared_export,
+    )
+
+    expected = classifier.predict_batch(batch, k=5)
+    predictions = shared.predict_batch(batch, k=5)
+
+    assert shared.version == classifier.version
+    assert [[label for label, _ in row] for row in predictions] == [
+        [label for label, _ in row] for row in expected
+    ]
+    np.testing.assert_allclose(
+        [[p for _, p in row] for row in predictions],
+        [[p for _, p in row] for row in expected],
+        rtol=1e-4,
+    )
+
+
+@pytest.mark.unit
+def test_shared_weights_are_not_copied(large_model, shared_export):
+    """Test loading on shared weights adds far less private memory than they take"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            LOAD,
+            str(shared_model_path(large_model)),
+            str(settings.LABELS_PATH),
+            str(shared_export),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    weights_bytes = map_weights(shared_export)["W"].nbytes
+    assert int(result.stdout.split()[-1]) < weights_bytes / 4
+
+
+@pytest.mark.unit
+def test_load_classifier_uses_the_export(large_model, shared_export, monkeypatch):
+    """Test MODEL_SHARED_WEIGHTS loads the export, and the model without one"""
+    monkeypatch.setattr(settings, "MODEL_SHARED_WEIGHTS", True)
+
+    assert load_classifier(large_model, settings.LABELS_PATH)._initializers
+    # No export of the default model, so it is loaded on its own
+    assert not load_classifier(settings.MODEL_PATH, settings.LABELS_PATH)._initializers